@@ -0,0 +1,229 @@
+"""
+Admission control for /analyze.
+
+Every request is counted while it is in flight, and every RAG call holds
+an LLM slot. When the LLM is saturated (all slots busy) or too many
+requests are already in flight, a request is not queued behind the slow
+LLM. It is answered in degraded mode instead: the risk class plus a
+cached or template explanation, and no hospital lookup.
+
+The counters are per gunicorn worker, the limits are not: a change made
+through whichever worker receives the admin request is written to a
+control file in ADMISSION_DIR, and every worker picks it up within
+SYNC_INTERVAL seconds, like the profiler's sessions.
+"""
+import os
+import json
+import time
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from Deployment.metrics import LLM_IN_FLIGHT, REQUESTS_IN_FLIGHT, DEGRADED_REQUESTS, CACHE_HITS
+from Deployment.profiling import _write_atomic
+from Src_Code.structured_logging import contains_pii
+
+DEGRADABLE_STAGES = ["explanation", "hospitals"]
+SYNC_INTERVAL = 1.0
+CONTROL_FILE = "limits.json"
+DEFAULT_ADMISSION_DIR = os.path.join(tempfile.gettempdir(), "smart_health_admission")
+
+TEMPLATE_EXPLANATIONS = {
+    "Good": {
+        "explanation": "Your readings are within healthy ranges and indicate a low risk.",
+        "diagnosis": "No condition is suggested by these readings.",
+        "nextSteps": ["Keep up regular activity and a balanced diet.",
+                      "Continue routine check-ups with your doctor."],
+    },
+    "Fair": {
+        "explanation": "Some of your readings are outside the recommended ranges and indicate a moderate risk that warrants attention.",
+        "diagnosis": "Readings like these are often associated with early high blood pressure or cholesterol. This is not a diagnosis.",
+        "nextSteps": ["Book a check-up with your primary care provider.",
+                      "Monitor your blood pressure and keep a log of readings.",
+                      "Reduce salt intake and add regular brisk walking."],
+    },
+    "Bad": {
+        "explanation": "Several of your readings are well outside the recommended ranges and indicate a high risk.",
+        "diagnosis": "Readings like these can be associated with hypertension and cardiovascular disease. This is not a diagnosis.",
+        "nextSteps": ["Contact your doctor as soon as possible to review these results.",
+                      "Seek urgent care if you have chest pain, shortness of breath or severe headache."],
+    },
+}
+DEFAULT_TEMPLATE = {
+    "explanation": "A detailed explanation is not available right now.",
+    "diagnosis": "Unable to retrieve diagnosis.",
+    "nextSteps": ["Consult a doctor for further advice."],
+}
+
+
+def _bucket(value, width):
+    return None if value is None else int(value // width)
+
+
+def profile_key(patient, risk):
+    """Coarse patient profile under which explanations are reused"""
+    return (risk, patient.gender.strip().lower()[:1], _bucket(patient.age, 10),
+            _bucket(patient.systolic_bp, 20), _bucket(patient.bmi, 5),
+            patient.smoker, patient.diabetes)
+
+
+class ExplanationCache:
+    """
+    LRU of recent RAG answers by patient profile. Answers that mention any
+    word of the patient's name (in any case) or an email address are not
+    stored, so they can't reach someone else.
+    """
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, patient, risk, rag_result):
+        text = " ".join([rag_result.get("explanation", ""), rag_result.get("diagnosis", "")]
+                        + list(rag_result.get("nextSteps", [])))
+        if contains_pii(text, (patient.name, patient.email)):
+            return
+        key = profile_key(patient, risk)
+        with self._lock:
+            self._entries[key] = rag_result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, patient, risk):
+        key = profile_key(patient, risk)
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+        return result
+
+    def explanation_for(self, patient, risk):
+        """Cached answer for this profile, else the template; returns (result, source)"""
+        cached = self.get(patient, risk)
+        if cached is not None:
+            CACHE_HITS.inc("explanation")
+            return dict(cached, risk=risk), "cache"
+        return dict(TEMPLATE_EXPLANATIONS.get(risk, DEFAULT_TEMPLATE), risk=risk), "template"
+
+
+class AdmissionController:
+    def __init__(self, max_llm_in_flight=8, max_requests_in_flight=32, shared_dir=DEFAULT_ADMISSION_DIR):
+        self.max_llm_in_flight = max_llm_in_flight
+        self.max_requests_in_flight = max_requests_in_flight
+        self.llm_in_flight = 0
+        self.requests_in_flight = 0
+        self.shed_count = 0
+        self.shared_dir = shared_dir
+        self._control_mtime = None
+        self._next_sync = 0.0
+        self._sync_lock = threading.Lock()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def track_request(self):
+        with self._lock:
+            self.requests_in_flight += 1
+            REQUESTS_IN_FLIGHT.set(self.requests_in_flight)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.requests_in_flight -= 1
+                REQUESTS_IN_FLIGHT.set(self.requests_in_flight)
+
+    def try_acquire_llm(self):
+        """Take an LLM slot if the limits allow it; never blocks"""
+        with self._lock:
+            if (self.llm_in_flight >= self.max_llm_in_flight
+                    or self.requests_in_flight > self.max_requests_in_flight):
+                self.shed_count += 1
+                for stage in DEGRADABLE_STAGES:
+                    DEGRADED_REQUESTS.inc(stage)
+                return False
+            self.llm_in_flight += 1
+            LLM_IN_FLIGHT.set(self.llm_in_flight)
+            return True
+
+    def release_llm(self):
+        with self._lock:
+            self.llm_in_flight -= 1
+            LLM_IN_FLIGHT.set(self.llm_in_flight)
+
+    # ---------- limits, shared by all workers ----------
+    def _control_path(self):
+        return os.path.join(self.shared_dir, CONTROL_FILE)
+
+    def _read_control(self):
+        """
+        Limits set since this server started. The file records the gunicorn
+        master (the workers' parent), so one left by a previous run is ignored.
+        """
+        try:
+            with open(self._control_path()) as f:
+                control = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return control if control.get('server') == os.getppid() else None
+
+    def update_limits(self, max_llm_in_flight=None, max_requests_in_flight=None):
+        """Change limits in every worker at runtime; in-flight work is not interrupted"""
+        limits = {}
+        for name, value in (('max_llm_in_flight', max_llm_in_flight),
+                            ('max_requests_in_flight', max_requests_in_flight)):
+            if value is None:
+                continue
+            if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+                raise ValueError(f"{name} must be a non-negative integer")
+            limits[name] = value
+        if limits:
+            os.makedirs(self.shared_dir, exist_ok=True)
+            control = self._read_control() or {}
+            control.update(limits, server=os.getppid())
+            _write_atomic(self._control_path(), json.dumps(control).encode())
+        self.sync(force=True)
+        return self.snapshot()
+
+    def sync(self, force=False):
+        """Apply limits changed through any worker. Cheap when called per request."""
+        now = time.monotonic()
+        if not force and now < self._next_sync:
+            return
+        if not self._sync_lock.acquire(blocking=force):
+            return
+        try:
+            self._next_sync = now + SYNC_INTERVAL
+            try:
+                mtime = os.stat(self._control_path()).st_mtime_ns
+            except OSError:
+                mtime = None
+            if mtime == self._control_mtime:
+                return
+            self._control_mtime = mtime
+            control = self._read_control() or {}
+            with self._lock:
+                for name in ('max_llm_in_flight', 'max_requests_in_flight'):
+                    if name in control:
+                        setattr(self, name, control[name])
+        finally:
+            self._sync_lock.release()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'max_llm_in_flight': self.max_llm_in_flight,
+                'max_requests_in_flight': self.max_requests_in_flight,
+                'llm_in_flight': self.llm_in_flight,
+                'requests_in_flight': self.requests_in_flight,
+                'shed_count': self.shed_count,
+                'pid': os.getpid()
+            }
+
+
+ADMISSION = AdmissionController(
+    max_llm_in_flight=int(os.getenv("ADMISSION_MAX_LLM_IN_FLIGHT", "8")),
+    max_requests_in_flight=int(os.getenv("ADMISSION_MAX_REQUESTS_IN_FLIGHT", "32")),
+    shared_dir=os.getenv("ADMISSION_DIR") or DEFAULT_ADMISSION_DIR,
+)
+EXPLANATION_CACHE = ExplanationCache(int(os.getenv("EXPLANATION_CACHE_SIZE", "512")))
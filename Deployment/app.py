@@ -1,9 +1,11 @@
 import os
 import sys
-import joblib
-import requests
-import traceback
-from flask import Flask, request, jsonify
+import hmac
+import time
+import uuid
+import tempfile
+from flask import Flask, request, jsonify, g, Response
+import msgspec
 from dotenv import load_dotenv
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
@@ -12,19 +14,96 @@ from flask_cors import CORS
 
 # Allow imports from root
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from Src_Code.rag_integration import query_rag
+from Src_Code.rag_integration import query_rag, RAG_FAILED_EXPLANATION
+from Src_Code.model_artifacts import load_any_model, load_manifest
+from Src_Code.drift_monitoring import DriftProfile, DriftMonitor
+from Src_Code.structured_logging import get_logger, set_request_context, add_request_pii
+from Deployment.schemas import decode_patient, encode_json, validation_error, load_fill_values
+from Deployment.admission import ADMISSION, EXPLANATION_CACHE
+from Deployment.outbound import make_session, CircuitBreaker, HedgedClient
+from Deployment.singleflight import SingleFlight, AlertDeduplicator, payload_key, DEFAULT_ALERT_DB
+from Deployment.profiling import PROFILER
+from Deployment.result_sink import ResultSink, analysis_row
+from Deployment.metrics import (stage_timer, render_prometheus, server_timing_header, SHARED_METRICS,
+                                REQUEST_SECONDS, REQUESTS, RAG_FALLBACKS)
 
 load_dotenv()
 app = Flask(__name__)
+log = get_logger("smart_health.api")
 
 CORS(app)
 # ================== Load ML Model ==================
-MODEL_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "../models/decision_tree_model.pkl"))
+# MODEL_PATH may point at a joblib pickle or a memory-mapped artifact directory
+MODEL_PATH = os.getenv("MODEL_PATH") or os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "../models/decision_tree_model.pkl")
+)
 if not os.path.exists(MODEL_PATH):
     raise FileNotFoundError(f"Model not found at {MODEL_PATH}")
 
-model = joblib.load(MODEL_PATH)
-print("✅ Model loaded successfully")
+model = load_any_model(MODEL_PATH)
+if os.path.isdir(MODEL_PATH):
+    MODEL_VERSION = str(load_manifest(MODEL_PATH)["model_version"])
+else:
+    MODEL_VERSION = f"{os.path.basename(MODEL_PATH)}@{int(os.path.getmtime(MODEL_PATH))}"
+log.info("Model loaded", model_path=MODEL_PATH, model_version=MODEL_VERSION)
+
+# Imputation values for blank vitals, from the cleaning statistics of the training data
+CLEANING_STATS_PATH = os.getenv("CLEANING_STATS_PATH") or os.path.join(
+    os.path.dirname(MODEL_PATH.rstrip("/\\")), "cleaning_stats.json")
+FILL_VALUES = {}
+if os.path.exists(CLEANING_STATS_PATH):
+    FILL_VALUES = load_fill_values(CLEANING_STATS_PATH)
+else:
+    log.warning("No cleaning statistics; patients with blank vitals are classified Unknown",
+                path=CLEANING_STATS_PATH)
+
+# ================== Drift Monitoring ==================
+# Reference profile written next to the models by model_training.py
+DRIFT_REFERENCE_PATH = os.getenv("DRIFT_REFERENCE_PATH") or os.path.join(
+    os.path.dirname(MODEL_PATH.rstrip("/\\")), "drift_reference.json")
+DRIFT = None
+if os.path.exists(DRIFT_REFERENCE_PATH):
+    # Each worker sees part of the traffic; the report merges all of them
+    DRIFT = DriftMonitor(DriftProfile.load(DRIFT_REFERENCE_PATH),
+                         window_seconds=float(os.getenv("DRIFT_WINDOW_SECONDS", "3600")),
+                         shared_dir=os.getenv("DRIFT_DIR") or os.path.join(tempfile.gettempdir(), "smart_health_drift"))
+else:
+    log.warning("No drift reference profile; drift monitoring disabled", path=DRIFT_REFERENCE_PATH)
+
+# ================== External Services ==================
+# Overridable so load tests can point the app at local fake servers
+OVERPASS_URL = os.getenv("OVERPASS_URL", "https://overpass-api.de/api/interpreter")
+# Comma-separated mirrors tried in order; later ones receive hedged requests
+OVERPASS_URLS = [u.strip() for u in os.getenv("OVERPASS_URLS", OVERPASS_URL).split(",") if u.strip()]
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "true").lower() == "true"
+
+SESSION = make_session(int(os.getenv("OUTBOUND_POOL_SIZE", "32")))
+OVERPASS = HedgedClient(
+    "overpass", OVERPASS_URLS, SESSION,
+    timeout=float(os.getenv("OVERPASS_TIMEOUT", "10")),
+    hedge_percentile=float(os.getenv("OVERPASS_HEDGE_PERCENTILE", "90")),
+    default_hedge_delay=float(os.getenv("OVERPASS_HEDGE_DELAY", "1.0")),
+)
+BREAKER_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+OVERPASS_BREAKER = CircuitBreaker("overpass", BREAKER_THRESHOLD, BREAKER_RESET_SECONDS)
+GROQ_BREAKER = CircuitBreaker("groq", BREAKER_THRESHOLD, BREAKER_RESET_SECONDS)
+
+# Identical concurrent submissions share one analysis; repeat alerts are suppressed
+ANALYSES = SingleFlight("analyze")
+# Shared by the gunicorn workers so a retry on another worker is still deduplicated
+ALERT_DEDUP = AlertDeduplicator(os.getenv("ALERT_DEDUP_DB") or DEFAULT_ALERT_DB,
+                                float(os.getenv("ALERT_DEDUP_SECONDS", "600")))
+
+# ================== Result Store ==================
+# Every analysis is kept for audit and retraining; set RESULT_DB_PATH="" to disable
+RESULT_DB_PATH = os.getenv("RESULT_DB_PATH", os.path.join(os.path.dirname(__file__), "analysis_results.db"))
+RESULTS = ResultSink(RESULT_DB_PATH) if RESULT_DB_PATH else None
+
+# Admin endpoints are disabled unless a token is configured
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
 
 # ================== Email Alert ==================
 # ================== Email Alert ==================
@@ -44,8 +123,7 @@ def send_email_alert(to_email, risk, explanation, nextSteps, user_name):
         def shorten_text(text, limit=400):
             return text[:limit] + "..." if len(text) > limit else text
         
-        print("Explanation content:", explanation)
-        print("Preparing email content...")
+        log.debug("Preparing email content", explanation=explanation)
 
         # FIX: Handle explanation as string, not array
         if isinstance(explanation, str):
@@ -63,7 +141,7 @@ def send_email_alert(to_email, risk, explanation, nextSteps, user_name):
         else:
             nextSteps_html = "<li>Consult a doctor for personalized advice.</li>"
 
-        print("Explanation HTML:", explanation_html)
+        log.debug("Email explanation rendered", explanation_html=explanation_html)
 
         # Personalized email body
         body = f"""
@@ -112,15 +190,17 @@ def send_email_alert(to_email, risk, explanation, nextSteps, user_name):
         msg["Subject"] = subject
         msg.attach(MIMEText(body, "html"))
 
-        with smtplib.SMTP("smtp.gmail.com", 587) as server:
-            server.starttls()
-            server.login(sender, password)
-            server.send_message(msg)
+        with stage_timer("smtp", "smtp"):
+            with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as server:
+                if SMTP_STARTTLS:
+                    server.starttls()
+                server.login(sender, password)
+                server.send_message(msg)
 
-        print(f"📧 Alert email sent to {to_email}")
+        log.info("Alert email sent", risk=risk)
 
     except Exception as e:
-        print("⚠️ Email send failed:", e)
+        log.warning("Email send failed", error=str(e))
 
 # ================== OpenStreetMap Doctor Search ==================
 def find_nearby_hospitals(lat, lon, radius_m=5000):
@@ -137,8 +217,9 @@ def find_nearby_hospitals(lat, lon, radius_m=5000):
         );
         out center;
         """
-        response = requests.post("https://overpass-api.de/api/interpreter", data={"data": query}, timeout=20)
-        data = response.json()
+        with OVERPASS_BREAKER.guard(), stage_timer("overpass", "overpass"):
+            response = OVERPASS.post(data={"data": query})
+            data = response.json()
 
         hospitals = []
         for element in data.get("elements", [])[:5]:  # limit to 5 hospitals
@@ -159,79 +240,250 @@ def find_nearby_hospitals(lat, lon, radius_m=5000):
         return hospitals
 
     except Exception as e:
-        print("⚠️ Hospital lookup failed:", e)
+        log.warning("Hospital lookup failed", error=str(e))
         return []
     
 # ================== Risk Prediction ==================
-def classify_risk(input_data: dict) -> str:
+def classify_risk(patient) -> str:
+    """patient is a validated PatientPayload, so no coercion is needed here"""
+    features = patient.features(FILL_VALUES)
+    if None in features:
+        log.warning("Missing features and no imputation values")
+        return "Unknown"
     try:
-        # Encode gender numerically
-        gender_str = str(input_data.get("Gender", "")).lower()
-        gender = 1 if gender_str in ["female", "f"] else 2  # female=1, male=2
-
-        age = float(input_data.get("Age", 0))
-        systolic = float(input_data.get("Systolic BP", 0))
-        diastolic = float(input_data.get("Diastolic BP", 0))
-        cholesterol = float(input_data.get("Cholesterol", 0))
-        bmi = float(input_data.get("BMI", 0))
-        smoker = int(bool(input_data.get("Smoker", False)))
-        diabetes = int(bool(input_data.get("Diabetes", False)))
-
-        features = [gender, age, systolic, diastolic, cholesterol, bmi, smoker, diabetes]
-
-        pred = model.predict([features])[0]
-        return pred
+        with stage_timer("classify_risk"):
+            pred = model.predict([features])[0]
+        return str(pred)
 
     except Exception as e:
-        print("Prediction error:", e)
+        log.warning("Prediction error", error=str(e))
         return "Unknown"
 
 
+def explain_risk(patient, data, risk):
+    """RAG explanation behind the Groq circuit breaker; returns (result, source)"""
+    if not GROQ_BREAKER.allow():
+        return EXPLANATION_CACHE.explanation_for(patient, risk)
+    rag_result = None
+    try:
+        rag_result = query_rag(data, risk, stage_timer=stage_timer)
+    finally:
+        if rag_result is None or rag_result.get("explanation") == RAG_FAILED_EXPLANATION:
+            GROQ_BREAKER.record_failure()
+        else:
+            GROQ_BREAKER.record_success()
+
+    if rag_result.get("explanation") == RAG_FAILED_EXPLANATION:
+        RAG_FALLBACKS.inc()
+    else:
+        EXPLANATION_CACHE.put(patient, risk, rag_result)
+    return rag_result, "rag"
+
+
+def json_response(payload, status=200):
+    return Response(encode_json(payload), status=status, mimetype="application/json")
+
+
+def run_analysis(patient):
+    """Risk, explanation, hospitals and alert for one validated payload"""
+    data = patient.to_dict()
+    user_name = data["Name"]
+    with ADMISSION.track_request():
+        risk = classify_risk(patient)
+        if DRIFT is not None:
+            DRIFT.observe(data, risk)
+        degraded = []
+        explanation_source = "rag"
+        if ADMISSION.try_acquire_llm():
+            try:
+                rag_result, explanation_source = explain_risk(patient, data, risk)
+            finally:
+                ADMISSION.release_llm()
+            if explanation_source != "rag":
+                degraded = ["explanation"]
+            hospitals = find_nearby_hospitals(data["Latitude"], data["Longitude"]) if patient.has_location else []
+        else:
+            # Overloaded: answer now with what we have rather than queue
+            rag_result, explanation_source = EXPLANATION_CACHE.explanation_for(patient, risk)
+            hospitals = []
+            degraded = ["explanation", "hospitals"]
+            log.warning("Request degraded", stages=degraded, source=explanation_source)
+
+    explanation = rag_result.get("explanation", [])
+    diagnosis = rag_result.get("diagnosis", [])
+    next_steps = rag_result.get("nextSteps", [])
+
+    alert_sent = risk == "Bad" and ALERT_DEDUP.should_send(patient.email.lower(), risk)
+    if alert_sent:
+        send_email_alert(data["Email"], risk, explanation, next_steps, user_name)
+
+    result = {
+        "name": user_name,
+        "risk": risk,
+        "explanation": explanation,
+        "diagnosis": diagnosis,
+        "nextSteps": next_steps,
+        "hospitals": hospitals,
+        "explanationSource": explanation_source,
+        "degraded": degraded
+    }
+    if RESULTS is not None:
+        RESULTS.record(analysis_row(patient, result, MODEL_VERSION, RESULTS.email_key,
+                                    g.get("request_id"), alert_sent, g.get("stage_timings")))
+    return result
+
+
 # ================== Main Endpoint ==================
 @app.route("/analyze", methods=["POST"])
 def analyze():
     try:
-        data = request.get_json()
-        if not data:
+        body = request.get_data()
+        if not body:
             return jsonify({"error": "No JSON provided"}), 400
-
-        required = [
-            "Name", "Gender", "Age", "Systolic BP", "Diastolic BP",
-            "Cholesterol", "BMI", "Smoker", "Diabetes",
-            "Email", "Latitude", "Longitude"
-        ]
-        missing = [r for r in required if r not in data]
-        if missing:
-            return jsonify({"error": "Missing fields", "missing": missing}), 400
-
-        user_name = data["Name"]
-        risk = classify_risk(data)
-        rag_result = query_rag(data, risk)
-        explanation = rag_result.get("explanation", [])
-        diagnosis = rag_result.get("diagnosis", [])
-        next_steps = rag_result.get("nextSteps", [])
-
-        hospitals = find_nearby_hospitals(data["Latitude"], data["Longitude"])
-
-        if risk == "Bad":
-            send_email_alert(data["Email"], risk, explanation, next_steps, user_name)
-
-        response = {
-            "name": user_name,
-            "risk": risk,
-            "explanation": explanation,
-            "diagnosis": diagnosis,
-            "nextSteps": next_steps,
-            "hospitals": hospitals
-        }
-        return jsonify(response)
+        try:
+            patient = decode_patient(body)
+        except (msgspec.ValidationError, msgspec.DecodeError) as e:
+            return json_response(validation_error(e, body), 400)
+        add_request_pii(patient.name, patient.email)
+        response, shared = ANALYSES.do(payload_key(patient), run_analysis, patient)
+        if shared:
+            log.info("Duplicate request shared an in-flight analysis")
+        return json_response(response)
 
     except Exception as e:
-        print("❌ Error in /analyze:", e)
-        traceback.print_exc()
+        log.exception("Error in /analyze")
         return jsonify({"error": str(e)}), 500
 
 
+# ================== Metrics ==================
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    g.stage_timings = []
+    g.request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+    set_request_context(g.request_id)
+    if request.path == "/analyze":
+        PROFILER.sync()  # follow start/stop issued through any worker
+        ADMISSION.sync()
+        if PROFILER.enabled:
+            g.profile_token = PROFILER.begin_request()
+
+
+@app.teardown_request
+def end_request_profile(exc):
+    token = g.pop("profile_token", None)
+    if token is not None:
+        PROFILER.end_request(token)
+
+
+@app.after_request
+def record_request_metrics(response):
+    total = time.perf_counter() - g.get("request_start", time.perf_counter())
+    if request.path == "/analyze":
+        REQUEST_SECONDS.observe(total)
+        REQUESTS.inc(str(response.status_code))
+    response.headers["Server-Timing"] = server_timing_header(g.get("stage_timings", []), total)
+    if "request_id" in g:
+        response.headers["X-Request-ID"] = g.request_id
+    SHARED_METRICS.publish()  # so a scrape served by another worker sees this one
+    return response
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return Response(render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/drift", methods=["GET"])
+def drift():
+    """Live input and prediction distribution compared with the training data"""
+    if DRIFT is None:
+        return jsonify({"error": "Drift monitoring is not enabled"}), 404
+    return json_response(DRIFT.report(force=request.args.get("refresh") == "1"))
+
+
+# ================== Admin ==================
+def admin_authorized():
+    token = request.headers.get("X-Admin-Token", "")
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token, ADMIN_TOKEN)
+
+
+@app.route("/admin/admission", methods=["GET", "POST"])
+def admission_limits():
+    """Read or change the admission limits of every worker; counters are this worker's"""
+    if not admin_authorized():
+        return jsonify({"error": "Forbidden"}), 403
+    if request.method == "POST":
+        limits = request.get_json(silent=True) or {}
+        try:
+            snapshot = ADMISSION.update_limits(limits.get("max_llm_in_flight"),
+                                               limits.get("max_requests_in_flight"))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        log.info("Admission limits updated", limits=snapshot)
+        return jsonify(snapshot)
+    ADMISSION.sync(force=True)
+    return jsonify(ADMISSION.snapshot())
+
+
+@app.route("/admin/results", methods=["GET"])
+def stored_results():
+    """Stored analyses, newest first: ?risk=Bad&since=<unix time>&until=<unix time>&limit=100"""
+    if not admin_authorized():
+        return jsonify({"error": "Forbidden"}), 403
+    if RESULTS is None:
+        return jsonify({"error": "Result store is not enabled"}), 404
+    since = request.args.get("since", type=float)
+    until = request.args.get("until", type=float)
+    limit = max(1, min(request.args.get("limit", 100, type=int), 1000))
+    return json_response(RESULTS.query(since, until, request.args.get("risk"), limit))
+
+
+@app.route("/admin/profile", methods=["GET", "POST", "DELETE"])
+def profile_control():
+    """Start (POST), stop (DELETE) or inspect profiling of /analyze in all workers"""
+    if not admin_authorized():
+        return jsonify({"error": "Forbidden"}), 403
+    if request.method == "POST":
+        options = request.get_json(silent=True) or {}
+        try:
+            snapshot = PROFILER.start(options.get("mode", "sampling"),
+                                      float(options.get("sample_rate", 0.1)),
+                                      float(options.get("duration_seconds", 300)),
+                                      float(options.get("interval_ms", 5)))
+        except (TypeError, ValueError) as e:
+            return jsonify({"error": str(e)}), 400
+        log.info("Profiling started", profile=snapshot)
+        return jsonify(snapshot)
+    if request.method == "DELETE":
+        snapshot = PROFILER.stop()
+        log.info("Profiling stopped", profile=snapshot)
+        return jsonify(snapshot)
+    return jsonify(PROFILER.snapshot())
+
+
+@app.route("/admin/profile/pstats", methods=["GET"])
+def profile_pstats():
+    if not admin_authorized():
+        return jsonify({"error": "Forbidden"}), 403
+    data = PROFILER.pstats_bytes()
+    if data is None:
+        return jsonify({"error": "No cProfile data collected"}), 404
+    return Response(data, mimetype="application/octet-stream",
+                    headers={"Content-Disposition": f"attachment; filename=analyze.pstats"})
+
+
+@app.route("/admin/profile/collapsed", methods=["GET"])
+def profile_collapsed():
+    if not admin_authorized():
+        return jsonify({"error": "Forbidden"}), 403
+    data = PROFILER.collapsed_stacks()
+    if data is None:
+        return jsonify({"error": "No stack samples collected"}), 404
+    return Response(data, mimetype="text/plain",
+                    headers={"Content-Disposition": f"attachment; filename=analyze.folded"})
+
+
 @app.route("/", methods=["GET"])
 def home():
     return jsonify({"status": "ok", "message": "Smart Health API Running"})
@@ -0,0 +1,286 @@
+"""
+Local stand-ins for the three external services used by /analyze:
+
+- an OpenAI/Groq-compatible chat completions endpoint (with optional
+  token streaming) for the RAG answer,
+- an Overpass interpreter endpoint serving fixture JSON,
+- an SMTP sink that accepts and counts alert emails.
+
+Point the app at them with:
+    GROQ_API_BASE=http://127.0.0.1:8001  GROQ_API_KEY=fake
+    OVERPASS_URL=http://127.0.0.1:8002/api/interpreter
+    SMTP_HOST=127.0.0.1 SMTP_PORT=8025 SMTP_STARTTLS=false
+"""
+import os
+import json
+import time
+import random
+import argparse
+import threading
+import socketserver
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+CANNED_ANSWER = """Your Personal Health Report
+
+1. Explanation of Your Results & Risk Level
+Based on the information provided, your results indicate a Moderate Risk that warrants attention. Your blood pressure and cholesterol are above the recommended range.
+
+2. What This Could Mean (Possible Diagnosis)
+This is not a formal diagnosis. The pattern of your vitals is commonly associated with Primary Hypertension.
+
+3. Your Suggested Next Steps
+* Schedule a follow-up appointment with your primary care provider.
+* Monitor your blood pressure at home and keep a log of readings.
+* Reduce sodium intake and add regular brisk walking to your week.
+"""
+
+
+class ServerStats:
+    """Request counters shared by the fake servers"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = {}
+
+    def incr(self, name):
+        with self.lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.counts)
+
+
+STATS = ServerStats()
+
+
+class _JSONHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config = {}
+
+    def log_message(self, format, *args):
+        pass  # keep the load test output readable
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return self.rfile.read(length) if length else b""
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _maybe_fail(self, name):
+        """Apply configured latency and failure rate; True if the request failed"""
+        latency = self.config.get("latency_ms", 0) / 1000
+        jitter = self.config.get("jitter_ms", 0) / 1000
+        time.sleep(max(0.0, latency + random.uniform(-jitter, jitter)))
+        if random.random() < self.config.get("failure_rate", 0.0):
+            STATS.incr(f"{name}_failures")
+            self._send_json(503, {"error": {"message": "injected failure"}})
+            return True
+        return False
+
+    def do_GET(self):
+        if self.path == "/stats":
+            self._send_json(200, STATS.snapshot())
+        else:
+            self._send_json(404, {"error": "not found"})
+
+
+class GroqHandler(_JSONHandler):
+    """OpenAI-compatible /chat/completions with optional SSE streaming"""
+
+    def do_POST(self):
+        if not self.path.endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+        request = json.loads(self._read_body() or b"{}")
+        STATS.incr("groq_requests")
+        if self._maybe_fail("groq"):
+            return
+
+        model = request.get("model", "fake-llm")
+        created = int(time.time())
+        completion_id = f"chatcmpl-{random.getrandbits(48):x}"
+        if request.get("stream"):
+            self._stream(completion_id, created, model)
+            return
+
+        tokens = CANNED_ANSWER.split(" ")
+        self._send_json(200, {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": CANNED_ANSWER},
+                "finish_reason": "stop"
+            }],
+            "usage": {"prompt_tokens": 500, "completion_tokens": len(tokens), "total_tokens": 500 + len(tokens)}
+        })
+
+    def _stream(self, completion_id, created, model):
+        """Send the answer word by word at the configured token rate"""
+        delay = 1 / self.config.get("tokens_per_sec", 200)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def send_event(payload):
+            data = f"data: {payload}\n\n".encode()
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+        for i, token in enumerate(CANNED_ANSWER.split(" ")):
+            delta = {"content": token if i == 0 else " " + token}
+            send_event(json.dumps({
+                "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": None}]
+            }))
+            time.sleep(delay)
+        send_event(json.dumps({
+            "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]
+        }))
+        send_event("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+
+
+class OverpassHandler(_JSONHandler):
+    """Overpass /api/interpreter returning a fixture"""
+
+    fixture = None
+
+    def do_POST(self):
+        self._read_body()
+        STATS.incr("overpass_requests")
+        if self._maybe_fail("overpass"):
+            return
+        self._send_json(200, self.fixture)
+
+
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+    """
+    Just enough SMTP to satisfy smtplib: EHLO, AUTH, MAIL, RCPT, DATA,
+    RSET, NOOP, QUIT. Messages are counted and discarded.
+    """
+
+    def _reply(self, line):
+        self.wfile.write((line + "\r\n").encode())
+
+    def handle(self):
+        self._reply("220 fake-smtp ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors="replace").strip()
+            verb = command.split(" ", 1)[0].upper()
+            if verb == "EHLO":
+                self._reply("250-fake-smtp")
+                self._reply("250-AUTH PLAIN LOGIN")
+                self._reply("250 SIZE 10485760")
+            elif verb == "HELO":
+                self._reply("250 fake-smtp")
+            elif verb == "AUTH":
+                self._reply("235 2.7.0 Authentication successful")
+            elif verb in ("MAIL", "RCPT", "RSET", "NOOP"):
+                self._reply("250 OK")
+            elif verb == "DATA":
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                while self.rfile.readline() not in (b".\r\n", b".\n", b""):
+                    pass
+                STATS.incr("smtp_messages")
+                self._reply("250 OK: queued")
+            elif verb == "QUIT":
+                self._reply("221 Bye")
+                return
+            else:
+                self._reply("502 Command not implemented")
+
+
+class ThreadingSMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def _handler(base, **config):
+    return type(base.__name__, (base,), {"config": config})
+
+
+def _load_overpass_fixture(name):
+    with open(os.path.join(FIXTURE_DIR, name)) as f:
+        OverpassHandler.fixture = json.load(f)
+
+
+def _serve_in_background(server):
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def start_overpass_mirror(port, latency_ms=300, failure_rate=0.0, host="127.0.0.1",
+                          overpass_fixture="overpass_hospitals.json"):
+    """One more fake Overpass server, e.g. a slow or failing mirror for hedging tests"""
+    _load_overpass_fixture(overpass_fixture)
+    return _serve_in_background(ThreadingHTTPServer((host, port), _handler(
+        OverpassHandler, latency_ms=latency_ms, failure_rate=failure_rate)))
+
+
+def start_fake_servers(host="127.0.0.1", groq_port=8001, overpass_port=8002, smtp_port=8025,
+                       llm_latency_ms=800, llm_tokens_per_sec=200, llm_failure_rate=0.0,
+                       overpass_latency_ms=300, overpass_failure_rate=0.0,
+                       overpass_fixture="overpass_hospitals.json"):
+    """Start all three servers on background threads and return them"""
+    _load_overpass_fixture(overpass_fixture)
+    servers = [
+        ThreadingHTTPServer((host, groq_port), _handler(
+            GroqHandler, latency_ms=llm_latency_ms, tokens_per_sec=llm_tokens_per_sec,
+            failure_rate=llm_failure_rate)),
+        ThreadingHTTPServer((host, overpass_port), _handler(
+            OverpassHandler, latency_ms=overpass_latency_ms, failure_rate=overpass_failure_rate)),
+        ThreadingSMTPServer((host, smtp_port), SMTPSinkHandler),
+    ]
+    for server in servers:
+        _serve_in_background(server)
+
+    print(f"Fake Groq     http://{host}:{groq_port}  (latency {llm_latency_ms}ms)")
+    print(f"Fake Overpass http://{host}:{overpass_port}/api/interpreter  (latency {overpass_latency_ms}ms)")
+    print(f"SMTP sink     {host}:{smtp_port}")
+    return servers
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run local fake Groq, Overpass and SMTP servers")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--groq-port", type=int, default=8001)
+    parser.add_argument("--overpass-port", type=int, default=8002)
+    parser.add_argument("--smtp-port", type=int, default=8025)
+    parser.add_argument("--llm-latency-ms", type=float, default=800)
+    parser.add_argument("--llm-tokens-per-sec", type=float, default=200)
+    parser.add_argument("--llm-failure-rate", type=float, default=0.0)
+    parser.add_argument("--overpass-latency-ms", type=float, default=300)
+    parser.add_argument("--overpass-failure-rate", type=float, default=0.0)
+    parser.add_argument("--overpass-fixture", default="overpass_hospitals.json")
+    args = parser.parse_args()
+
+    start_fake_servers(args.host, args.groq_port, args.overpass_port, args.smtp_port,
+                       args.llm_latency_ms, args.llm_tokens_per_sec, args.llm_failure_rate,
+                       args.overpass_latency_ms, args.overpass_failure_rate, args.overpass_fixture)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print("\nRequest counts:", STATS.snapshot())
+
+
+if __name__ == "__main__":
+    main()
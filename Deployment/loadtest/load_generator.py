@@ -0,0 +1,189 @@
+"""
+Closed-loop load generator for /analyze.
+
+Each of --concurrency workers sends requests back to back for --duration
+seconds (after a short warm-up). Latency percentiles, throughput and error
+rate are printed and saved under results/ with the current git commit, so
+runs can be compared across commits with --compare.
+"""
+import os
+import json
+import math
+import time
+import random
+import argparse
+import threading
+import subprocess
+from datetime import datetime
+import requests
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def random_patient(rng):
+    """A plausible /analyze payload"""
+    return {
+        "Name": f"Load Test {rng.randint(1, 10 ** 6)}",
+        "Gender": rng.choice(["Male", "Female"]),
+        "Age": rng.randint(18, 80),
+        "Systolic BP": rng.randint(105, 150),
+        "Diastolic BP": rng.randint(65, 95),
+        "Cholesterol": rng.randint(140, 240),
+        "BMI": round(rng.uniform(18, 35), 1),
+        "Smoker": rng.random() < 0.45,
+        "Diabetes": rng.random() < 0.45,
+        "Email": "loadtest@example.com",
+        "Latitude": 37.7749 + rng.uniform(-0.05, 0.05),
+        "Longitude": -122.4194 + rng.uniform(-0.05, 0.05)
+    }
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, math.ceil(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+class LoadGenerator:
+    def __init__(self, url, concurrency=8, duration=30, warmup=5, timeout=60, seed=42):
+        self.url = url
+        self.concurrency = concurrency
+        self.duration = duration
+        self.warmup = warmup
+        self.timeout = timeout
+        self.seed = seed
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.statuses = {}
+        self.errors = 0
+
+    def _worker(self, worker_id, start_at, stop_at):
+        rng = random.Random(self.seed + worker_id)
+        session = requests.Session()
+        while True:
+            now = time.perf_counter()
+            if now >= stop_at:
+                return
+            sent = time.perf_counter()
+            try:
+                response = session.post(self.url, json=random_patient(rng), timeout=self.timeout)
+                status = str(response.status_code)
+                ok = response.status_code == 200
+            except requests.RequestException as e:
+                status = type(e).__name__
+                ok = False
+            elapsed = time.perf_counter() - sent
+
+            if sent < start_at:
+                continue  # warm-up request, not recorded
+            with self.lock:
+                self.latencies.append(elapsed)
+                self.statuses[status] = self.statuses.get(status, 0) + 1
+                if not ok:
+                    self.errors += 1
+
+    def run(self):
+        print(f"Driving {self.url} with {self.concurrency} workers for {self.duration}s "
+              f"(+{self.warmup}s warm-up)...")
+        begin = time.perf_counter()
+        start_at = begin + self.warmup
+        stop_at = start_at + self.duration
+        threads = [threading.Thread(target=self._worker, args=(i, start_at, stop_at))
+                   for i in range(self.concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        measured = time.perf_counter() - start_at
+        return self.summarize(measured)
+
+    def summarize(self, measured_seconds):
+        latencies_ms = sorted(l * 1000 for l in self.latencies)
+        total = len(latencies_ms)
+        return {
+            'commit': git_commit(),
+            'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'config': {
+                'url': self.url,
+                'concurrency': self.concurrency,
+                'duration_seconds': self.duration,
+                'warmup_seconds': self.warmup
+            },
+            'requests': total,
+            'throughput_rps': total / measured_seconds if measured_seconds > 0 else 0.0,
+            'error_rate': self.errors / total if total else 0.0,
+            'latency_ms': {
+                'p50': percentile(latencies_ms, 50),
+                'p95': percentile(latencies_ms, 95),
+                'p99': percentile(latencies_ms, 99),
+                'max': latencies_ms[-1] if latencies_ms else None
+            },
+            'status_counts': self.statuses
+        }
+
+
+def save_results(results, label=None):
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    name = f"{stamp}_{results['commit']}" + (f"_{label}" if label else "") + ".json"
+    path = os.path.join(RESULTS_DIR, name)
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to {path}")
+    return path
+
+
+def print_results(results, baseline=None):
+    latency = results['latency_ms']
+    print(f"\nRequests:   {results['requests']}")
+    if not results['requests']:
+        return
+    print(f"Throughput: {results['throughput_rps']:.2f} req/s")
+    print(f"Error rate: {results['error_rate']:.2%}")
+    print(f"Latency:    p50 {latency['p50']:.1f}ms  p95 {latency['p95']:.1f}ms  p99 {latency['p99']:.1f}ms")
+    print(f"Statuses:   {results['status_counts']}")
+
+    if baseline:
+        print(f"\nCompared with {baseline['commit']} ({baseline['timestamp']}):")
+        rows = [('throughput_rps', results['throughput_rps'], baseline['throughput_rps']),
+                ('error_rate', results['error_rate'], baseline['error_rate'])]
+        rows += [(f"latency {q}", latency[q], baseline['latency_ms'][q]) for q in ('p50', 'p95', 'p99')]
+        for name, current, previous in rows:
+            change = (current - previous) / previous * 100 if previous else float('nan')
+            print(f"  {name:<15} {previous:10.2f} -> {current:10.2f}  ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the /analyze endpoint")
+    parser.add_argument("--url", default="http://127.0.0.1:5000/analyze")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--warmup", type=float, default=5)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--label", help="Suffix for the results file name")
+    parser.add_argument("--compare", help="Previous results JSON to compare against")
+    args = parser.parse_args()
+
+    generator = LoadGenerator(args.url, args.concurrency, args.duration, args.warmup, args.timeout)
+    results = generator.run()
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+    save_results(results, args.label)
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Memory used by a running server and its workers.
+
+RSS counts shared copy-on-write pages in every process, so it overstates
+the cost of extra workers. USS (memory unique to the process) is what a
+worker really adds, and PSS splits shared pages between the processes
+that share them. Linux only for USS/PSS.
+
+    python Deployment/loadtest/memory_report.py <master pid>
+"""
+import sys
+import json
+import psutil
+
+
+def memory_report(pid):
+    master = psutil.Process(pid)
+    processes = [master] + master.children(recursive=True)
+    rows = []
+    for process in processes:
+        info = process.memory_full_info()
+        rows.append({
+            'pid': process.pid,
+            'role': 'master' if process.pid == pid else 'worker',
+            'rss_mb': info.rss / 1024 ** 2,
+            'uss_mb': getattr(info, 'uss', 0) / 1024 ** 2,
+            'pss_mb': getattr(info, 'pss', 0) / 1024 ** 2,
+        })
+    workers = [r for r in rows if r['role'] == 'worker']
+    return {
+        'processes': rows,
+        'workers': len(workers),
+        'total_pss_mb': sum(r['pss_mb'] for r in rows),
+        'mean_worker_uss_mb': sum(r['uss_mb'] for r in workers) / len(workers) if workers else None,
+    }
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python memory_report.py <master pid>")
+        return None
+    report = memory_report(int(sys.argv[1]))
+    for row in report['processes']:
+        print(f"  {row['role']:<7} {row['pid']:>7}  RSS {row['rss_mb']:8.1f} MB  "
+              f"USS {row['uss_mb']:8.1f} MB  PSS {row['pss_mb']:8.1f} MB")
+    print(f"Total PSS: {report['total_pss_mb']:.1f} MB across {len(report['processes'])} processes")
+    if report['mean_worker_uss_mb'] is not None:
+        print(f"Memory added per worker (mean USS): {report['mean_worker_uss_mb']:.1f} MB")
+    print(json.dumps(report, indent=2))
+    return report
+
+
+if __name__ == "__main__":
+    main()
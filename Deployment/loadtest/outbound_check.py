@@ -0,0 +1,88 @@
+"""
+Checks the outbound layer (Deployment/outbound.py) against local fake
+Overpass servers:
+
+1. hedging: a slow primary and a fast mirror; once the hedge delay has
+   passed the mirror answers and the call returns well before the primary;
+2. failover: a failing primary is skipped for the mirror immediately;
+3. circuit breaker: a dependency that keeps failing is short-circuited,
+   and one probe after the cool-down closes it again once it recovers.
+
+    python Deployment/loadtest/outbound_check.py
+"""
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from Deployment.outbound import make_session, HedgedClient, CircuitBreaker, CircuitOpenError
+from fake_servers import start_overpass_mirror, STATS
+
+HOST = "127.0.0.1"
+
+
+def url(port):
+    return f"http://{HOST}:{port}/api/interpreter"
+
+
+def check(name, passed, detail):
+    print(f"{'PASS' if passed else 'FAIL'}  {name}: {detail}")
+    return passed
+
+
+def check_hedging(session):
+    start_overpass_mirror(18101, latency_ms=1500, host=HOST)
+    start_overpass_mirror(18102, latency_ms=50, host=HOST)
+    client = HedgedClient("overpass", [url(18101), url(18102)], session,
+                          timeout=5, default_hedge_delay=0.2)
+    start = time.perf_counter()
+    response = client.post(data={"data": "[out:json];"})
+    elapsed = time.perf_counter() - start
+    return check("hedging", response.ok and elapsed < 1.0,
+                 f"answered in {elapsed * 1000:.0f}ms with a 1500ms primary and a 200ms hedge delay")
+
+
+def check_failover(session):
+    start_overpass_mirror(18103, latency_ms=0, failure_rate=1.0, host=HOST)
+    client = HedgedClient("overpass", [url(18103), url(18102)], session,
+                          timeout=5, default_hedge_delay=2.0)
+    start = time.perf_counter()
+    response = client.post(data={"data": "[out:json];"})
+    elapsed = time.perf_counter() - start
+    return check("failover", response.ok and elapsed < 1.0,
+                 f"mirror answered {elapsed * 1000:.0f}ms after the primary returned 503")
+
+
+def check_breaker(session):
+    client = HedgedClient("overpass", [url(18103)], session, timeout=5)
+    breaker = CircuitBreaker("overpass", failure_threshold=3, reset_timeout=0.5)
+    outcomes = []
+    for _ in range(6):
+        try:
+            with breaker.guard():
+                client.post(data={"data": "[out:json];"})
+            outcomes.append("ok")
+        except CircuitOpenError:
+            outcomes.append("short-circuited")
+        except Exception:
+            outcomes.append("failed")
+    opened = outcomes == ["failed"] * 3 + ["short-circuited"] * 3
+
+    # Recovered dependency: after the cool-down one probe closes the circuit
+    time.sleep(0.6)
+    client.urls = [url(18102)]
+    with breaker.guard():
+        client.post(data={"data": "[out:json];"})
+    return check("circuit breaker", opened and breaker.state == "closed",
+                 f"calls: {outcomes}; after cool-down and a good probe: {breaker.state}")
+
+
+def main():
+    session = make_session()
+    results = [check_hedging(session), check_failover(session), check_breaker(session)]
+    print("Fake server counts:", STATS.snapshot())
+    return all(results)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
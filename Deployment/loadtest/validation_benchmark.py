@@ -0,0 +1,127 @@
+"""
+CPU cost of decoding, validating and encoding /analyze payloads.
+
+Compares the previous path (json.loads, required-key check, per-field
+float()/bool() coercion, json.dumps response) with the msgspec schemas,
+for single payloads and for batches. Times are process CPU time, so they
+are not affected by other load on the machine.
+
+    python Deployment/loadtest/validation_benchmark.py --batch-size 100
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from schemas import decode_patient, decode_patients, encode_json
+from load_generator import random_patient
+
+REQUIRED = [
+    "Name", "Gender", "Age", "Systolic BP", "Diastolic BP",
+    "Cholesterol", "BMI", "Smoker", "Diabetes",
+    "Email", "Latitude", "Longitude"
+]
+
+SAMPLE_RESPONSE = {
+    "risk": "Fair",
+    "explanation": "Based on the information provided, your results indicate a Moderate Risk. " * 8,
+    "diagnosis": "The pattern of your vitals is commonly associated with Primary Hypertension. " * 4,
+    "nextSteps": ["Schedule a follow-up appointment.", "Monitor your blood pressure at home.",
+                  "Reduce sodium intake and walk regularly."],
+    "hospitals": [{"name": f"Hospital {i}", "type": "General", "address": "Market Street",
+                   "latitude": 37.77, "longitude": -122.41} for i in range(5)]
+}
+
+
+def legacy_features(data):
+    """The coercion classify_risk used to do"""
+    gender = 1 if str(data.get("Gender", "")).lower() in ["female", "f"] else 2
+    return [gender, float(data.get("Age", 0)), float(data.get("Systolic BP", 0)),
+            float(data.get("Diastolic BP", 0)), float(data.get("Cholesterol", 0)),
+            float(data.get("BMI", 0)), int(bool(data.get("Smoker", False))),
+            int(bool(data.get("Diabetes", False)))]
+
+
+def legacy_single(body):
+    data = json.loads(body)
+    missing = [r for r in REQUIRED if r not in data]
+    if missing:
+        raise ValueError(missing)
+    features = legacy_features(data)
+    return json.dumps(dict(SAMPLE_RESPONSE, name=data["Name"])).encode(), features
+
+
+def schema_single(body):
+    patient = decode_patient(body)
+    features = patient.features()
+    return encode_json(dict(SAMPLE_RESPONSE, name=patient.name)), features
+
+
+def legacy_batch(body):
+    rows = json.loads(body)
+    results = []
+    for data in rows:
+        missing = [r for r in REQUIRED if r not in data]
+        if missing:
+            raise ValueError(missing)
+        results.append(dict(SAMPLE_RESPONSE, name=data["Name"], features=legacy_features(data)))
+    return json.dumps(results).encode()
+
+
+def schema_batch(body):
+    patients = decode_patients(body)
+    return encode_json([dict(SAMPLE_RESPONSE, name=p.name, features=p.features()) for p in patients])
+
+
+def cpu_time_per_call(func, bodies, repeat):
+    """Mean process CPU seconds per call over repeat passes through bodies"""
+    for body in bodies[:10]:
+        func(body)  # warm-up
+    start = time.process_time()
+    for _ in range(repeat):
+        for body in bodies:
+            func(body)
+    return (time.process_time() - start) / (repeat * len(bodies))
+
+
+def run_benchmark(n_payloads=1000, batch_size=100, repeat=5, seed=42):
+    rng = random.Random(seed)
+    singles = [json.dumps(random_patient(rng)).encode() for _ in range(n_payloads)]
+    batches = [json.dumps([random_patient(rng) for _ in range(batch_size)]).encode()
+               for _ in range(max(1, n_payloads // batch_size))]
+
+    results = {}
+    for name, func, bodies, per in [
+        ('single_legacy', legacy_single, singles, 1),
+        ('single_schema', schema_single, singles, 1),
+        ('batch_legacy', legacy_batch, batches, batch_size),
+        ('batch_schema', schema_batch, batches, batch_size),
+    ]:
+        seconds = cpu_time_per_call(func, bodies, repeat)
+        results[name] = {'us_per_call': seconds * 1e6, 'us_per_payload': seconds * 1e6 / per}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark /analyze payload validation CPU cost")
+    parser.add_argument("--payloads", type=int, default=1000)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    results = run_benchmark(args.payloads, args.batch_size, args.repeat)
+    print(f"{'path':<15} {'CPU us/call':>12} {'CPU us/payload':>15}")
+    for name, row in results.items():
+        print(f"{name:<15} {row['us_per_call']:12.1f} {row['us_per_payload']:15.2f}")
+    for kind in ('single', 'batch'):
+        legacy = results[f'{kind}_legacy']['us_per_payload']
+        schema = results[f'{kind}_schema']['us_per_payload']
+        print(f"{kind}: schema path uses {schema / legacy:.2f}x the CPU of the legacy path")
+    return results
+
+
+if __name__ == "__main__":
+    main()
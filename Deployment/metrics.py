@@ -0,0 +1,299 @@
+"""
+Lightweight in-process metrics for the API: Prometheus-style histograms
+and counters rendered on /metrics, plus per-request stage timings for the
+Server-Timing header. Recording a sample is a perf_counter() call, a
+bisect and a short lock, so it is cheap enough for the hot path.
+
+Each gunicorn worker keeps its own series, so /metrics must not just
+render the scraped worker's. Like prometheus_client's multiprocess mode,
+every worker publishes its series to <METRICS_DIR>/<server>/<pid>.json
+(at most once per SYNC_INTERVAL after a request, and whenever it serves a
+scrape), and the scrape merges the files of all workers. Counters and
+histograms are summed, including those of workers that have exited, so
+totals never go down when gunicorn recycles a worker. Gauges are summed
+over live workers, or reported per worker with a pid label.
+"""
+import os
+import json
+import time
+import shutil
+import tempfile
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from flask import g, has_request_context
+from Deployment.profiling import _write_atomic
+
+# Seconds; covers sub-millisecond model calls up to slow LLM responses
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0)
+
+REGISTRY = []
+SYNC_INTERVAL = 1.0
+DEFAULT_METRICS_DIR = os.path.join(tempfile.gettempdir(), "smart_health_metrics")
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values)) + (extra or [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class Counter:
+    type_name = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def export(self):
+        """This process's series, as JSON-serialisable [labels, value] pairs"""
+        with self._lock:
+            return [[list(labels), value] for labels, value in self._values.items()]
+
+    def merge(self, exports):
+        """Sum the series of every worker; exports is a list of (pid, alive, export)"""
+        merged = {}
+        for _, _, export in exports:
+            for labels, value in export:
+                merged[tuple(labels)] = merged.get(tuple(labels), 0) + value
+        return merged
+
+    def render(self, values=None):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        if values is None:
+            with self._lock:
+                values = dict(self._values)
+        labelnames = self.labelnames + (('pid',) if getattr(self, 'aggregate', None) == 'all' else ())
+        for labels, value in values.items():
+            lines.append(f"{self.name}{_format_labels(labelnames, labels)} {value}")
+        return lines
+
+
+class Gauge(Counter):
+    """aggregate: "sum" over live workers, or "all" for one series per worker"""
+    type_name = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), aggregate="sum"):
+        super().__init__(name, documentation, labelnames)
+        self.aggregate = aggregate
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    def merge(self, exports):
+        merged = {}
+        for pid, alive, export in exports:
+            if not alive:
+                continue  # an exited worker has nothing in flight
+            for labels, value in export:
+                if self.aggregate == "all":
+                    merged[tuple(labels) + (pid,)] = value
+                else:
+                    merged[tuple(labels)] = merged.get(tuple(labels), 0) + value
+        return merged
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def export(self):
+        with self._lock:
+            return [[list(labels), list(s[0]), s[1], s[2]] for labels, s in self._series.items()]
+
+    def merge(self, exports):
+        merged = {}
+        for _, _, export in exports:
+            for labels, counts, total, count in export:
+                series = merged.setdefault(tuple(labels), [[0] * len(counts), 0.0, 0])
+                series[0] = [a + b for a, b in zip(series[0], counts)]
+                series[1] += total
+                series[2] += count
+        return merged
+
+    def render(self, series=None):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        if series is None:
+            with self._lock:
+                series = {labels: (list(s[0]), s[1], s[2]) for labels, s in self._series.items()}
+        for labels, (counts, total, count) in series.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, [('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class SharedMetrics:
+    """Publishes this worker's series and merges those of all workers"""
+
+    def __init__(self, shared_dir=DEFAULT_METRICS_DIR):
+        self.shared_dir = shared_dir
+        self._next_sync = 0.0
+        self._cleaned = False
+        self._sync_lock = threading.Lock()
+
+    def _server_dir(self):
+        # Keyed by the gunicorn master (the workers' parent), so files left
+        # by a previous run of the server are not merged in
+        return os.path.join(self.shared_dir, str(os.getppid()))
+
+    def _remove_dead_servers(self):
+        try:
+            names = os.listdir(self.shared_dir)
+        except OSError:
+            return
+        for name in names:
+            if name.isdigit() and int(name) != os.getppid() and not _pid_alive(int(name)):
+                shutil.rmtree(os.path.join(self.shared_dir, name), ignore_errors=True)
+
+    def publish(self, force=False):
+        """Write this worker's series; cheap when called per request"""
+        now = time.monotonic()
+        if not force and now < self._next_sync:
+            return
+        if not self._sync_lock.acquire(blocking=force):
+            return
+        try:
+            self._next_sync = now + SYNC_INTERVAL
+            server_dir = self._server_dir()
+            os.makedirs(server_dir, exist_ok=True)
+            if not self._cleaned:
+                self._cleaned = True
+                self._remove_dead_servers()
+            state = {metric.name: metric.export() for metric in REGISTRY}
+            _write_atomic(os.path.join(server_dir, f"{os.getpid()}.json"), json.dumps(state).encode())
+        except OSError:
+            pass  # metrics must never fail a request
+        finally:
+            self._sync_lock.release()
+
+    def collect(self):
+        """{metric name: [(pid, alive, export), ...]} over every worker's file"""
+        server_dir = self._server_dir()
+        try:
+            names = os.listdir(server_dir)
+        except OSError:
+            return {}
+        collected = {}
+        for name in names:
+            if not name.endswith(".json"):
+                continue
+            pid = int(name[:-len(".json")])
+            try:
+                with open(os.path.join(server_dir, name)) as f:
+                    state = json.load(f)
+            except (OSError, ValueError):
+                continue
+            alive = pid == os.getpid() or _pid_alive(pid)
+            for metric_name, export in state.items():
+                collected.setdefault(metric_name, []).append((pid, alive, export))
+        return collected
+
+
+SHARED_METRICS = SharedMetrics(os.getenv("METRICS_DIR") or DEFAULT_METRICS_DIR)
+
+
+def render_prometheus():
+    """Text exposition format for every registered metric, merged across workers"""
+    SHARED_METRICS.publish(force=True)
+    collected = SHARED_METRICS.collect()
+    lines = []
+    for metric in REGISTRY:
+        exports = collected.get(metric.name)
+        lines.extend(metric.render(metric.merge(exports)) if exports else metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ================== Metrics ==================
+STAGE_SECONDS = Histogram("analyze_stage_seconds", "Time spent in each /analyze stage", ["stage"])
+REQUEST_SECONDS = Histogram("analyze_request_seconds", "End-to-end /analyze latency")
+REQUESTS = Counter("analyze_requests_total", "/analyze responses by status code", ["status"])
+EXTERNAL_FAILURES = Counter("external_call_failures_total", "Failed calls to external services", ["dependency"])
+RAG_FALLBACKS = Counter("rag_fallbacks_total", "Requests answered with the 'RAG analysis failed.' fallback")
+CACHE_HITS = Counter("cache_hits_total", "Cache hits by cache name", ["cache"])
+REQUESTS_IN_FLIGHT = Gauge("analyze_requests_in_flight", "/analyze requests being handled")
+LLM_IN_FLIGHT = Gauge("llm_calls_in_flight", "RAG calls holding an LLM slot")
+CIRCUIT_STATE = Gauge("circuit_breaker_state", "0 closed, 1 open, 2 half-open", ["dependency"], aggregate="all")
+CIRCUIT_REJECTIONS = Counter("circuit_breaker_rejections_total", "Calls skipped by an open circuit", ["dependency"])
+HEDGED_REQUESTS = Counter("hedged_requests_total", "Requests re-sent to another mirror after the hedge delay", ["dependency"])
+DUPLICATE_REQUESTS = Counter("duplicate_requests_total", "Duplicates answered from an in-flight computation or suppressed", ["kind"])
+DEGRADED_REQUESTS = Counter("degraded_requests_total", "Requests answered with a stage shed", ["stage"])
+RESULTS_WRITTEN = Counter("result_sink_written_total", "Analysis results written to the result store")
+RESULTS_DROPPED = Counter("result_sink_dropped_total", "Analysis results dropped (buffer full or write error)")
+
+
+@contextmanager
+def stage_timer(stage, dependency=None):
+    """
+    Time a stage into the histogram and the current request's
+    Server-Timing entries. If the block raises and a dependency is named,
+    the failure is counted against it before the exception propagates.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        if dependency:
+            EXTERNAL_FAILURES.inc(dependency)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage)
+        if has_request_context():
+            g.setdefault("stage_timings", []).append((stage, elapsed))
+
+
+def server_timing_header(timings, total=None):
+    """Build a Server-Timing value such as 'classify_risk;dur=0.41, llm;dur=812.3'"""
+    entries = [f"{stage};dur={elapsed * 1000:.2f}" for stage, elapsed in timings]
+    if total is not None:
+        entries.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(entries)
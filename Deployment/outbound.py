@@ -0,0 +1,147 @@
+"""
+Shared layer for calls to external services.
+
+- One pooled keep-alive requests.Session for all outbound HTTP.
+- CircuitBreaker: after a run of consecutive failures a dependency is
+  skipped outright for a cool-down period, then a single probe call
+  decides whether it is healthy again.
+- HedgedClient: POSTs to the first of a list of mirrors and, if no answer
+  has arrived by the configured latency percentile of recent calls, sends
+  the same request to the next mirror; the first success wins.
+"""
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import requests
+from requests.adapters import HTTPAdapter
+from Deployment.metrics import CIRCUIT_STATE, CIRCUIT_REJECTIONS, HEDGED_REQUESTS
+
+CONNECT_TIMEOUT = 3.05
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+STATE_VALUES = {CLOSED: 0, OPEN: 1, HALF_OPEN: 2}
+
+
+def make_session(pool_maxsize=32):
+    """Session whose connection pool is large enough for every worker thread"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=8, pool_maxsize=pool_maxsize, max_retries=0)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+        CIRCUIT_STATE.set(STATE_VALUES[CLOSED], name)
+
+    def _set_state(self, state):
+        self.state = state
+        CIRCUIT_STATE.set(STATE_VALUES[state], self.name)
+
+    def allow(self):
+        """
+        True if a call may go ahead. Once the cool-down has passed exactly
+        one caller is let through as a probe; it must report back with
+        record_success() or record_failure().
+        """
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self._set_state(HALF_OPEN)
+                return True
+            CIRCUIT_REJECTIONS.inc(self.name)
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            if self.state != CLOSED:
+                self._set_state(CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                self._set_state(OPEN)
+
+    @contextmanager
+    def guard(self):
+        """Raise CircuitOpenError if open, otherwise record the block's outcome"""
+        if not self.allow():
+            raise CircuitOpenError(f"{self.name} circuit is open")
+        try:
+            yield
+        except Exception:
+            self.record_failure()
+            raise
+        self.record_success()
+
+    def snapshot(self):
+        return {'state': self.state, 'consecutive_failures': self.failures}
+
+
+class HedgedClient:
+    def __init__(self, name, urls, session, timeout=10.0, hedge_percentile=90,
+                 default_hedge_delay=1.0, min_samples=20, window=200, max_workers=32):
+        self.name = name
+        self.urls = list(urls)
+        self.session = session
+        self.timeout = (CONNECT_TIMEOUT, timeout)
+        self.hedge_percentile = hedge_percentile
+        self.default_hedge_delay = default_hedge_delay
+        self.min_samples = min_samples
+        self.latencies = deque(maxlen=window)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}-outbound")
+
+    def hedge_delay(self):
+        """Seconds to wait on a mirror before sending the next one the same request"""
+        samples = sorted(self.latencies)
+        if len(samples) < self.min_samples:
+            return self.default_hedge_delay
+        return max(0.05, samples[int(self.hedge_percentile / 100 * (len(samples) - 1))])
+
+    def _post(self, url, kwargs):
+        start = time.perf_counter()
+        response = self.session.post(url, timeout=self.timeout, **kwargs)
+        response.raise_for_status()
+        self.latencies.append(time.perf_counter() - start)
+        return response
+
+    def post(self, **kwargs):
+        """POST to the mirrors, hedging after hedge_delay(); returns the first good response"""
+        delay = self.hedge_delay()
+        pending = {self._executor.submit(self._post, self.urls[0], kwargs)}
+        next_mirror = 1
+        last_error = None
+        while pending:
+            can_hedge = next_mirror < len(self.urls)
+            done, pending = wait(pending, timeout=delay if can_hedge else None,
+                                 return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    return future.result()
+                except Exception as e:
+                    last_error = e
+            # Hedge on a slow answer, fail over at once on an error
+            if can_hedge and (not done or not pending):
+                if not done:
+                    HEDGED_REQUESTS.inc(self.name)
+                pending.add(self._executor.submit(self._post, self.urls[next_mirror], kwargs))
+                next_mirror += 1
+        raise last_error
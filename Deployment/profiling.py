@@ -0,0 +1,329 @@
+"""
+On-demand profiling of /analyze across all gunicorn workers.
+
+Off by default; the request hooks then only compare a timestamp. An admin
+turns it on for a while with a sample rate and one of two modes:
+
+- "cprofile": sampled requests run under cProfile (one at a time per
+  worker, since only one profiler can be active per interpreter); the
+  results are aggregated and downloadable as a pstats file (snakeviz,
+  pstats.Stats).
+- "sampling": a background thread records the stacks of the threads
+  serving sampled requests every interval_ms; the counts are downloadable
+  as collapsed stacks for flamegraph.pl or speedscope. Much lower
+  overhead than cProfile, so it is the default.
+
+The admin request lands on whichever worker accepts it, so the session is
+broadcast through a control file in a directory shared by the workers
+(PROFILE_DIR). Every worker checks the file at most once per
+SYNC_INTERVAL seconds and starts or stops accordingly, and writes its
+results to <session>/<pid>.* in the same directory; downloads merge the
+files of all workers. Profiling switches itself off after
+duration_seconds.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import shutil
+import marshal
+import pstats
+import cProfile
+import tempfile
+import threading
+from collections import Counter
+
+MODES = ("sampling", "cprofile")
+MAX_DURATION_SECONDS = 3600
+SYNC_INTERVAL = 1.0
+CONTROL_FILE = "control.json"
+DEFAULT_PROFILE_DIR = os.path.join(tempfile.gettempdir(), "smart_health_profile")
+
+
+def _write_atomic(path, data):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class RequestProfiler:
+    def __init__(self, shared_dir=DEFAULT_PROFILE_DIR):
+        self.shared_dir = shared_dir
+        self.enabled = False
+        self.session = None
+        self.mode = None
+        self.sample_rate = 0.0
+        self.interval = 0.005
+        self.deadline = 0.0
+        self.profiled_requests = 0
+        self.samples = 0
+        self._stats = None
+        self._stacks = Counter()
+        self._threads = set()
+        self._dirty = False
+        self._control_mtime = None
+        self._next_sync = 0.0
+        self._stop = threading.Event()
+        self._cprofile_busy = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._lock = threading.Lock()
+
+    # ---------- control, shared by all workers ----------
+    def _control_path(self):
+        return os.path.join(self.shared_dir, CONTROL_FILE)
+
+    def _session_dir(self, session):
+        return os.path.join(self.shared_dir, session)
+
+    def _read_control(self):
+        try:
+            with open(self._control_path()) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def start(self, mode="sampling", sample_rate=0.1, duration_seconds=300, interval_ms=5):
+        """Start a new profiling session in every worker; results of the previous one are discarded"""
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {MODES}")
+        if not 0 < sample_rate <= 1:
+            raise ValueError("sample_rate must be in (0, 1]")
+        if not 0 < duration_seconds <= MAX_DURATION_SECONDS:
+            raise ValueError(f"duration_seconds must be in (0, {MAX_DURATION_SECONDS}]")
+        if not 1 <= interval_ms <= 1000:
+            raise ValueError("interval_ms must be in [1, 1000]")
+
+        os.makedirs(self.shared_dir, exist_ok=True)
+        previous = self._read_control()
+        control = {
+            'session': uuid.uuid4().hex,
+            'enabled': True,
+            'mode': mode,
+            'sample_rate': sample_rate,
+            'interval_ms': interval_ms,
+            'deadline': time.time() + duration_seconds
+        }
+        os.makedirs(self._session_dir(control['session']))
+        _write_atomic(self._control_path(), json.dumps(control).encode())
+        if previous and previous.get('session'):
+            shutil.rmtree(self._session_dir(previous['session']), ignore_errors=True)
+        self.sync(force=True)
+        return self.snapshot()
+
+    def stop(self):
+        """Stop profiling in every worker; collected results stay available for download"""
+        control = self._read_control()
+        if control and control.get('enabled'):
+            control['enabled'] = False
+            _write_atomic(self._control_path(), json.dumps(control).encode())
+        self.sync(force=True)
+        return self.snapshot()
+
+    def sync(self, force=False):
+        """
+        Follow the control file: start or stop this worker's part of the
+        session and publish its results. Cheap when called per request.
+        """
+        now = time.monotonic()
+        if not force and now < self._next_sync:
+            return
+        # Request threads and the sampler may both get here; one is enough
+        if not self._sync_lock.acquire(blocking=force):
+            return
+        try:
+            self._next_sync = now + SYNC_INTERVAL
+            self._apply_control()
+        finally:
+            self._sync_lock.release()
+
+    def _apply_control(self):
+        try:
+            mtime = os.stat(self._control_path()).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime != self._control_mtime:
+            self._control_mtime = mtime
+            control = self._read_control() or {}
+            active = control.get('enabled') and time.time() < control.get('deadline', 0)
+            if active and control.get('session') != self.session:
+                self._start_local(control)
+            elif not active and self.enabled:
+                self._stop_local()
+        if self.enabled and time.time() >= self.deadline:
+            self._stop_local()
+        elif self._dirty:
+            self._publish()
+
+    # ---------- this worker ----------
+    def _start_local(self, control):
+        self._stop_local(publish=False)
+        with self._lock:
+            self.session = control['session']
+            self.mode = control['mode']
+            self.sample_rate = control['sample_rate']
+            self.interval = control['interval_ms'] / 1000
+            self.deadline = control['deadline']
+            self.profiled_requests = 0
+            self.samples = 0
+            self._stats = None
+            self._stacks = Counter()
+            self._threads = set()
+            self._dirty = False
+            self._stop = threading.Event()
+            if self.mode == "sampling":
+                threading.Thread(target=self._sample_loop, args=(self._stop,),
+                                 name="stack-sampler", daemon=True).start()
+            self.enabled = True
+
+    def _stop_local(self, publish=True):
+        self.enabled = False
+        self._stop.set()
+        if publish and self._dirty:
+            self._publish()
+
+    def _publish(self):
+        """Write this worker's results for the session, replacing its previous files"""
+        with self._lock:
+            if self.session is None:
+                return
+            self._dirty = False
+            session_dir = self._session_dir(self.session)
+            stats = marshal.dumps(self._stats.stats) if self._stats is not None else None
+            stacks = "".join(f"{stack} {count}\n" for stack, count in self._stacks.items())
+            counts = {'pid': os.getpid(), 'profiled_requests': self.profiled_requests,
+                      'stack_samples': self.samples}
+        if not os.path.isdir(session_dir):
+            return  # superseded by a newer session
+        base = os.path.join(session_dir, str(os.getpid()))
+        if stats is not None:
+            _write_atomic(base + ".pstats", stats)
+        if stacks:
+            _write_atomic(base + ".folded", stacks.encode())
+        _write_atomic(base + ".json", json.dumps(counts).encode())
+
+    def begin_request(self):
+        """Called for each request while enabled; returns a token for end_request or None"""
+        if time.time() >= self.deadline or random.random() >= self.sample_rate:
+            return None
+        if self.mode == "cprofile":
+            if not self._cprofile_busy.acquire(blocking=False):
+                return None
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:  # another profiler (e.g. a debugger) is active
+                self._cprofile_busy.release()
+                return None
+            return profile
+        thread_id = threading.get_ident()
+        with self._lock:
+            self._threads.add(thread_id)
+        return thread_id
+
+    def end_request(self, token):
+        if isinstance(token, cProfile.Profile):
+            token.disable()
+            try:
+                with self._lock:
+                    if self._stats is None:
+                        self._stats = pstats.Stats(token)
+                    else:
+                        self._stats.add(token)
+                    self.profiled_requests += 1
+                    self._dirty = True
+            finally:
+                self._cprofile_busy.release()
+        else:
+            with self._lock:
+                self._threads.discard(token)
+                self.profiled_requests += 1
+                self._dirty = True
+
+    def _sample_loop(self, stop):
+        while not stop.wait(self.interval):
+            self.sync()  # picks up a stop issued on another worker
+            if not self.enabled:
+                return
+            with self._lock:
+                threads = list(self._threads)
+            if not threads:
+                continue
+            frames = sys._current_frames()
+            stacks = []
+            for thread_id in threads:
+                frame = frames.get(thread_id)
+                names = []
+                while frame is not None:
+                    code = frame.f_code
+                    names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                if names:
+                    stacks.append(";".join(reversed(names)))
+            del frames
+            with self._lock:
+                for stack in stacks:
+                    self._stacks[stack] += 1
+                self.samples += len(stacks)
+                self._dirty = True
+
+    # ---------- results of all workers ----------
+    def _result_files(self, suffix):
+        control = self._read_control()
+        if not control or not control.get('session'):
+            return []
+        session_dir = self._session_dir(control['session'])
+        try:
+            names = sorted(os.listdir(session_dir))
+        except OSError:
+            return []
+        return [os.path.join(session_dir, name) for name in names if name.endswith(suffix)]
+
+    def pstats_bytes(self):
+        """cProfile results of every worker merged in the pstats file format, or None"""
+        self.sync(force=True)
+        paths = self._result_files(".pstats")
+        if not paths:
+            return None
+        return marshal.dumps(pstats.Stats(*paths).stats)
+
+    def collapsed_stacks(self):
+        """Sampled stacks of every worker as "frame;frame;frame count" lines, or None"""
+        self.sync(force=True)
+        stacks = Counter()
+        for path in self._result_files(".folded"):
+            with open(path) as f:
+                for line in f:
+                    stack, _, count = line.rstrip("\n").rpartition(" ")
+                    stacks[stack] += int(count)
+        if not stacks:
+            return None
+        return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+    def snapshot(self):
+        control = self._read_control() or {}
+        workers = []
+        for path in self._result_files(".json"):
+            try:
+                with open(path) as f:
+                    workers.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        enabled = bool(control.get('enabled')) and time.time() < control.get('deadline', 0)
+        return {
+            'enabled': enabled,
+            'session': control.get('session'),
+            'mode': control.get('mode'),
+            'sample_rate': control.get('sample_rate', 0.0),
+            'interval_ms': control.get('interval_ms'),
+            'seconds_remaining': max(0.0, control['deadline'] - time.time()) if enabled else 0.0,
+            'profiled_requests': sum(w['profiled_requests'] for w in workers),
+            'stack_samples': sum(w['stack_samples'] for w in workers),
+            'workers': workers,
+            'pid': os.getpid()
+        }
+
+
+PROFILER = RequestProfiler(os.getenv("PROFILE_DIR") or DEFAULT_PROFILE_DIR)
@@ -0,0 +1,250 @@
+"""
+Persistence of /analyze results for audit and retraining.
+
+record() only appends to an in-memory buffer; a background thread writes
+the buffer to SQLite in one transaction per batch, every flush_interval
+seconds or as soon as batch_size results are waiting. The request path
+never touches the disk. The database runs in WAL mode, so several
+gunicorn workers can share one file and queries don't block the writers.
+
+No name or email is stored. The email is kept as an HMAC-SHA256 under a
+server secret: enough to audit alerts per recipient, and unlike a plain
+hash it cannot be reversed by hashing a list of candidate addresses. The
+secret is RESULT_EMAIL_KEY, or else a random key created once in a file
+next to the database. The LLM's explanation greets the patient by name,
+so every word of the name is redacted from the stored RAG sections.
+Coordinates are rounded to ~1 km.
+"""
+import os
+import hmac
+import json
+import time
+import atexit
+import secrets
+import sqlite3
+import hashlib
+import threading
+from Deployment.metrics import RESULTS_WRITTEN, RESULTS_DROPPED
+from Src_Code.structured_logging import get_logger, redact
+
+log = get_logger("smart_health.results")
+
+COLUMNS = [
+    'created_at', 'request_id', 'model_version', 'risk',
+    'gender', 'age', 'systolic_bp', 'diastolic_bp', 'cholesterol', 'bmi', 'smoker', 'diabetes',
+    'latitude', 'longitude', 'email_hmac', 'alert_sent',
+    'explanation_source', 'degraded', 'rag', 'hospitals', 'timings'
+]
+JSON_COLUMNS = ['degraded', 'rag', 'hospitals', 'timings']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS analyses (
+    id INTEGER PRIMARY KEY,
+    created_at REAL NOT NULL,
+    request_id TEXT,
+    model_version TEXT,
+    risk TEXT NOT NULL,
+    gender TEXT,
+    age REAL,
+    systolic_bp REAL,
+    diastolic_bp REAL,
+    cholesterol REAL,
+    bmi REAL,
+    smoker INTEGER,
+    diabetes INTEGER,
+    latitude REAL,
+    longitude REAL,
+    email_hmac TEXT,
+    alert_sent INTEGER,
+    explanation_source TEXT,
+    degraded TEXT,
+    rag TEXT,
+    hospitals TEXT,
+    timings TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_analyses_created_at ON analyses (created_at);
+CREATE INDEX IF NOT EXISTS idx_analyses_risk_created_at ON analyses (risk, created_at);
+"""
+
+
+def _coarse(coordinate):
+    return None if coordinate is None else round(coordinate, 2)
+
+
+def load_email_key(db_path):
+    """
+    RESULT_EMAIL_KEY, else the key in <db_path>.key, created on first use.
+    All workers and restarts must share it for the digests to stay comparable.
+    """
+    secret = os.getenv("RESULT_EMAIL_KEY")
+    if secret:
+        return secret.encode()
+    key_path = f"{db_path}.key"
+    if not os.path.exists(key_path):
+        tmp_path = f"{key_path}.{os.getpid()}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            f.write(secrets.token_hex(32))
+        try:
+            os.link(tmp_path, key_path)  # fails if another worker got there first
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(tmp_path)
+    with open(key_path) as f:
+        return f.read().strip().encode()
+
+
+def email_digest(email, key):
+    return hmac.new(key, email.strip().lower().encode(), hashlib.sha256).hexdigest()
+
+
+def _redact_sections(result, pii_values):
+    sections = {}
+    for k in ("explanation", "diagnosis", "nextSteps"):
+        value = result.get(k)
+        if isinstance(value, str):
+            value = redact(value, pii_values)
+        elif isinstance(value, list):
+            value = [redact(v, pii_values) for v in value]
+        sections[k] = value
+    return sections
+
+
+def analysis_row(patient, result, model_version, email_key, request_id=None, alert_sent=False, timings=None):
+    """Flatten one validated payload and its /analyze response into a table row"""
+    return (
+        time.time(), request_id, model_version, result["risk"],
+        patient.gender.strip().lower(), patient.age, patient.systolic_bp, patient.diastolic_bp,
+        patient.cholesterol, patient.bmi, int(patient.smoker), int(patient.diabetes),
+        _coarse(patient.latitude), _coarse(patient.longitude),
+        email_digest(patient.email, email_key), int(alert_sent),
+        result.get("explanationSource"),
+        json.dumps(result.get("degraded", [])),
+        json.dumps(_redact_sections(result, (patient.name, patient.email))),
+        json.dumps(result.get("hospitals", [])),
+        json.dumps(dict(timings or [])),
+    )
+
+
+def connect(path):
+    conn = sqlite3.connect(path, timeout=10)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class ResultSink:
+    def __init__(self, path, batch_size=200, flush_interval=1.0, max_buffer=20000):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+        with connect(path) as conn:
+            conn.executescript(SCHEMA)
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(analyses)")]
+            if 'email_sha256' in columns:
+                # Unkeyed hashes from older versions are reversible with a list of addresses
+                conn.execute("ALTER TABLE analyses RENAME COLUMN email_sha256 TO email_hmac")
+                conn.execute("UPDATE analyses SET email_hmac = NULL")
+        conn.close()
+        self.email_key = load_email_key(path)
+        atexit.register(self.flush)
+        if hasattr(os, 'register_at_fork'):
+            # Never fork in the middle of a flush: an open SQLite connection
+            # copied into the child corrupts the child's view of the database
+            os.register_at_fork(before=lambda: self._flush_lock.acquire(),
+                                after_in_parent=lambda: self._flush_lock.release(),
+                                after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        # The writer thread does not survive fork(); rows buffered before
+        # the fork belong to the parent, which writes them itself
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._buffer = []
+        self._thread = None
+
+    def _ensure_writer(self):
+        if self._thread is None or self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="result-sink", daemon=True)
+            self._thread.start()
+
+    def record(self, row):
+        """Queue one row from analysis_row(); never blocks on I/O"""
+        with self._lock:
+            self._ensure_writer()
+            if len(self._buffer) >= self.max_buffer:
+                RESULTS_DROPPED.inc()
+                return False
+            self._buffer.append(row)
+            full = len(self._buffer) >= self.batch_size
+        if full:
+            self._wakeup.set()
+        return True
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        """Write whatever is buffered now, from the calling thread"""
+        with self._flush_lock:
+            with self._lock:
+                rows, self._buffer = self._buffer, []
+            if not rows:
+                return
+            placeholders = ", ".join("?" * len(COLUMNS))
+            # A connection per batch, so none is open when the process forks
+            conn = None
+            try:
+                conn = connect(self.path)
+                with conn:
+                    conn.executemany(f"INSERT INTO analyses ({', '.join(COLUMNS)}) VALUES ({placeholders})", rows)
+                RESULTS_WRITTEN.inc(amount=len(rows))
+            except sqlite3.Error as e:
+                RESULTS_DROPPED.inc(amount=len(rows))
+                log.error("Writing analysis results failed", error=str(e), rows=len(rows))
+            finally:
+                if conn is not None:
+                    conn.close()
+
+    def query(self, since=None, until=None, risk=None, limit=100):
+        """Most recent results first, filtered on the indexed time and risk columns"""
+        clauses, params = [], []
+        if risk is not None:
+            clauses.append("risk = ?")
+            params.append(risk)
+        if since is not None:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("created_at < ?")
+            params.append(until)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        conn = connect(self.path)
+        conn.row_factory = sqlite3.Row
+        try:
+            rows = conn.execute(f"SELECT * FROM analyses {where} ORDER BY created_at DESC LIMIT ?",
+                                params + [limit]).fetchall()
+            counts = conn.execute(f"SELECT risk, COUNT(*) FROM analyses {where} GROUP BY risk",
+                                  params).fetchall()
+        finally:
+            conn.close()
+        results = []
+        for row in rows:
+            result = dict(row)
+            for col in JSON_COLUMNS:
+                result[col] = json.loads(result[col]) if result[col] else None
+            results.append(result)
+        return {'counts': {risk: n for risk, n in counts}, 'results': results}
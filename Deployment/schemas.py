@@ -0,0 +1,182 @@
+"""
+Request and response schemas for /analyze.
+
+The payload is decoded and validated straight from the request bytes in a
+single pass by msgspec. Decoding is lax, so "45" and "true" are accepted
+for numbers and booleans as browsers and form posts often send them, but
+anything that cannot be converted is rejected with the offending field,
+instead of the model silently receiving a default.
+
+The frontend only requires name, gender, age and email and posts the
+other inputs as typed, so a blank ("") or null vital or coordinate is
+treated as missing: vitals are imputed with the training statistics and
+the hospital lookup is skipped without a location.
+"""
+import re
+import json
+from typing import Annotated, List, Optional, Union
+import msgspec
+
+# Same coding as classify_risk. 'other' is a valid answer the model has no
+# category for, so it is imputed like a missing gender.
+GENDER_CODES = {'female': 1, 'f': 1, 'male': 2, 'm': 2, 'other': None}
+
+Age = Annotated[float, msgspec.Meta(ge=0, le=130)]
+Pressure = Annotated[float, msgspec.Meta(gt=0, le=300)]
+Cholesterol = Annotated[float, msgspec.Meta(gt=0, le=1000)]
+BMI = Annotated[float, msgspec.Meta(gt=0, le=100)]
+Latitude = Annotated[float, msgspec.Meta(ge=-90, le=90)]
+Longitude = Annotated[float, msgspec.Meta(ge=-180, le=180)]
+Email = Annotated[str, msgspec.Meta(pattern=r"^[^@\s]+@[^@\s]+\.[^@\s]+$")]
+Name = Annotated[str, msgspec.Meta(min_length=1, max_length=200)]
+
+# Numbers are checked by the decoder; strings are converted in __post_init__
+OptionalPressure = Union[Pressure, str, None]
+OptionalCholesterol = Union[Cholesterol, str, None]
+OptionalBMI = Union[BMI, str, None]
+OptionalLatitude = Union[Latitude, str, None]
+OptionalLongitude = Union[Longitude, str, None]
+
+# Model inputs, in training order, by their payload / training column names
+FEATURE_COLUMNS = ['Gender', 'Age', 'Systolic BP', 'Diastolic BP', 'Cholesterol', 'BMI', 'Smoker', 'Diabetes']
+
+
+class PatientPayload(msgspec.Struct, forbid_unknown_fields=False):
+    name: Name = msgspec.field(name="Name")
+    gender: str = msgspec.field(name="Gender")
+    age: Age = msgspec.field(name="Age")
+    systolic_bp: OptionalPressure = msgspec.field(name="Systolic BP")
+    diastolic_bp: OptionalPressure = msgspec.field(name="Diastolic BP")
+    cholesterol: OptionalCholesterol = msgspec.field(name="Cholesterol")
+    bmi: OptionalBMI = msgspec.field(name="BMI")
+    smoker: bool = msgspec.field(name="Smoker")
+    diabetes: bool = msgspec.field(name="Diabetes")
+    email: Email = msgspec.field(name="Email")
+    latitude: OptionalLatitude = msgspec.field(name="Latitude")
+    longitude: OptionalLongitude = msgspec.field(name="Longitude")
+
+    def __post_init__(self):
+        if self.gender.strip().lower() not in GENDER_CODES:
+            raise ValueError("Gender must be 'Male', 'Female' or 'Other' - at `$.Gender`")
+        for attr, name, value_type in _OPTIONAL_NUMBERS:
+            value = getattr(self, attr)
+            if isinstance(value, str):
+                setattr(self, attr, _parse_optional(value, value_type, name))
+
+    @property
+    def has_location(self):
+        return self.latitude is not None and self.longitude is not None
+
+    def features(self, fill_values=None):
+        """
+        Feature vector in the order the model was trained on. Missing
+        values are taken from fill_values (CleaningStatistics.fill_values
+        of the training data); any left missing are None.
+        """
+        fill_values = fill_values or {}
+        gender = GENDER_CODES[self.gender.strip().lower()]
+        if gender is None and fill_values.get('Gender') is not None:
+            gender = GENDER_CODES.get(str(fill_values['Gender']).strip().lower())
+        values = [gender, self.age, self.systolic_bp, self.diastolic_bp, self.cholesterol,
+                  self.bmi, int(self.smoker), int(self.diabetes)]
+        return [fill_values.get(col) if value is None and col != 'Gender' else value
+                for col, value in zip(FEATURE_COLUMNS, values)]
+
+    def to_dict(self):
+        """Payload with its original field names, for the RAG prompt"""
+        return msgspec.to_builtins(self)
+
+
+_OPTIONAL_NUMBERS = [
+    ('systolic_bp', "Systolic BP", Pressure),
+    ('diastolic_bp', "Diastolic BP", Pressure),
+    ('cholesterol', "Cholesterol", Cholesterol),
+    ('bmi', "BMI", BMI),
+    ('latitude', "Latitude", Latitude),
+    ('longitude', "Longitude", Longitude),
+]
+
+
+def _parse_optional(value, value_type, name):
+    """A blank string is a missing value; anything else must convert"""
+    value = value.strip()
+    if not value:
+        return None
+    try:
+        return msgspec.convert(value, value_type, strict=False)
+    except msgspec.ValidationError as e:
+        raise ValueError(f"{e} - at `$.{name}`") from None
+
+
+def load_fill_values(path):
+    """
+    Imputation values from a saved CleaningStatistics file: the mean of
+    numeric columns and the mode of categorical ones (read directly so
+    the API does not import the training stack)
+    """
+    with open(path) as f:
+        state = json.load(f)
+    fills = {col: total / state['counts'][col] for col, total in state['sums'].items() if state['counts'].get(col)}
+    for col, counts in state['value_counts'].items():
+        if counts:
+            fills[col] = max(counts, key=counts.get)
+    return fills
+
+
+_single_decoder = msgspec.json.Decoder(PatientPayload, strict=False)
+_batch_decoder = msgspec.json.Decoder(List[PatientPayload], strict=False)
+
+
+def _enc_hook(obj):
+    # numpy scalars returned by the model
+    if hasattr(obj, 'item'):
+        return obj.item()
+    raise NotImplementedError(f"Cannot encode {type(obj).__name__}")
+
+
+_encoder = msgspec.json.Encoder(enc_hook=_enc_hook)
+
+
+def decode_patient(body: bytes) -> PatientPayload:
+    return _single_decoder.decode(body)
+
+
+def decode_patients(body: bytes) -> List[PatientPayload]:
+    return _batch_decoder.decode(body)
+
+
+def encode_json(obj) -> bytes:
+    return _encoder.encode(obj)
+
+
+_PATH_PATTERN = re.compile(r"at `\$(.*)`")
+_MISSING_PATTERN = re.compile(r"missing required field `(.+?)`")
+
+
+REQUIRED_FIELDS = [f.encode_name for f in msgspec.structs.fields(PatientPayload) if f.required]
+
+
+def _missing_fields(body):
+    """Every required field absent from a single-patient body, in schema order"""
+    try:
+        data = msgspec.json.decode(body)
+    except msgspec.DecodeError:
+        return None
+    if not isinstance(data, dict):
+        return None
+    return [name for name in REQUIRED_FIELDS if name not in data] or None
+
+
+def validation_error(error, body=None):
+    """JSON error body naming the field(s) that failed validation"""
+    message = str(error)
+    if isinstance(error, msgspec.ValidationError):
+        missing = _MISSING_PATTERN.search(message)
+        if missing:
+            # msgspec stops at the first absent field; list them all
+            fields = (_missing_fields(body) if body is not None else None) or [missing.group(1)]
+            return {"error": "Missing fields", "missing": fields, "detail": message}
+        path = _PATH_PATTERN.search(message)
+        field = path.group(1).lstrip(".") if path else None
+        return {"error": "Invalid field", "field": field, "detail": message}
+    return {"error": "Invalid JSON", "detail": message}
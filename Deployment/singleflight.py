@@ -0,0 +1,116 @@
+"""
+De-duplication of repeated /analyze submissions.
+
+SingleFlight runs one computation per key at a time: concurrent callers
+with the same key wait for the one in flight and share its result (or its
+exception). It works within one gunicorn worker: identical requests that
+land on different workers are each computed.
+
+AlertDeduplicator suppresses repeat alert emails to the same address
+within a time window, which covers retries that arrive after the first
+request has already finished. Its state is a SQLite file shared by all
+workers on the host (ALERT_DEDUP_DB), so an alert is sent once no matter
+which worker handles the retry. Check-and-record is a single upsert, so
+two workers cannot both decide to send.
+"""
+import os
+import time
+import sqlite3
+import hashlib
+import tempfile
+import threading
+import msgspec
+from Deployment.metrics import DUPLICATE_REQUESTS
+
+DEFAULT_ALERT_DB = os.path.join(tempfile.gettempdir(), "smart_health_alerts.db")
+PRUNE_EVERY = 1000
+
+
+def payload_key(patient):
+    """Hash of the validated payload, so "45" and 45.0 or key order don't matter"""
+    return hashlib.sha256(msgspec.json.encode(patient)).hexdigest()
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func, *args, **kwargs):
+        """Run func once for all concurrent callers with this key; returns (result, shared)"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            DUPLICATE_REQUESTS.inc(self.name)
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = func(*args, **kwargs)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+
+class AlertDeduplicator:
+    def __init__(self, path=DEFAULT_ALERT_DB, window_seconds=600):
+        self.path = path
+        self.window_seconds = window_seconds
+        self._conn = None
+        self._pid = None
+        self._calls = 0
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        # One connection per process; a connection inherited through fork is unusable
+        if self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS sent_alerts (key TEXT PRIMARY KEY, sent_at REAL NOT NULL)")
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def should_send(self, *key):
+        """True (and the alert is recorded) unless the same alert went out within the window"""
+        # Keys contain the email address; only a hash is written to disk
+        digest = hashlib.sha256("\x1f".join(map(str, key)).encode()).hexdigest()
+        now = time.time()  # wall clock, comparable between workers
+        with self._lock:
+            conn = self._connection()
+            cursor = conn.execute(
+                "INSERT INTO sent_alerts (key, sent_at) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET sent_at = excluded.sent_at "
+                "WHERE sent_alerts.sent_at <= ?",
+                (digest, now, now - self.window_seconds))
+            send = cursor.rowcount == 1
+            self._calls += 1
+            if self._calls % PRUNE_EVERY == 0:
+                conn.execute("DELETE FROM sent_alerts WHERE sent_at <= ?", (now - self.window_seconds,))
+        if not send:
+            DUPLICATE_REQUESTS.inc("alert_email")
+        return send
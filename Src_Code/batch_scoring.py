@@ -0,0 +1,204 @@
+import io
+import os
+import json
+import time
+import argparse
+from contextlib import redirect_stdout
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import numpy as np
+import pandas as pd
+from data_cleaning import DataCleaner, CleaningStatistics
+from data_transformation import encode_features
+from model_artifacts import load_any_model, save_artifact
+
+# Column order the models were trained on
+FEATURE_COLUMNS = ['Gender', 'Age', 'Systolic BP', 'Diastolic BP', 'Cholesterol', 'BMI', 'Smoker', 'Diabetes']
+MANIFEST_FILE = "_scoring_manifest.json"
+SUCCESS_FILE = "_SUCCESS.json"
+
+# Per-process state set up once by _init_worker
+_worker = {}
+
+
+def iter_input_chunks(input_path, chunk_size):
+    """Yield DataFrames of at most chunk_size rows from a CSV or Parquet file"""
+    if input_path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(input_path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(input_path, chunksize=chunk_size)
+
+
+def part_path(output_dir, chunk_index):
+    return os.path.join(output_dir, f"part-{chunk_index:06d}.parquet")
+
+
+def _init_worker(model_path, stats_path, feature_names):
+    _worker['model'] = load_any_model(model_path)
+    _worker['stats'] = CleaningStatistics.load(stats_path)
+    _worker['feature_names'] = feature_names
+
+
+def prepare_features(chunk, stats, feature_names):
+    """Apply the saved cleaning statistics and the training encoding"""
+    with redirect_stdout(io.StringIO()):  # the cleaning steps narrate every chunk
+        cleaner = DataCleaner(chunk, show_plots=False)
+        cleaner.remove_unnecessary_columns()
+        cleaner.standardize_categorical_data()
+        cleaned = cleaner.apply_statistics(stats)
+        X = encode_features(cleaned[feature_names], save_to_csv=False)
+    return X
+
+
+def _score_chunk(chunk_index, row_offset, chunk, output_dir, id_column):
+    """Score one chunk in a worker and write it as a Parquet part file"""
+    model = _worker['model']
+    X = prepare_features(chunk, _worker['stats'], _worker['feature_names'])
+    probabilities = np.asarray(model.predict_proba(X), dtype=np.float32)
+    classes = [str(c) for c in np.asarray(model.classes_).ravel()]
+
+    result = pd.DataFrame({'row_id': np.arange(row_offset, row_offset + len(chunk), dtype=np.int64)})
+    if id_column:
+        result[id_column] = chunk[id_column].to_numpy()
+    result['risk'] = np.asarray(classes, dtype=object)[probabilities.argmax(axis=1)]
+    for i, label in enumerate(classes):
+        result[f'prob_{label}'] = probabilities[:, i]
+
+    # Write then rename, so a part file only exists once it is complete
+    final_path = part_path(output_dir, chunk_index)
+    tmp_path = final_path + ".tmp"
+    result.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, final_path)
+    return chunk_index, len(chunk)
+
+
+class BatchScorer:
+    """
+    Scores a registry extract chunk by chunk across a process pool and
+    writes one Parquet part file per chunk. Part files that already exist
+    are skipped, so an interrupted run resumes where it stopped when it is
+    started again with the same arguments.
+    """
+
+    def __init__(self, input_path, output_dir, model_path="decision_tree_model.pkl",
+                 stats_path="cleaning_stats.json", chunk_size=500_000, n_workers=None, id_column=None):
+        self.input_path = input_path
+        self.output_dir = output_dir
+        self.model_path = model_path
+        self.stats_path = stats_path
+        self.chunk_size = chunk_size
+        self.n_workers = n_workers or os.cpu_count() or 1
+        self.id_column = id_column
+
+    def _check_manifest(self):
+        """Refuse to resume into an output written with different settings"""
+        manifest = {
+            'input_path': os.path.abspath(self.input_path),
+            'model_path': os.path.abspath(self.model_path),
+            'stats_path': os.path.abspath(self.stats_path),
+            'chunk_size': self.chunk_size,
+            'id_column': self.id_column
+        }
+        path = os.path.join(self.output_dir, MANIFEST_FILE)
+        if os.path.exists(path):
+            with open(path) as f:
+                previous = json.load(f)
+            if previous != manifest:
+                raise ValueError(f"{self.output_dir} was written with different settings: {previous}")
+        else:
+            with open(path, 'w') as f:
+                json.dump(manifest, f, indent=2)
+
+    def _shared_model_path(self):
+        """
+        Workers memory-map the model from an artifact directory, so the
+        tree arrays sit in the page cache once instead of in every worker.
+        A pickled model is converted once.
+        """
+        if os.path.isdir(self.model_path):
+            return self.model_path
+        artifact_dir = os.path.join(self.output_dir, "_model_artifact")
+        if not os.path.exists(artifact_dir):
+            model = load_any_model(self.model_path)
+            feature_names = list(getattr(model, 'feature_names_in_', FEATURE_COLUMNS))
+            save_artifact(model, artifact_dir, feature_names)
+        return artifact_dir
+
+    def run(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        self._check_manifest()
+        model_path = self._shared_model_path()
+        model = load_any_model(model_path)
+        feature_names = [str(c) for c in getattr(model, 'feature_names_in_', FEATURE_COLUMNS)]
+        del model
+
+        print(f"Scoring {self.input_path} with {self.n_workers} workers "
+              f"in chunks of {self.chunk_size:,} rows -> {self.output_dir}")
+        start = time.perf_counter()
+        scored_rows = skipped_rows = 0
+        row_offset = 0
+        max_pending = 2 * self.n_workers  # bounds memory to a few chunks per worker
+        pending = set()
+
+        def collect(done):
+            nonlocal scored_rows
+            for future in done:
+                _, n_rows = future.result()
+                scored_rows += n_rows
+            elapsed = time.perf_counter() - start
+            print(f"  {scored_rows:,} rows scored ({scored_rows / elapsed:,.0f} rows/sec)")
+
+        with ProcessPoolExecutor(self.n_workers, initializer=_init_worker,
+                                 initargs=(model_path, self.stats_path, feature_names)) as pool:
+            for chunk_index, chunk in enumerate(iter_input_chunks(self.input_path, self.chunk_size)):
+                if os.path.exists(part_path(self.output_dir, chunk_index)):
+                    skipped_rows += len(chunk)
+                else:
+                    if len(pending) >= max_pending:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        collect(done)
+                    pending.add(pool.submit(_score_chunk, chunk_index, row_offset, chunk,
+                                            self.output_dir, self.id_column))
+                row_offset += len(chunk)
+            if pending:
+                collect(wait(pending)[0])
+
+        elapsed = time.perf_counter() - start
+        summary = {
+            'rows_scored': scored_rows,
+            'rows_skipped_from_previous_run': skipped_rows,
+            'total_rows': row_offset,
+            'seconds': elapsed,
+            'rows_per_sec': scored_rows / elapsed if elapsed > 0 else 0.0,
+            'workers': self.n_workers
+        }
+        with open(os.path.join(self.output_dir, SUCCESS_FILE), 'w') as f:
+            json.dump(summary, f, indent=2)
+        print(f"✓ Scored {scored_rows:,} rows in {elapsed:.1f}s ({summary['rows_per_sec']:,.0f} rows/sec); "
+              f"{skipped_rows:,} rows already done")
+        return summary
+
+
+def main():
+    """
+    Command-line entry point for offline batch scoring
+    """
+    parser = argparse.ArgumentParser(description="Score a CSV/Parquet extract with a trained model")
+    parser.add_argument("input", help="Input .csv or .parquet with the raw dataset columns")
+    parser.add_argument("output_dir", help="Directory for the Parquet part files")
+    parser.add_argument("--model", default="decision_tree_model.pkl",
+                        help="Pickled model or artifact directory")
+    parser.add_argument("--stats", default="cleaning_stats.json", help="Saved CleaningStatistics")
+    parser.add_argument("--chunk-size", type=int, default=500_000)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--id-column", default=None, help="Input column to copy into the output")
+    args = parser.parse_args()
+
+    scorer = BatchScorer(args.input, args.output_dir, args.model, args.stats,
+                         args.chunk_size, args.workers, args.id_column)
+    return scorer.run()
+
+
+if __name__ == "__main__":
+    main()
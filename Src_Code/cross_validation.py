@@ -0,0 +1,226 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import tempfile
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from scipy import stats
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from sklearn.model_selection import StratifiedKFold, train_test_split
+from sklearn.preprocessing import LabelEncoder
+from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score
+from model_training import (
+    ModelTrainer, TRAINER_METHODS, THREAD_PARAMS,
+    share_training_data, load_shared_data, load_tuned_params
+)
+
+CV_RESULTS_FILE = "cv_results.json"
+METRIC_NAMES = ['accuracy', 'precision', 'recall', 'f1_score']
+
+
+def _fit_fold(model_name, fold, data_path, folds_path, params, max_train_rows, random_state):
+    """
+    Train one model on one fold and score it on the held-out part.
+    Runs inside a pool worker; data and fold ids are memory-mapped.
+    """
+    X, y = load_shared_data(data_path)
+    fold_ids = np.load(folds_path, mmap_mode='r')
+
+    train_idx = np.flatnonzero(fold_ids != fold)
+    test_idx = np.flatnonzero(fold_ids == fold)
+
+    # Cap the training rows per fold so large datasets stay tractable
+    if max_train_rows and len(train_idx) > max_train_rows:
+        train_idx, _ = train_test_split(
+            train_idx, train_size=max_train_rows,
+            random_state=random_state, stratify=y.values[train_idx]
+        )
+
+    X_train, y_train = X.iloc[train_idx], y.iloc[train_idx]
+    X_test, y_test = X.iloc[test_idx], y.iloc[test_idx]
+
+    trainer = ModelTrainer(random_state=random_state)
+    start = time.perf_counter()
+    model = getattr(trainer, TRAINER_METHODS[model_name])(X_train, y_train, **params)
+    fit_seconds = time.perf_counter() - start
+
+    y_pred = np.asarray(model.predict(X_test)).ravel().astype(y_test.dtype)
+    return model_name, fold, {
+        'accuracy': accuracy_score(y_test, y_pred),
+        'precision': precision_score(y_test, y_pred, average='weighted', zero_division=0),
+        'recall': recall_score(y_test, y_pred, average='weighted', zero_division=0),
+        'f1_score': f1_score(y_test, y_pred, average='weighted', zero_division=0),
+        'fit_seconds': fit_seconds,
+        'train_size': len(train_idx),
+        'test_size': len(test_idx)
+    }
+
+
+def confidence_interval(values, confidence=0.95):
+    """Mean and Student-t confidence interval across folds"""
+    values = np.asarray(values, dtype=float)
+    mean = float(values.mean())
+    if len(values) < 2:
+        return mean, mean, mean
+    sem = values.std(ddof=1) / np.sqrt(len(values))
+    margin = float(stats.t.ppf((1 + confidence) / 2, len(values) - 1) * sem)
+    return mean, mean - margin, mean + margin
+
+
+class CrossValidator:
+    """
+    Stratified k-fold comparison of the ModelTrainer families.
+
+    Fold assignments are computed once per dataset and cached on disk,
+    and every (fold, model) pair is trained as an independent job in a
+    process pool that memory-maps the shared feature matrix.
+    """
+
+    def __init__(self, model_names=None, n_splits=5, n_workers=None, max_train_rows=None,
+                 fold_cache_dir="cv_folds", random_state=42):
+        self.model_names = model_names or list(TRAINER_METHODS.keys())
+        self.n_splits = n_splits
+        self.n_workers = n_workers or os.cpu_count() or 1
+        self.max_train_rows = max_train_rows
+        self.fold_cache_dir = fold_cache_dir
+        self.random_state = random_state
+        self.fold_results = {}
+
+    def compute_folds(self, y):
+        """
+        Assign every row to a fold, reusing the cached assignment when the
+        labels, fold count and seed are unchanged
+        """
+        digest = hashlib.sha1(np.asarray(y).tobytes())
+        digest.update(f"{self.n_splits}-{self.random_state}".encode())
+        os.makedirs(self.fold_cache_dir, exist_ok=True)
+        folds_path = os.path.join(self.fold_cache_dir, f"folds_{digest.hexdigest()[:16]}.npy")
+
+        if os.path.exists(folds_path):
+            print(f"Using cached folds from {folds_path}")
+            return folds_path
+
+        fold_ids = np.empty(len(y), dtype=np.int16)
+        splitter = StratifiedKFold(n_splits=self.n_splits, shuffle=True, random_state=self.random_state)
+        for fold, (_, test_idx) in enumerate(splitter.split(np.zeros(len(y)), y)):
+            fold_ids[test_idx] = fold
+        np.save(folds_path, fold_ids)
+        print(f"Fold assignments saved to {folds_path}")
+        return folds_path
+
+    def run(self, X, y, model_params=None):
+        """Train and score every (fold, model) pair in parallel"""
+        model_params = model_params or {}
+        # Encode labels so every family (including XGBoost) sees numeric targets
+        y_encoded = pd.Series(LabelEncoder().fit_transform(y), name=y.name)
+        folds_path = self.compute_folds(y_encoded)
+
+        jobs = [(name, fold) for fold in range(self.n_splits) for name in self.model_names]
+        n_workers = min(self.n_workers, len(jobs))
+        n_threads = max(1, (os.cpu_count() or 1) // n_workers)
+        print(f"Running {len(jobs)} fold x model jobs on {n_workers} workers...")
+
+        start = time.perf_counter()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            data_path = share_training_data(
+                X.reset_index(drop=True), y_encoded, os.path.join(tmp_dir, "cv.joblib")
+            )
+            with ProcessPoolExecutor(max_workers=n_workers) as executor:
+                futures = []
+                for name, fold in jobs:
+                    params = dict(model_params.get(name, {}))
+                    thread_param = THREAD_PARAMS.get(name)
+                    if thread_param:
+                        params.setdefault(thread_param, n_threads)
+                    futures.append(executor.submit(
+                        _fit_fold, name, fold, data_path, folds_path, params,
+                        self.max_train_rows, self.random_state
+                    ))
+
+                for future in as_completed(futures):
+                    name, fold, scores = future.result()
+                    self.fold_results.setdefault(name, {})[fold] = scores
+                    print(f"  {name} fold {fold + 1}/{self.n_splits}: accuracy {scores['accuracy']:.3f}")
+
+        elapsed = time.perf_counter() - start
+        print(f"Cross-validation finished in {elapsed:.1f}s")
+        return self.summarize(elapsed)
+
+    def summarize(self, elapsed=None, confidence=0.95):
+        """Mean and confidence interval of each metric per model"""
+        summary = {}
+        for name, folds in self.fold_results.items():
+            ordered = [folds[f] for f in sorted(folds)]
+            metrics = {}
+            for metric in METRIC_NAMES:
+                values = [scores[metric] for scores in ordered]
+                mean, low, high = confidence_interval(values, confidence)
+                metrics[metric] = {
+                    'mean': mean,
+                    'std': float(np.std(values, ddof=1)) if len(values) > 1 else 0.0,
+                    'ci_low': low,
+                    'ci_high': high,
+                    'per_fold': [float(v) for v in values]
+                }
+            summary[name] = {
+                'metrics': metrics,
+                'mean_fit_seconds': float(np.mean([s['fit_seconds'] for s in ordered]))
+            }
+
+        ranked = sorted(summary, key=lambda n: summary[n]['metrics']['accuracy']['mean'], reverse=True)
+        for rank, name in enumerate(ranked, 1):
+            summary[name]['rank'] = rank
+
+        return {
+            'cv_metadata': {
+                'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                'n_splits': self.n_splits,
+                'confidence': confidence,
+                'max_train_rows': self.max_train_rows,
+                'elapsed_seconds': elapsed
+            },
+            'models': summary
+        }
+
+    def save_results(self, results, file_path=CV_RESULTS_FILE):
+        """Save cross-validation results for model_evaluation.py"""
+        try:
+            with open(file_path, 'w') as f:
+                json.dump(results, f, indent=2)
+            print(f"Cross-validation results saved to {file_path}")
+        except Exception as e:
+            print(f"Error saving cross-validation results: {e}")
+
+
+def main(n_splits=5):
+    """
+    Main function to run cross-validated model comparison
+    """
+    print("=== Cross-Validation ===\n")
+
+    try:
+        X = pd.read_csv("processed_features.csv")
+        y = pd.read_csv("processed_target.csv").squeeze()
+    except FileNotFoundError:
+        print("Error: Processed data not found. Please run data_transformation.py first.")
+        return None
+
+    validator = CrossValidator(n_splits=n_splits)
+    results = validator.run(X, y, model_params=load_tuned_params())
+    validator.save_results(results)
+
+    print("\n=== Cross-Validated Comparison ===")
+    for name, result in sorted(results['models'].items(), key=lambda item: item[1]['rank']):
+        acc = result['metrics']['accuracy']
+        print(f"{result['rank']}. {name}: {acc['mean']:.3f} "
+              f"(95% CI {acc['ci_low']:.3f}-{acc['ci_high']:.3f})")
+
+    return results
+
+
+if __name__ == "__main__":
+    folds = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    results = main(n_splits=folds)
@@ -1,16 +1,120 @@
+import json
 import pandas as pd
 import numpy as np
 import seaborn as sns
 import matplotlib.pyplot as plt
 from data_ingestion import load_and_explore_data, check_data_quality
 
+# IQR multiplier used when clipping outliers in each column
+OUTLIER_IQR_FACTORS = {'BMI': 1.45, 'Diastolic BP': 1.5}
+BOOL_VALUES = {'True': True, 'False': False}
+
+
+class CleaningStatistics:
+    """
+    Mergeable statistics behind the cleaning steps: running sums for the
+    mean imputation, value counts for the mode imputation, and a bounded
+    reservoir sample per outlier column for the IQR clip bounds. Updating
+    costs O(new rows), so new records never require a pass over history.
+    """
+    
+    def __init__(self, reservoir_size=10000, random_state=42):
+        self.reservoir_size = reservoir_size
+        self.rng = np.random.RandomState(random_state)
+        self.n_rows = 0
+        self.sums = {}
+        self.counts = {}
+        self.value_counts = {}
+        self.reservoirs = {col: [] for col in OUTLIER_IQR_FACTORS}
+        self.seen = {col: 0 for col in OUTLIER_IQR_FACTORS}
+    
+    def update(self, df):
+        """Fold a batch of (column-pruned, standardized) rows into the statistics"""
+        self.n_rows += len(df)
+        for col in df.select_dtypes(include=[np.number]).columns:
+            values = df[col].dropna()
+            self.sums[col] = self.sums.get(col, 0.0) + float(values.sum())
+            self.counts[col] = self.counts.get(col, 0) + int(len(values))
+        for col in df.select_dtypes(exclude=[np.number]).columns:
+            counts = self.value_counts.setdefault(col, {})
+            for value, count in df[col].dropna().astype(str).value_counts().items():
+                counts[value] = counts.get(value, 0) + int(count)
+        for col in OUTLIER_IQR_FACTORS:
+            if col in df.columns:
+                self._update_reservoir(col, df[col].dropna().to_numpy(dtype=float))
+        return self
+    
+    def _update_reservoir(self, col, values):
+        """Reservoir sampling (Algorithm R) of the column's values"""
+        reservoir = self.reservoirs[col]
+        for value in values:
+            self.seen[col] += 1
+            if len(reservoir) < self.reservoir_size:
+                reservoir.append(float(value))
+            else:
+                slot = self.rng.randint(self.seen[col])
+                if slot < self.reservoir_size:
+                    reservoir[slot] = float(value)
+    
+    def fill_values(self):
+        """Mean of numeric columns and mode of categorical columns"""
+        fills = {col: self.sums[col] / self.counts[col] for col in self.sums if self.counts[col]}
+        for col, counts in self.value_counts.items():
+            if counts:
+                mode = max(counts, key=counts.get)
+                # Counts are keyed by str for JSON; flags must be filled with bools
+                if set(counts) <= set(BOOL_VALUES):
+                    mode = BOOL_VALUES[mode]
+                fills[col] = mode
+        return fills
+    
+    def clip_bounds(self):
+        """IQR clip bounds per outlier column, estimated from the reservoir"""
+        bounds = {}
+        for col, factor in OUTLIER_IQR_FACTORS.items():
+            if self.reservoirs[col]:
+                Q1 = np.percentile(self.reservoirs[col], 25, method='midpoint')
+                Q3 = np.percentile(self.reservoirs[col], 75, method='midpoint')
+                IQR = Q3 - Q1
+                bounds[col] = (Q1 - factor * IQR, Q3 + factor * IQR)
+        return bounds
+    
+    def save(self, file_path):
+        state = {
+            'reservoir_size': self.reservoir_size,
+            'n_rows': self.n_rows,
+            'sums': self.sums,
+            'counts': self.counts,
+            'value_counts': self.value_counts,
+            'reservoirs': self.reservoirs,
+            'seen': self.seen
+        }
+        with open(file_path, 'w') as f:
+            json.dump(state, f)
+        print(f"Cleaning statistics saved to {file_path}")
+    
+    @classmethod
+    def load(cls, file_path):
+        with open(file_path) as f:
+            state = json.load(f)
+        stats = cls(reservoir_size=state['reservoir_size'])
+        stats.n_rows = state['n_rows']
+        stats.sums = state['sums']
+        stats.counts = state['counts']
+        stats.value_counts = state['value_counts']
+        stats.reservoirs = state['reservoirs']
+        stats.seen = state['seen']
+        return stats
+
+
 class DataCleaner:
     """
     Class for cleaning and preprocessing health data
     """
     
-    def __init__(self, df):
+    def __init__(self, df, show_plots=True):
         self.df = df.copy()
+        self.show_plots = show_plots
         self.numerical_cols = ['Age', 'Systolic BP', 'Diastolic BP', 'Cholesterol', 'BMI']
         self.categorical_cols = ['Gender', 'Smoker', 'Diabetes']
         
@@ -74,7 +178,8 @@ class DataCleaner:
         
         for col in self.categorical_cols:
             if col in self.df.columns:
-                if self.df[col].dtype == 'object':
+                # Only text columns; flags with gaps are object columns of bools and NaN
+                if pd.api.types.infer_dtype(self.df[col], skipna=True) == 'string':
                     self.df[col] = self.df[col].str.strip().str.lower()
                     print(f"✓ Standardized '{col}' column")
         
@@ -117,10 +222,24 @@ class DataCleaner:
         
         return self.df
     
+    def apply_statistics(self, stats):
+        """
+        Impute and clip with previously fitted CleaningStatistics instead of
+        statistics of the current frame (used for incremental batches)
+        """
+        fills = stats.fill_values()
+        self.df = self.df.fillna({col: value for col, value in fills.items() if col in self.df.columns})
+        for col, bounds in stats.clip_bounds().items():
+            if col in self.df.columns:
+                self.df[col] = self.df[col].clip(*bounds)
+        return self.df
+    
     def _create_boxplots(self, stage):
         """
         Create boxplots for numerical columns
         """
+        if not self.show_plots:
+            return
         for col in self.numerical_cols:
             if col in self.df.columns:
                 plt.figure(figsize=(6, 4))
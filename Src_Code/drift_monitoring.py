@@ -0,0 +1,382 @@
+import os
+import sys
+import json
+import time
+import threading
+import numpy as np
+import pandas as pd
+
+REFERENCE_PROFILE_FILE = "drift_reference.json"
+
+# Fixed bin ranges so every profile uses the same bins and profiles can be
+# merged by adding counts; values outside fall into under/overflow bins
+NUMERIC_FEATURES = {
+    'Age': (0, 120),
+    'Systolic BP': (60, 240),
+    'Diastolic BP': (30, 150),
+    'Cholesterol': (80, 400),
+    'BMI': (10, 70)
+}
+CATEGORICAL_FEATURES = ['Gender', 'Smoker', 'Diabetes']
+N_BINS = 40
+
+# Conventional PSI reading: < 0.1 stable, 0.1-0.25 moderate shift, > 0.25 major shift
+PSI_WARN = 0.1
+PSI_ALERT = 0.25
+MIN_SAMPLES = 100
+
+
+def normalize_category(feature, value):
+    """Map the encodings used in training data and API payloads to one label"""
+    if feature == 'Gender':
+        if isinstance(value, (int, float, np.integer, np.floating)):
+            return 'male' if int(value) == 1 else 'female'  # encode_features coding
+        value = str(value).strip().lower()
+        return {'m': 'male', 'f': 'female'}.get(value, value)
+    if isinstance(value, str):
+        return str(value.strip().lower() in ('true', '1', 'yes'))
+    return str(bool(value))
+
+
+class FixedHistogram:
+    """Histogram over fixed bins; O(1) add, merge by adding counts"""
+
+    def __init__(self, low, high, n_bins=N_BINS, counts=None):
+        self.low = low
+        self.high = high
+        self.n_bins = n_bins
+        self.width = (high - low) / n_bins
+        # bin 0 is underflow, bin n_bins + 1 overflow
+        self.counts = np.zeros(n_bins + 2, dtype=np.int64) if counts is None else np.asarray(counts, dtype=np.int64)
+
+    def _index(self, value):
+        if value < self.low:
+            return 0
+        if value >= self.high:
+            return self.n_bins + 1
+        return int((value - self.low) / self.width) + 1
+
+    def add(self, value):
+        if value == value:  # skip NaN
+            self.counts[self._index(value)] += 1
+
+    def add_many(self, values):
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        index = np.floor((values - self.low) / self.width).astype(np.int64) + 1
+        self.counts += np.bincount(np.clip(index, 0, self.n_bins + 1), minlength=self.n_bins + 2)
+
+    def merge(self, other):
+        self.counts += other.counts
+        return self
+
+    def total(self):
+        return int(self.counts.sum())
+
+    def to_dict(self):
+        return {'low': self.low, 'high': self.high, 'n_bins': self.n_bins, 'counts': self.counts.tolist()}
+
+    @classmethod
+    def from_dict(cls, state):
+        return cls(state['low'], state['high'], state['n_bins'], state['counts'])
+
+
+def psi(expected_counts, actual_counts, eps=1e-4):
+    """Population Stability Index between two count vectors over the same bins"""
+    expected = np.asarray(expected_counts, dtype=float)
+    actual = np.asarray(actual_counts, dtype=float)
+    expected = np.clip(expected / max(expected.sum(), 1), eps, None)
+    actual = np.clip(actual / max(actual.sum(), 1), eps, None)
+    return float(np.sum((actual - expected) * np.log(actual / expected)))
+
+
+def ks_statistic(expected_counts, actual_counts):
+    """Kolmogorov-Smirnov distance between the binned CDFs"""
+    expected = np.cumsum(expected_counts) / max(np.sum(expected_counts), 1)
+    actual = np.cumsum(actual_counts) / max(np.sum(actual_counts), 1)
+    return float(np.max(np.abs(expected - actual)))
+
+
+def _aligned(reference, current):
+    keys = sorted(set(reference) | set(current))
+    return [reference.get(k, 0) for k in keys], [current.get(k, 0) for k in keys]
+
+
+def psi_status(value):
+    return 'alert' if value > PSI_ALERT else 'warn' if value > PSI_WARN else 'ok'
+
+
+class DriftProfile:
+    """
+    Streaming, mergeable summary of the model inputs and predictions:
+    fixed-bin histograms for the numeric vitals, counts for the
+    categorical features and the predicted class. Updating with one
+    record is O(number of features) regardless of how many were seen.
+    """
+
+    def __init__(self):
+        self.n = 0
+        self.histograms = {col: FixedHistogram(low, high) for col, (low, high) in NUMERIC_FEATURES.items()}
+        self.categories = {col: {} for col in CATEGORICAL_FEATURES}
+        self.predictions = {}
+        self._lock = threading.Lock()
+
+    def update(self, record, prediction=None):
+        """Add one record (a dict with the payload's field names)"""
+        with self._lock:
+            self.n += 1
+            for col, histogram in self.histograms.items():
+                value = record.get(col)
+                if value is not None:
+                    histogram.add(float(value))
+            for col, counts in self.categories.items():
+                if record.get(col) is not None:
+                    label = normalize_category(col, record[col])
+                    counts[label] = counts.get(label, 0) + 1
+            if prediction is not None:
+                label = str(prediction)
+                self.predictions[label] = self.predictions.get(label, 0) + 1
+
+    def update_frame(self, df, predictions=None):
+        """Vectorized update with a DataFrame of records"""
+        with self._lock:
+            self.n += len(df)
+            for col, histogram in self.histograms.items():
+                if col in df.columns:
+                    histogram.add_many(df[col].to_numpy(dtype=float))
+            for col, counts in self.categories.items():
+                if col in df.columns:
+                    for value, count in df[col].dropna().value_counts().items():
+                        label = normalize_category(col, value)
+                        counts[label] = counts.get(label, 0) + int(count)
+            if predictions is not None:
+                for label, count in pd.Series(predictions).astype(str).value_counts().items():
+                    self.predictions[label] = self.predictions.get(label, 0) + int(count)
+        return self
+
+    def merge(self, other):
+        # Snapshot other first; it may be receiving live updates
+        with other._lock:
+            n = other.n
+            histograms = {col: h.counts.copy() for col, h in other.histograms.items()}
+            categories = {col: dict(counts) for col, counts in other.categories.items()}
+            predictions = dict(other.predictions)
+        with self._lock:
+            self.n += n
+            for col, histogram in self.histograms.items():
+                histogram.counts += histograms[col]
+            for col, counts in self.categories.items():
+                for label, count in categories[col].items():
+                    counts[label] = counts.get(label, 0) + count
+            for label, count in predictions.items():
+                self.predictions[label] = self.predictions.get(label, 0) + count
+        return self
+
+    def copy(self):
+        return DriftProfile().merge(self)
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'n': self.n,
+                'histograms': {col: h.to_dict() for col, h in self.histograms.items()},
+                'categories': {col: dict(counts) for col, counts in self.categories.items()},
+                'predictions': dict(self.predictions)
+            }
+
+    @classmethod
+    def from_dict(cls, state):
+        profile = cls()
+        profile.n = state['n']
+        profile.histograms = {col: FixedHistogram.from_dict(h) for col, h in state['histograms'].items()}
+        profile.categories = {col: dict(counts) for col, counts in state['categories'].items()}
+        profile.predictions = dict(state['predictions'])
+        return profile
+
+    def save(self, file_path=REFERENCE_PROFILE_FILE):
+        with open(file_path, 'w') as f:
+            json.dump(self.to_dict(), f)
+        print(f"Drift profile saved to {file_path}")
+
+    @classmethod
+    def load(cls, file_path=REFERENCE_PROFILE_FILE):
+        with open(file_path) as f:
+            return cls.from_dict(json.load(f))
+
+
+def compare_profiles(reference, current):
+    """PSI and KS per numeric feature, PSI for categoricals and predictions"""
+    features = {}
+    for col, histogram in reference.histograms.items():
+        expected, actual = histogram.counts, current.histograms[col].counts
+        value = psi(expected, actual)
+        features[col] = {'psi': value, 'ks': ks_statistic(expected, actual), 'status': psi_status(value)}
+    for col, counts in reference.categories.items():
+        value = psi(*_aligned(counts, current.categories[col]))
+        features[col] = {'psi': value, 'status': psi_status(value)}
+
+    prediction_psi = psi(*_aligned(reference.predictions, current.predictions)) if current.predictions else None
+    statuses = [f['status'] for f in features.values()]
+    if prediction_psi is not None:
+        statuses.append(psi_status(prediction_psi))
+
+    if current.n < MIN_SAMPLES:
+        overall = 'insufficient_data'
+    else:
+        overall = 'alert' if 'alert' in statuses else 'warn' if 'warn' in statuses else 'ok'
+    return {
+        'status': overall,
+        'reference_samples': reference.n,
+        'current_samples': current.n,
+        'features': features,
+        'predictions': {
+            'psi': prediction_psi,
+            'status': psi_status(prediction_psi) if prediction_psi is not None else None,
+            'reference': reference.predictions,
+            'current': current.predictions
+        }
+    }
+
+
+class DriftMonitor:
+    """
+    Collects live traffic into the current window profile and compares the
+    current and previous windows against the reference. The comparison is
+    cached for compare_interval seconds, so serving the report is cheap.
+
+    Windows are aligned to the wall clock, so every process rotates at the
+    same moment. With shared_dir set (one directory per server, e.g. for
+    gunicorn workers), each process publishes its windows there at most
+    every publish_interval seconds, and the report merges the windows of
+    all processes before computing PSI and KS, since profiles merge by
+    adding counts. A process that has gone idle may hold back up to its
+    last publish_interval seconds of records.
+    """
+
+    def __init__(self, reference, window_seconds=3600, compare_interval=60,
+                 shared_dir=None, publish_interval=5.0):
+        self.reference = reference
+        self.window_seconds = window_seconds
+        self.compare_interval = compare_interval
+        self.shared_dir = shared_dir
+        self.publish_interval = publish_interval
+        self.current = DriftProfile()
+        self.previous = DriftProfile()
+        self.window = self._window_index(time.time())
+        self._report = None
+        self._report_time = 0.0
+        self._next_publish = 0.0
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    def _window_index(self, now):
+        return int(now // self.window_seconds)
+
+    def _rotate_if_due(self):
+        window = self._window_index(time.time())
+        if window != self.window:
+            with self._lock:
+                if window != self.window:
+                    # The previous window is empty if a whole window went by without traffic
+                    self.previous = self.current if window == self.window + 1 else DriftProfile()
+                    self.current = DriftProfile()
+                    self.window = window
+
+    def observe(self, record, prediction=None):
+        self._rotate_if_due()
+        self.current.update(record, prediction)
+        self._dirty = True
+        if self.shared_dir is not None and time.monotonic() >= self._next_publish:
+            self.publish()
+
+    def _state_path(self, pid=None):
+        return os.path.join(self.shared_dir, f"{pid or os.getpid()}.json")
+
+    def publish(self):
+        """Write this process's windows to shared_dir"""
+        self._next_publish = time.monotonic() + self.publish_interval
+        if not self._dirty:
+            return
+        self._dirty = False
+        with self._lock:
+            state = {'window': self.window, 'current': self.current.to_dict(),
+                     'previous': self.previous.to_dict()}
+        try:
+            os.makedirs(self.shared_dir, exist_ok=True)
+            tmp_path = f"{self._state_path()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(state, f)
+            os.replace(tmp_path, self._state_path())
+        except OSError as e:
+            print(f"Error publishing drift windows: {e}")
+
+    def recent_profile(self):
+        """Previous plus current window, of every process when shared_dir is set"""
+        if self.shared_dir is None:
+            return self.previous.copy().merge(self.current)
+        self.publish()
+        recent = DriftProfile()
+        window = self._window_index(time.time())
+        try:
+            names = [name for name in os.listdir(self.shared_dir) if name.endswith(".json")]
+        except OSError:
+            names = []
+        for name in names:
+            try:
+                with open(os.path.join(self.shared_dir, name)) as f:
+                    state = json.load(f)
+            except (OSError, ValueError):
+                continue
+            # Windows of processes that have since gone idle or exited are
+            # counted as long as they are still recent
+            if state['window'] == window:
+                recent.merge(DriftProfile.from_dict(state['current']))
+                recent.merge(DriftProfile.from_dict(state['previous']))
+            elif state['window'] == window - 1:
+                recent.merge(DriftProfile.from_dict(state['current']))
+        return recent
+
+    def report(self, force=False):
+        self._rotate_if_due()
+        now = time.time()
+        if force or self._report is None or now - self._report_time >= self.compare_interval:
+            report = compare_profiles(self.reference, self.recent_profile())
+            report['window_seconds'] = self.window_seconds
+            report['generated_at'] = now
+            self._report, self._report_time = report, now
+        return self._report
+
+
+def build_reference_profile(X_train, predictions=None, file_path=REFERENCE_PROFILE_FILE):
+    """Reference profile from the training features and the model's predictions on them"""
+    profile = DriftProfile().update_frame(X_train, predictions)
+    profile.save(file_path)
+    return profile
+
+
+def main(records_path, reference_path=REFERENCE_PROFILE_FILE):
+    """
+    Compare a CSV/Parquet of new records (optionally with a Health or
+    prediction column) against the saved reference profile
+    """
+    print("=== Drift Check ===\n")
+    reference = DriftProfile.load(reference_path)
+    df = pd.read_parquet(records_path) if records_path.endswith(".parquet") else pd.read_csv(records_path)
+    prediction_col = next((c for c in ('prediction', 'Health') if c in df.columns), None)
+    current = DriftProfile().update_frame(df, df[prediction_col] if prediction_col else None)
+
+    report = compare_profiles(reference, current)
+    print(f"Overall status: {report['status']} ({report['current_samples']} records)")
+    for col, result in report['features'].items():
+        ks = f"  KS {result['ks']:.3f}" if 'ks' in result else ""
+        print(f"  {col:<14} PSI {result['psi']:.3f}{ks}  {result['status']}")
+    if report['predictions']['psi'] is not None:
+        print(f"  {'predictions':<14} PSI {report['predictions']['psi']:.3f}  {report['predictions']['status']}")
+    return report
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python drift_monitoring.py <records.csv|.parquet> [reference.json]")
+    else:
+        main(*sys.argv[1:3])
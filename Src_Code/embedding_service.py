@@ -0,0 +1,390 @@
+"""
+Local embedding service shared by all API workers and pipeline jobs.
+
+One process holds the sentence-transformers model and serves embeddings
+over a Unix socket. Requests from every client go through one dynamic
+batcher (texts are grouped for up to max_wait_ms or max_batch_size) and an
+LRU cache of recent texts. SocketEmbeddings is a LangChain Embeddings
+client, so Chroma can use it in place of HuggingFaceEmbeddings; set
+EMBEDDING_SOCKET and rag_integration picks it up.
+
+    python embedding_service.py serve --socket /tmp/embeddings.sock
+    python embedding_service.py benchmark --socket /tmp/embeddings.sock --clients 4
+"""
+import os
+import json
+import time
+import queue
+import socket
+import struct
+import argparse
+import threading
+import socketserver
+import multiprocessing
+from functools import partial
+from collections import OrderedDict
+from concurrent.futures import Future
+import numpy as np
+
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+DEFAULT_SOCKET = "/tmp/smart_health_embeddings.sock"
+
+_HEADER = struct.Struct("!I")
+
+
+def _send_frame(sock, payload):
+    sock.sendall(_HEADER.pack(len(payload)) + payload)
+
+
+def _recv_exact(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            raise ConnectionError("embedding service closed the connection")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def _recv_frame(sock):
+    (size,) = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    return _recv_exact(sock, size)
+
+
+def load_local_embeddings(model_name=MODEL_NAME):
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+    return HuggingFaceEmbeddings(model_name=model_name)
+
+
+class EmbeddingCache:
+    """LRU of text -> float32 vector"""
+
+    def __init__(self, max_entries=50000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, text):
+        with self._lock:
+            vector = self._entries.get(text)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(text)
+            self.hits += 1
+            return vector
+
+    def put(self, text, vector):
+        with self._lock:
+            self._entries[text] = vector
+            self._entries.move_to_end(text)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class DynamicBatcher:
+    """
+    Collects texts from all connections and embeds them together: a batch
+    is sent to the model when it reaches max_batch_size or max_wait_ms
+    after its first text arrived, whichever comes first.
+    """
+
+    def __init__(self, embeddings, max_batch_size=64, max_wait_ms=5):
+        self.embeddings = embeddings
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.queue = queue.Queue()
+        self.batches = 0
+        self.texts = 0
+        threading.Thread(target=self._run, name="embedding-batcher", daemon=True).start()
+
+    def submit(self, text):
+        future = Future()
+        self.queue.put((text, future))
+        return future
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            texts = [text for text, _ in batch]
+            try:
+                vectors = np.asarray(self.embeddings.embed_documents(texts), dtype=np.float32)
+                for (_, future), vector in zip(batch, vectors):
+                    future.set_result(vector)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+            self.batches += 1
+            self.texts += len(batch)
+
+
+class EmbeddingRequestHandler(socketserver.BaseRequestHandler):
+    """
+    Frames are a 4-byte length then the payload. Request: JSON
+    {"texts": [...]}. Response: a JSON header {"n", "dim"} or {"error"},
+    then for success the float32 matrix as raw bytes.
+    """
+
+    def handle(self):
+        server = self.server
+        while True:
+            try:
+                request = json.loads(_recv_frame(self.request))
+            except (ConnectionError, OSError):
+                return
+            try:
+                self._respond(server, request)
+            except (ConnectionError, OSError):
+                return  # the client gave up (e.g. timed out) and closed its socket
+
+    def _respond(self, server, request):
+        if request.get("stats"):
+            _send_frame(self.request, json.dumps(server.stats()).encode())
+            return
+        try:
+            matrix = server.embed(request["texts"])
+        except Exception as e:
+            _send_frame(self.request, json.dumps({"error": str(e)}).encode())
+            return
+        header = {"n": int(matrix.shape[0]), "dim": int(matrix.shape[1]) if matrix.ndim == 2 else 0}
+        _send_frame(self.request, json.dumps(header).encode())
+        _send_frame(self.request, matrix.tobytes())
+
+
+class EmbeddingServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+    request_queue_size = 256  # every worker thread of every client may connect at once
+
+    def __init__(self, socket_path, embeddings, max_batch_size=64, max_wait_ms=5, cache_size=50000):
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        super().__init__(socket_path, EmbeddingRequestHandler)
+        os.chmod(socket_path, 0o660)
+        self.batcher = DynamicBatcher(embeddings, max_batch_size, max_wait_ms)
+        self.cache = EmbeddingCache(cache_size)
+        # Texts submitted to the batcher and not embedded yet; concurrent
+        # requests for the same text wait on one future instead of
+        # embedding it again. Reentrant because a future that is already
+        # done runs its callback inline.
+        self._inflight = {}
+        self._inflight_lock = threading.RLock()
+        self.inflight_joins = 0
+
+    def _landed(self, text, future):
+        with self._inflight_lock:
+            if future.exception() is None:
+                self.cache.put(text, future.result())
+            self._inflight.pop(text, None)
+
+    def embed(self, texts):
+        vectors = [None] * len(texts)
+        pending = {}
+        with self._inflight_lock:
+            for i, text in enumerate(texts):
+                vectors[i] = self.cache.get(text)
+                if vectors[i] is not None:
+                    continue
+                future = self._inflight.get(text)
+                if future is None:
+                    future = self.batcher.submit(text)
+                    self._inflight[text] = future
+                    future.add_done_callback(partial(self._landed, text))
+                else:
+                    self.inflight_joins += 1
+                pending[i] = future
+        for i, future in pending.items():
+            vectors[i] = future.result()
+        return np.vstack(vectors) if vectors else np.zeros((0, 0), dtype=np.float32)
+
+    def stats(self):
+        return {
+            'batches': self.batcher.batches,
+            'texts_embedded': self.batcher.texts,
+            'mean_batch_size': self.batcher.texts / self.batcher.batches if self.batcher.batches else 0.0,
+            'cache_hits': self.cache.hits,
+            'cache_misses': self.cache.misses,
+            'inflight_joins': self.inflight_joins
+        }
+
+
+try:
+    from langchain_core.embeddings import Embeddings
+except ImportError:
+    Embeddings = object
+
+
+class SocketEmbeddings(Embeddings):
+    """LangChain Embeddings backed by the shared embedding service"""
+
+    def __init__(self, socket_path=DEFAULT_SOCKET, timeout=30.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        sock = getattr(self._local, "sock", None)
+        # A connection inherited over fork belongs to the parent
+        if sock is None or self._local.pid != os.getpid():
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            self._local.sock, self._local.pid = sock, os.getpid()
+        return sock
+
+    def _reset(self):
+        sock = getattr(self._local, "sock", None)
+        self._local.sock = None
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+
+    def _request(self, payload, with_body=False):
+        """
+        Send one request and read its header (and body frame). Any failure
+        drops the connection, so a half-read response is never left on a
+        socket the next call would reuse. A stale connection is retried once.
+        """
+        for attempt in range(2):
+            try:
+                sock = self._connection()
+                _send_frame(sock, json.dumps(payload).encode())
+                header = json.loads(_recv_frame(sock))
+                body = _recv_frame(sock) if with_body and "error" not in header else None
+                return header, body
+            except ConnectionError:
+                self._reset()
+                if attempt:
+                    raise
+            except BaseException:
+                self._reset()
+                raise
+
+    def embed_documents(self, texts):
+        if not texts:
+            return []
+        header, body = self._request({"texts": list(texts)}, with_body=True)
+        if "error" in header:
+            raise RuntimeError(f"Embedding service error: {header['error']}")
+        matrix = np.frombuffer(body, dtype=np.float32).reshape(header["n"], header["dim"])
+        return matrix.tolist()
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+    def stats(self):
+        return self._request({"stats": True})[0]
+
+
+def serve(socket_path=DEFAULT_SOCKET, max_batch_size=64, max_wait_ms=5, cache_size=50000):
+    print(f"Loading {MODEL_NAME}...")
+    server = EmbeddingServer(socket_path, load_local_embeddings(), max_batch_size, max_wait_ms, cache_size)
+    print(f"✓ Embedding service listening on {socket_path}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStats:", server.stats())
+    finally:
+        server.server_close()
+        os.remove(socket_path)
+
+
+# ================== Benchmark ==================
+def _sample_texts(n, seed):
+    rng = np.random.default_rng(seed)
+    words = ["blood", "pressure", "cholesterol", "diabetes", "risk", "heart", "smoker", "bmi",
+             "hypertension", "exercise", "diet", "sodium", "patient", "age", "obesity", "stroke"]
+    return [" ".join(rng.choice(words, 12)) for _ in range(n)]
+
+
+def _client_worker(mode, socket_path, n_texts, batch_size, seed, results):
+    import psutil
+    texts = _sample_texts(n_texts, seed)
+    start = time.perf_counter()
+    embeddings = SocketEmbeddings(socket_path) if mode == "shared" else load_local_embeddings()
+    load_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    for i in range(0, n_texts, batch_size):
+        embeddings.embed_documents(texts[i:i + batch_size])
+    results.put({'load_seconds': load_seconds,
+                 'embed_seconds': time.perf_counter() - start,
+                 'rss_bytes': psutil.Process().memory_info().rss})
+
+
+def benchmark(socket_path=DEFAULT_SOCKET, n_clients=4, n_texts=2000, batch_size=8):
+    """
+    Run n_clients processes that each embed n_texts, once against the
+    shared service and once with a per-process model, and compare total
+    memory (clients plus server) and aggregate throughput
+    """
+    import psutil
+    report = {}
+    for mode in ("per_worker", "shared"):
+        server_process = None
+        if mode == "shared":
+            server_process = multiprocessing.Process(target=serve, args=(socket_path,), daemon=True)
+            server_process.start()
+            while not os.path.exists(socket_path):
+                time.sleep(0.1)
+
+        results = multiprocessing.Queue()
+        start = time.perf_counter()
+        clients = [multiprocessing.Process(target=_client_worker,
+                                           args=(mode, socket_path, n_texts, batch_size, seed, results))
+                   for seed in range(n_clients)]
+        for client in clients:
+            client.start()
+        rows = [results.get() for _ in clients]
+        wall = time.perf_counter() - start
+        for client in clients:
+            client.join()
+
+        total_rss = sum(r['rss_bytes'] for r in rows)
+        if server_process is not None:
+            total_rss += psutil.Process(server_process.pid).memory_info().rss
+            server_process.terminate()
+            server_process.join()
+        report[mode] = {
+            'clients': n_clients,
+            'total_rss_mb': total_rss / 1024 ** 2,
+            'texts_per_sec': n_clients * n_texts / wall,
+            'mean_client_load_seconds': sum(r['load_seconds'] for r in rows) / n_clients,
+            'wall_seconds': wall
+        }
+        print(f"{mode:<11} total RSS {report[mode]['total_rss_mb']:8.1f} MB  "
+              f"{report[mode]['texts_per_sec']:8.1f} texts/sec  "
+              f"client start-up {report[mode]['mean_client_load_seconds']:.2f}s")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared embedding service")
+    parser.add_argument("command", choices=["serve", "benchmark"])
+    parser.add_argument("--socket", default=os.getenv("EMBEDDING_SOCKET", DEFAULT_SOCKET))
+    parser.add_argument("--max-batch-size", type=int, default=64)
+    parser.add_argument("--max-wait-ms", type=float, default=5)
+    parser.add_argument("--cache-size", type=int, default=50000)
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--texts", type=int, default=2000)
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        return serve(args.socket, args.max_batch_size, args.max_wait_ms, args.cache_size)
+    return benchmark(args.socket, args.clients, args.texts)
+
+
+if __name__ == "__main__":
+    main()
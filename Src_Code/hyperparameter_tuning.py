@@ -0,0 +1,353 @@
+import os
+import sys
+import json
+import math
+import time
+import hashlib
+import tempfile
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import LabelEncoder
+from sklearn.metrics import accuracy_score
+from model_training import (
+    ModelTrainer, TRAINER_METHODS, THREAD_PARAMS, TUNING_RESULTS_FILE,
+    share_training_data, load_shared_data
+)
+
+# Candidate values for each model family
+SEARCH_SPACES = {
+    'decision_tree': {
+        'max_depth': [3, 4, 5, 6, 8, 10, None],
+        'min_samples_leaf': [1, 2, 5, 10],
+        'criterion': ['gini', 'entropy']
+    },
+    'random_forest': {
+        'n_estimators': [100, 200, 400],
+        'max_depth': [4, 6, 8, 12, None],
+        'min_samples_leaf': [1, 2, 4],
+        'max_features': ['sqrt', 'log2', None]
+    },
+    'catboost': {
+        'depth': [4, 6, 8],
+        'learning_rate': [0.03, 0.05, 0.1, 0.2],
+        'l2_leaf_reg': [1, 3, 5, 9]
+    },
+    'xgboost': {
+        'max_depth': [3, 4, 6, 8],
+        'learning_rate': [0.03, 0.05, 0.1, 0.2],
+        'subsample': [0.7, 0.85, 1.0],
+        'colsample_bytree': [0.7, 0.85, 1.0],
+        'min_child_weight': [1, 3, 5]
+    }
+}
+
+# Boosting models get a generous round cap and stop on the validation split
+MAX_BOOSTING_ROUNDS = 1000
+EARLY_STOPPING_ROUNDS = 30
+BOOSTING_ROUNDS_PARAM = {'catboost': 'iterations', 'xgboost': 'n_estimators'}
+
+
+def data_fingerprint(X_fit, y_fit, X_val, y_val, random_state):
+    """Hash of the training/validation split, so logged trials are only reused on the same data"""
+    digest = hashlib.sha1(str(random_state).encode())
+    for frame in (X_fit, y_fit, X_val, y_val):
+        digest.update(pd.util.hash_pandas_object(frame, index=True).to_numpy().tobytes())
+        if isinstance(frame, pd.DataFrame):
+            digest.update(json.dumps([str(c) for c in frame.columns]).encode())
+    return digest.hexdigest()
+
+
+def trial_key(family, params, fraction, data_key):
+    """Stable identifier for a (config, resource, data) triple in the trial log"""
+    payload = json.dumps([family, params, round(fraction, 4), data_key], sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def _run_trial(family, params, fraction, train_path, val_path, random_state, n_threads):
+    """
+    Fit one configuration on a fraction of the training data and score it
+    on the validation split. Runs inside a pool worker.
+    """
+    X_train, y_train = load_shared_data(train_path)
+    X_val, y_val = load_shared_data(val_path)
+
+    if fraction < 1.0:
+        X_train, _, y_train, _ = train_test_split(
+            X_train, y_train, train_size=fraction,
+            random_state=random_state, stratify=y_train
+        )
+
+    fit_params = dict(params)
+    thread_param = THREAD_PARAMS.get(family)
+    if thread_param:
+        fit_params[thread_param] = n_threads
+
+    if family in BOOSTING_ROUNDS_PARAM:
+        fit_params[BOOSTING_ROUNDS_PARAM[family]] = MAX_BOOSTING_ROUNDS
+        fit_params['early_stopping_rounds'] = EARLY_STOPPING_ROUNDS
+        fit_params['eval_set'] = (X_val, y_val)
+
+    trainer = ModelTrainer(random_state=random_state)
+    start = time.perf_counter()
+    model = getattr(trainer, TRAINER_METHODS[family])(X_train, y_train, **fit_params)
+    fit_seconds = time.perf_counter() - start
+
+    y_pred = np.asarray(model.predict(X_val)).ravel()
+    score = accuracy_score(y_val.astype(y_pred.dtype), y_pred)
+
+    best_iteration = None
+    if family == 'catboost':
+        best_iteration = model.get_best_iteration()
+    elif family == 'xgboost':
+        best_iteration = getattr(model, 'best_iteration', None)
+
+    return {
+        'family': family,
+        'params': params,
+        'fraction': fraction,
+        'score': float(score),
+        'best_iteration': None if best_iteration is None else int(best_iteration),
+        'fit_seconds': fit_seconds
+    }
+
+
+class HyperparameterTuner:
+    """
+    Hyperband search over the ModelTrainer families.
+
+    Each bracket runs successive halving with the fraction of training rows
+    as the resource; CatBoost and XGBoost additionally stop early on the
+    validation split. Every finished trial is appended to a JSON-lines log
+    so an interrupted search resumes without refitting completed trials.
+    Trials are keyed on the data split too, so a log from other data is
+    ignored, and failed trials are retried.
+    """
+
+    def __init__(self, families=None, eta=3, min_fraction=1 / 9, time_budget=None,
+                 n_workers=None, log_file="tuning_trials.jsonl", random_state=42):
+        self.families = families or list(SEARCH_SPACES.keys())
+        self.eta = eta
+        self.min_fraction = min_fraction
+        self.time_budget = time_budget
+        self.n_workers = n_workers or os.cpu_count() or 1
+        self.log_file = log_file
+        self.random_state = random_state
+        self.rng = np.random.RandomState(random_state)
+        self.trials = self._load_trial_log()
+        self.data_key = None
+        self.label_encoder = LabelEncoder()
+        self.start_time = None
+        self.budget_exhausted = False
+
+    def _load_trial_log(self):
+        """Load completed trials from a previous (possibly interrupted) run"""
+        trials = {}
+        if os.path.exists(self.log_file):
+            with open(self.log_file) as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # partially written last line
+                    trials[record['key']] = record
+            print(f"Resuming search: {len(trials)} completed trials in {self.log_file}")
+        return trials
+
+    def _append_trial(self, record):
+        """Persist a finished trial immediately"""
+        with open(self.log_file, 'a') as f:
+            f.write(json.dumps(record, default=str) + "\n")
+        self.trials[record['key']] = record
+
+    def _time_left(self):
+        if self.time_budget is None:
+            return True
+        return time.perf_counter() - self.start_time < self.time_budget
+
+    def sample_configs(self, n_configs):
+        """Draw configurations spread evenly across the model families"""
+        configs = []
+        for i in range(n_configs):
+            family = self.families[i % len(self.families)]
+            space = SEARCH_SPACES[family]
+            params = {}
+            for name, values in space.items():
+                value = values[self.rng.randint(len(values))]
+                params[name] = value.item() if hasattr(value, 'item') else value
+            configs.append((family, params))
+        return configs
+
+    def _evaluate_rung(self, configs, fraction, train_path, val_path):
+        """Evaluate configs at one resource level, reusing logged trials"""
+        results = {}
+        pending = []
+        for index, (family, params) in enumerate(configs):
+            key = trial_key(family, params, fraction, self.data_key)
+            if key in self.trials and 'error' not in self.trials[key]:
+                results[index] = self.trials[key]
+            else:
+                pending.append((index, key, family, params))
+
+        if not pending:
+            return [results[i] for i in range(len(configs))]
+
+        n_workers = min(self.n_workers, len(pending))
+        n_threads = max(1, (os.cpu_count() or 1) // n_workers)
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            futures = {
+                executor.submit(_run_trial, family, params, fraction, train_path, val_path,
+                                self.random_state, n_threads): (index, key)
+                for index, key, family, params in pending
+            }
+            for future in as_completed(futures):
+                index, key = futures[future]
+                try:
+                    record = future.result()
+                except Exception as e:
+                    family, params = configs[index]
+                    print(f"  Trial failed ({family} {params}): {e}")
+                    record = {'family': family, 'params': params, 'fraction': fraction,
+                              'score': float('-inf'), 'best_iteration': None, 'fit_seconds': 0.0,
+                              'error': str(e)}
+                record['key'] = key
+                record['data_key'] = self.data_key
+                record['timestamp'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                self._append_trial(record)
+                results[index] = record
+
+        return [results[i] for i in range(len(configs))]
+
+    def successive_halving(self, configs, min_fraction, train_path, val_path):
+        """Run one bracket: evaluate, keep the top 1/eta, grow the resource"""
+        fraction = min_fraction
+        survivors = configs
+        while survivors:
+            if not self._time_left():
+                self.budget_exhausted = True
+                print("Time budget exhausted, stopping bracket")
+                break
+
+            print(f"  Rung: {len(survivors)} configs at {fraction:.0%} of training data")
+            records = self._evaluate_rung(survivors, fraction, train_path, val_path)
+            if fraction >= 1.0:
+                break
+
+            n_keep = max(1, len(survivors) // self.eta)
+            order = np.argsort([-r['score'] for r in records], kind='stable')
+            survivors = [survivors[i] for i in order[:n_keep]]
+            fraction = min(1.0, fraction * self.eta)
+
+    def search(self, X_train, y_train, val_size=0.2):
+        """
+        Run Hyperband: brackets from aggressive (many configs, little data)
+        to conservative (few configs, all data)
+        """
+        self.start_time = time.perf_counter()
+        y_encoded = pd.Series(self.label_encoder.fit_transform(y_train), name=y_train.name)
+        X_fit, X_val, y_fit, y_val = train_test_split(
+            X_train.reset_index(drop=True), y_encoded, test_size=val_size,
+            random_state=self.random_state, stratify=y_encoded
+        )
+        self.data_key = data_fingerprint(X_fit, y_fit, X_val, y_val, self.random_state)
+
+        s_max = int(math.floor(math.log(1 / self.min_fraction, self.eta) + 1e-9))
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            train_path = share_training_data(X_fit, y_fit, os.path.join(tmp_dir, "fit.joblib"))
+            val_path = share_training_data(X_val, y_val, os.path.join(tmp_dir, "val.joblib"))
+
+            for s in range(s_max, -1, -1):
+                n_configs = int(math.ceil((s_max + 1) / (s + 1) * self.eta ** s))
+                n_configs = max(n_configs, len(self.families))
+                min_fraction = self.eta ** -s
+                print(f"\nBracket s={s}: {n_configs} configs, starting at {min_fraction:.0%}")
+                self.successive_halving(self.sample_configs(n_configs), min_fraction,
+                                        train_path, val_path)
+                if self.budget_exhausted:
+                    break
+
+        elapsed = time.perf_counter() - self.start_time
+        print(f"\nSearch finished in {elapsed:.1f}s ({len(self.trials)} trials logged)")
+        return self.get_results(elapsed)
+
+    def get_results(self, elapsed=None):
+        """Best full-data configuration per family and overall"""
+        best_per_family = {}
+        for record in self.trials.values():
+            if record['fraction'] < 1.0 or record['family'] not in self.families:
+                continue
+            if record.get('data_key') != self.data_key or 'error' in record:
+                continue
+            current = best_per_family.get(record['family'])
+            if current is None or record['score'] > current['validation_accuracy']:
+                params = dict(record['params'])
+                if record.get('best_iteration') is not None:
+                    params[BOOSTING_ROUNDS_PARAM[record['family']]] = record['best_iteration'] + 1
+                best_per_family[record['family']] = {
+                    'params': params,
+                    'validation_accuracy': record['score'],
+                    'fit_seconds': record['fit_seconds']
+                }
+
+        best_overall = None
+        if best_per_family:
+            family = max(best_per_family, key=lambda f: best_per_family[f]['validation_accuracy'])
+            best_overall = {'family': family, **best_per_family[family]}
+
+        return {
+            'search_metadata': {
+                'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                'method': 'hyperband',
+                'eta': self.eta,
+                'min_fraction': self.min_fraction,
+                'time_budget_seconds': self.time_budget,
+                'budget_exhausted': self.budget_exhausted,
+                'elapsed_seconds': elapsed,
+                'total_trials': len(self.trials)
+            },
+            'best_per_family': best_per_family,
+            'best_overall': best_overall
+        }
+
+    def save_results(self, results, file_path=TUNING_RESULTS_FILE):
+        """Save search results for model_training.py and model_evaluation.py"""
+        try:
+            with open(file_path, 'w') as f:
+                json.dump(results, f, indent=2, default=str)
+            print(f"Tuning results saved to {file_path}")
+        except Exception as e:
+            print(f"Error saving tuning results: {e}")
+
+
+def main(time_budget=None):
+    """
+    Main function to run the hyperparameter search
+    """
+    print("=== Hyperparameter Tuning ===\n")
+
+    try:
+        X_train = pd.read_csv("X_train.csv")
+        y_train = pd.read_csv("y_train.csv").squeeze()
+    except FileNotFoundError:
+        print("Error: Training data not found. Please run data_transformation.py first.")
+        return None
+
+    tuner = HyperparameterTuner(time_budget=time_budget)
+    results = tuner.search(X_train, y_train)
+    tuner.save_results(results)
+
+    print("\n=== Best Configurations ===")
+    for family, best in results['best_per_family'].items():
+        print(f"{family}: {best['validation_accuracy']:.3f} {best['params']}")
+
+    return results
+
+
+if __name__ == "__main__":
+    budget = float(sys.argv[1]) if len(sys.argv) > 1 else None
+    results = main(time_budget=budget)
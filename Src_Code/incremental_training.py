@@ -0,0 +1,209 @@
+import os
+import sys
+import json
+import time
+import numpy as np
+import pandas as pd
+import joblib
+from datetime import datetime
+from sklearn.metrics import accuracy_score
+from data_cleaning import DataCleaner, CleaningStatistics
+from data_transformation import encode_features
+from model_training import ModelTrainer
+
+
+class IncrementalRetrainer:
+    """
+    Fold newly collected screening records into the stored dataset and the
+    trained models without re-running the full pipeline.
+
+    New rows are cleaned with persisted CleaningStatistics, appended to the
+    raw and cleaned CSVs, and combined with a bounded replay sample of
+    history. Boosting models are warm-started, the forest grows new trees
+    and the decision tree is refit on the delta plus replay, so the cost of
+    a retrain follows the size of the new batch rather than of the history.
+    """
+
+    def __init__(self, raw_path="enhanced_health_data.csv", cleaned_path="cleaned_health_data.csv",
+                 stats_path="cleaning_stats.json", replay_path="replay_sample.csv",
+                 state_path="incremental_state.json", model_dir="", replay_rows=2000,
+                 target_column='Health', random_state=42):
+        self.raw_path = raw_path
+        self.cleaned_path = cleaned_path
+        self.stats_path = stats_path
+        self.replay_path = replay_path
+        self.state_path = state_path
+        self.model_dir = model_dir
+        self.replay_rows = replay_rows
+        self.target_column = target_column
+        self.rng = np.random.RandomState(random_state)
+        self.trainer = ModelTrainer(random_state=random_state)
+        self.stats = None
+        self.state = None
+
+    def _load_state(self):
+        """Load cleaning statistics and replay bookkeeping, bootstrapping once if missing"""
+        if os.path.exists(self.state_path):
+            with open(self.state_path) as f:
+                self.state = json.load(f)
+        else:
+            self.state = {'replay_seen': 0, 'retrains': []}
+
+        if os.path.exists(self.stats_path):
+            self.stats = CleaningStatistics.load(self.stats_path)
+        else:
+            print("No cleaning statistics found, fitting them on the stored raw dataset (one-time)...")
+            raw = pd.read_csv(self.raw_path)
+            cleaner = DataCleaner(raw, show_plots=False)
+            cleaner.remove_unnecessary_columns()
+            cleaner.standardize_categorical_data()
+            self.stats = CleaningStatistics().update(cleaner.get_cleaned_data())
+
+        if not os.path.exists(self.replay_path):
+            print("No replay sample found, drawing one from the cleaned dataset (one-time)...")
+            cleaned = pd.read_csv(self.cleaned_path)
+            cleaned.sample(n=min(self.replay_rows, len(cleaned)), random_state=self.rng).to_csv(
+                self.replay_path, index=False
+            )
+            self.state['replay_seen'] = len(cleaned)
+
+    def _save_state(self):
+        self.stats.save(self.stats_path)
+        with open(self.state_path, 'w') as f:
+            json.dump(self.state, f, indent=2)
+
+    def ingest(self, new_df):
+        """Append raw records, update cleaning statistics and clean the batch"""
+        new_df.to_csv(self.raw_path, mode='a', header=not os.path.exists(self.raw_path), index=False)
+
+        cleaner = DataCleaner(new_df, show_plots=False)
+        cleaner.remove_unnecessary_columns()
+        cleaner.standardize_categorical_data()
+        self.stats.update(cleaner.get_cleaned_data())
+        cleaned = cleaner.apply_statistics(self.stats)
+
+        cleaned.to_csv(self.cleaned_path, mode='a', header=not os.path.exists(self.cleaned_path), index=False)
+        print(f"✓ Appended {len(cleaned)} records ({self.stats.n_rows} rows seen by cleaning statistics)")
+        return cleaned
+
+    def _update_replay(self, cleaned):
+        """
+        Reservoir-sample (Algorithm R) the new cleaned rows into the replay
+        set. A row's slot draw depends only on its position in the stream,
+        so all draws are made at once and applied in a single assignment.
+        """
+        replay = pd.read_csv(self.replay_path)
+        new_rows = cleaned[replay.columns].reset_index(drop=True)
+        seen = self.state['replay_seen']
+
+        n_fill = max(0, min(len(new_rows), self.replay_rows - len(replay)))
+        if n_fill:
+            replay = pd.concat([replay, new_rows.iloc[:n_fill]], ignore_index=True)
+        rest = new_rows.iloc[n_fill:]
+        if len(rest):
+            # Row with 1-based stream position t replaces slot randint(t) if it is in the reservoir
+            positions = seen + n_fill + 1 + np.arange(len(rest))
+            slots = self.rng.randint(0, positions)
+            chosen = np.flatnonzero(slots < self.replay_rows)
+            # When several rows draw the same slot the last one wins, as in the sequential loop
+            _, last = np.unique(slots[chosen][::-1], return_index=True)
+            chosen = chosen[::-1][last]
+            replay.iloc[slots[chosen]] = rest.iloc[chosen].to_numpy()
+
+        self.state['replay_seen'] = seen + len(new_rows)
+        replay.to_csv(self.replay_path, index=False)
+
+    def _split(self, df):
+        X = encode_features(df.drop(columns=[self.target_column]), save_to_csv=False)
+        return X, df[self.target_column]
+
+    def load_models(self, model_names=('decision_tree', 'random_forest', 'catboost', 'xgboost')):
+        for name in model_names:
+            path = f"{self.model_dir}{name}_model.pkl"
+            if os.path.exists(path):
+                self.trainer.models[name] = joblib.load(path)
+        print(f"Loaded models: {list(self.trainer.models.keys())}")
+
+    def retrain(self, new_df, holdout_X=None, holdout_y=None):
+        """
+        Ingest a labelled batch, update every loaded model, and evaluate on
+        the batch itself plus the fixed holdout. The batch is scored before
+        the models see it (prequential), so delta_accuracy is out-of-sample.
+        """
+        start = time.perf_counter()
+        self._load_state()
+        if not self.trainer.models:
+            self.load_models()
+
+        cleaned = self.ingest(new_df)
+        replay = pd.read_csv(self.replay_path)
+        X_new, y_new = self._split(cleaned)
+        X_fit, y_fit = self._split(pd.concat([cleaned, replay], ignore_index=True))
+
+        update_methods = {
+            'decision_tree': self.trainer.update_decision_tree,
+            'random_forest': self.trainer.update_random_forest,
+            'catboost': self.trainer.update_catboost,
+            'xgboost': self.trainer.update_xgboost
+        }
+        # Score the new rows before training on them
+        evaluation = {
+            name: {'delta_accuracy': float(accuracy_score(y_new, np.asarray(model.predict(X_new)).ravel()))}
+            for name, model in self.trainer.models.items()
+        }
+
+        update_times = {}
+        for name in list(self.trainer.models):
+            fit_start = time.perf_counter()
+            update_methods[name](X_fit, y_fit)
+            update_times[name] = time.perf_counter() - fit_start
+
+        for name, model in self.trainer.models.items():
+            if holdout_X is not None:
+                holdout_pred = np.asarray(model.predict(holdout_X)).ravel()
+                evaluation[name]['holdout_accuracy'] = float(accuracy_score(holdout_y, holdout_pred))
+            print(f"{name}: delta accuracy (before update) {evaluation[name]['delta_accuracy']:.3f}"
+                  + (f", holdout accuracy {evaluation[name]['holdout_accuracy']:.3f}" if holdout_X is not None else ""))
+
+        self.trainer.save_all_models(self.model_dir)
+        self._update_replay(cleaned)
+
+        elapsed = time.perf_counter() - start
+        summary = {
+            'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'new_rows': len(cleaned),
+            'fit_rows': len(X_fit),
+            'total_rows': self.stats.n_rows,
+            'update_seconds': update_times,
+            'elapsed_seconds': elapsed,
+            'evaluation': evaluation
+        }
+        self.state['retrains'].append(summary)
+        self._save_state()
+        print(f"\nIncremental retrain finished in {elapsed:.2f}s")
+        return summary
+
+
+def main(new_records_path):
+    """
+    Main function to fold a file of new labelled records into the models
+    """
+    print("=== Incremental Retraining ===\n")
+    new_df = pd.read_csv(new_records_path)
+
+    try:
+        holdout_X = pd.read_csv("X_test.csv")
+        holdout_y = pd.read_csv("y_test.csv").squeeze()
+    except FileNotFoundError:
+        print("Holdout split not found, evaluating on the new records only")
+        holdout_X, holdout_y = None, None
+
+    retrainer = IncrementalRetrainer()
+    return retrainer.retrain(new_df, holdout_X, holdout_y)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python incremental_training.py <new_records.csv>")
+        sys.exit(1)
+    summary = main(sys.argv[1])
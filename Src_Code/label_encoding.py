@@ -0,0 +1,32 @@
+import numpy as np
+from sklearn.preprocessing import LabelEncoder
+from xgboost import XGBClassifier
+
+
+class LabelEncodedXGBClassifier(XGBClassifier):
+    """
+    XGBClassifier that takes and predicts the original class labels
+    ('Bad', 'Fair', 'Good'). XGBoost only accepts 0..n-1 targets, so y is
+    label-encoded on fit, as cross_validation.py and hyperparameter_tuning.py
+    do, and predictions are decoded. classes_ stays XGBoost's 0..n-1; the
+    labels are in label_encoder_.classes_.
+
+    Kept in its own module so pickled models load wherever Src_Code is
+    importable, not only in the script that trained them.
+    """
+
+    def fit(self, X, y, **kwargs):
+        # Continued training (xgb_model=...) must keep the base model's coding
+        if kwargs.get('xgb_model') is not None and hasattr(self, 'label_encoder_'):
+            encoder = self.label_encoder_
+        else:
+            encoder = LabelEncoder().fit(np.asarray(y))
+        if kwargs.get('eval_set'):
+            kwargs['eval_set'] = [(X_eval, encoder.transform(np.asarray(y_eval)))
+                                  for X_eval, y_eval in kwargs['eval_set']]
+        super().fit(X, encoder.transform(np.asarray(y)), **kwargs)
+        self.label_encoder_ = encoder
+        return self
+
+    def predict(self, X, **kwargs):
+        return self.label_encoder_.inverse_transform(np.asarray(super().predict(X, **kwargs)).astype(int))
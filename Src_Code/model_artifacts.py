@@ -0,0 +1,224 @@
+import os
+import sys
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+import joblib
+from datetime import datetime
+
+ARTIFACT_FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+
+# Rows traversed at once; bounds the (rows x trees) node-index matrix
+PREDICT_CHUNK_ROWS = 8192
+
+
+def training_data_hash(X, y=None):
+    """Content hash of the training data, stored in the manifest"""
+    digest = hashlib.sha256()
+    digest.update(pd.util.hash_pandas_object(X, index=False).values.tobytes())
+    digest.update(",".join(map(str, X.columns)).encode())
+    if y is not None:
+        digest.update(pd.util.hash_pandas_object(pd.Series(y), index=False).values.tobytes())
+    return digest.hexdigest()
+
+
+def _tree_arrays(estimators):
+    """
+    Flatten sklearn trees into shared node arrays. Child indices are
+    rewritten to global positions; leaves keep -1 as their left child.
+    Node values are normalised to class probabilities, as sklearn does
+    before averaging a forest.
+    """
+    left, right, feature, threshold, value, roots = [], [], [], [], [], []
+    offset = 0
+    max_depth = 0
+    for estimator in estimators:
+        tree = estimator.tree_
+        is_leaf = tree.children_left == -1
+        left.append(np.where(is_leaf, -1, tree.children_left + offset))
+        right.append(np.where(is_leaf, -1, tree.children_right + offset))
+        feature.append(np.where(is_leaf, 0, tree.feature))
+        threshold.append(tree.threshold)
+        node_values = tree.value[:, 0, :]
+        totals = node_values.sum(axis=1, keepdims=True)
+        value.append(node_values / np.where(totals == 0, 1, totals))
+        roots.append(offset)
+        offset += tree.node_count
+        max_depth = max(max_depth, tree.max_depth)
+
+    return {
+        'children_left': np.concatenate(left).astype(np.int32),
+        'children_right': np.concatenate(right).astype(np.int32),
+        'feature': np.concatenate(feature).astype(np.int32),
+        'threshold': np.concatenate(threshold).astype(np.float64),
+        'value': np.concatenate(value).astype(np.float64),
+        'roots': np.asarray(roots, dtype=np.int32)
+    }, max_depth
+
+
+class MappedTreeEnsemble:
+    """
+    Predictor over memory-mapped tree arrays. Behaves like the sklearn
+    model it was exported from for predict / predict_proba, but the node
+    arrays stay in the page cache and are shared between processes.
+    """
+
+    def __init__(self, arrays, manifest):
+        self.arrays = arrays
+        self.manifest = manifest
+        self.classes_ = np.asarray(manifest['classes'])
+        self.feature_names_in_ = np.asarray(manifest['feature_names'])
+        self.n_features_in_ = len(manifest['feature_names'])
+        self.max_depth = manifest['max_depth']
+
+    def _as_matrix(self, X):
+        if isinstance(X, pd.DataFrame):
+            X = X[list(self.feature_names_in_)]
+        return np.asarray(X, dtype=np.float32).reshape(-1, self.n_features_in_)
+
+    def _traverse(self, X):
+        left = self.arrays['children_left']
+        right = self.arrays['children_right']
+        feature = self.arrays['feature']
+        threshold = self.arrays['threshold']
+        value = self.arrays['value']
+        roots = self.arrays['roots']
+
+        rows = np.arange(len(X))[:, None]
+        nodes = np.broadcast_to(roots, (len(X), len(roots))).copy()
+        for _ in range(self.max_depth):
+            next_left = left[nodes]
+            is_leaf = next_left == -1
+            if is_leaf.all():
+                break
+            goes_left = X[rows, feature[nodes]] <= threshold[nodes]
+            nodes = np.where(is_leaf, nodes, np.where(goes_left, next_left, right[nodes]))
+        return value[nodes].mean(axis=1)
+
+    def predict_proba(self, X):
+        X = self._as_matrix(X)
+        return np.concatenate([
+            self._traverse(X[start:start + PREDICT_CHUNK_ROWS])
+            for start in range(0, len(X), PREDICT_CHUNK_ROWS)
+        ]) if len(X) else np.empty((0, len(self.classes_)))
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+
+def save_artifact(model, artifact_dir, feature_names, model_version="1", data_hash=None):
+    """
+    Write a model as aligned, uncompressed .npy buffers plus a JSON
+    manifest. sklearn trees and forests are exported as node arrays;
+    CatBoost uses its native binary format; anything else falls back to
+    a joblib pickle so every model can still be described by a manifest.
+    """
+    os.makedirs(artifact_dir, exist_ok=True)
+    manifest = {
+        'format_version': ARTIFACT_FORMAT_VERSION,
+        'model_type': type(model).__name__,
+        'model_version': model_version,
+        'feature_names': list(feature_names),
+        'classes': [c.item() if hasattr(c, 'item') else c for c in np.asarray(model.classes_).ravel()],
+        'training_data_hash': data_hash,
+        'created_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    }
+
+    if hasattr(model, 'tree_') or hasattr(model, 'estimators_'):
+        estimators = model.estimators_ if hasattr(model, 'estimators_') else [model]
+        arrays, max_depth = _tree_arrays(estimators)
+        manifest.update({'kind': 'tree_ensemble', 'n_trees': len(estimators), 'max_depth': max_depth})
+        manifest['arrays'] = {}
+        for name, array in arrays.items():
+            file_name = f"{name}.npy"
+            # np.save pads the header so the data starts 64-byte aligned
+            np.save(os.path.join(artifact_dir, file_name), np.ascontiguousarray(array))
+            manifest['arrays'][name] = {'file': file_name, 'dtype': str(array.dtype), 'shape': list(array.shape)}
+    elif type(model).__name__ == 'CatBoostClassifier':
+        model.save_model(os.path.join(artifact_dir, "model.cbm"), format="cbm")
+        manifest.update({'kind': 'catboost', 'file': "model.cbm"})
+    else:
+        joblib.dump(model, os.path.join(artifact_dir, "model.pkl"))
+        manifest.update({'kind': 'joblib', 'file': "model.pkl"})
+
+    with open(os.path.join(artifact_dir, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    print(f"Artifact saved to {artifact_dir} ({manifest['kind']})")
+    return manifest
+
+
+def load_manifest(artifact_dir):
+    with open(os.path.join(artifact_dir, MANIFEST_FILE)) as f:
+        return json.load(f)
+
+
+def load_artifact(artifact_dir):
+    """Load an artifact; tree arrays are memory-mapped read-only"""
+    manifest = load_manifest(artifact_dir)
+    if manifest['format_version'] > ARTIFACT_FORMAT_VERSION:
+        raise ValueError(f"Unsupported artifact format version {manifest['format_version']}")
+
+    if manifest['kind'] == 'tree_ensemble':
+        arrays = {
+            name: np.load(os.path.join(artifact_dir, spec['file']), mmap_mode='r')
+            for name, spec in manifest['arrays'].items()
+        }
+        return MappedTreeEnsemble(arrays, manifest)
+    if manifest['kind'] == 'catboost':
+        from catboost import CatBoostClassifier
+        model = CatBoostClassifier()
+        model.load_model(os.path.join(artifact_dir, manifest['file']), format="cbm")
+        return model
+    return joblib.load(os.path.join(artifact_dir, manifest['file']))
+
+
+def load_any_model(model_path):
+    """Load either an artifact directory or a joblib pickle"""
+    if os.path.isdir(model_path):
+        return load_artifact(model_path)
+    return joblib.load(model_path)
+
+
+def benchmark_formats(pickle_path, artifact_dir):
+    """Compare load time and RSS of the pickle and the artifact"""
+    from model_evaluation import measure_load_footprint, artifact_size_bytes
+
+    results = {}
+    for label, path, loader in (('pickle', pickle_path, joblib.load),
+                                ('artifact', artifact_dir, load_artifact)):
+        load_seconds, rss_after, rss_delta = measure_load_footprint(path, loader)
+        results[label] = {
+            'load_time_ms': load_seconds * 1000,
+            'rss_load_delta_bytes': rss_delta,
+            'size_bytes': artifact_size_bytes(path)
+        }
+        print(f"{label:<9} load {load_seconds * 1000:8.1f}ms  "
+              f"RSS +{(rss_delta or 0) / 1024 ** 2:7.1f}MB  size {results[label]['size_bytes'] / 1024:.0f}KB")
+    return results
+
+
+def main(pickle_path, artifact_dir, model_version="1"):
+    """
+    Convert a pickled model to the artifact format and benchmark both
+    """
+    model = joblib.load(pickle_path)
+    data_hash = None
+    try:
+        X_train = pd.read_csv("X_train.csv")
+        y_train = pd.read_csv("y_train.csv").squeeze()
+        data_hash = training_data_hash(X_train, y_train)
+        feature_names = list(X_train.columns)
+    except FileNotFoundError:
+        feature_names = list(getattr(model, 'feature_names_in_', []))
+
+    save_artifact(model, artifact_dir, feature_names, model_version, data_hash)
+    return benchmark_formats(pickle_path, artifact_dir)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Usage: python model_artifacts.py <model.pkl> <artifact_dir> [model_version]")
+        sys.exit(1)
+    results = main(*sys.argv[1:4])
@@ -0,0 +1,229 @@
+import io
+import sys
+import copy
+import json
+import numpy as np
+import pandas as pd
+import joblib
+from sklearn.base import clone
+from sklearn.tree import DecisionTreeClassifier, export_text
+from sklearn.model_selection import train_test_split
+from sklearn.metrics import accuracy_score
+from model_evaluation import ModelEvaluator
+
+COMPRESSION_REPORT_FILE = "compression_report.json"
+
+
+def serialized_size(model):
+    """Size of the model as a joblib pickle, in bytes"""
+    buffer = io.BytesIO()
+    joblib.dump(model, buffer)
+    return buffer.tell()
+
+
+class ModelCompressor:
+    """
+    Build cheaper stand-ins for the large ensembles: forests pruned to
+    their most useful trees, and shallow decision trees distilled from
+    an ensemble's predictions on augmented samples.
+    """
+
+    def __init__(self, X_train, random_state=42):
+        self.X_train = X_train
+        self.random_state = random_state
+        self.rng = np.random.RandomState(random_state)
+        self.candidates = {}
+        self.rules = {}
+
+    def prune_forest(self, forest, X_val, y_val, sizes=(5, 10, 20, 50, 100), name='random_forest'):
+        """
+        Greedy forward selection of trees: each step adds the tree that
+        most improves validation accuracy of the averaged probabilities
+        """
+        print(f"Pruning {name} ({len(forest.estimators_)} trees)...")
+        X_values = X_val.to_numpy(dtype=np.float32)
+        tree_probas = np.stack([tree.predict_proba(X_values, check_input=False) for tree in forest.estimators_])
+        y_index = np.searchsorted(forest.classes_, np.asarray(y_val))
+
+        max_size = min(max(sizes), len(forest.estimators_))
+        selected = []
+        remaining = list(range(len(forest.estimators_)))
+        running_sum = np.zeros_like(tree_probas[0])
+        for step in range(max_size):
+            # Accuracy of the ensemble if each remaining tree were added
+            trial = (running_sum[None, :, :] + tree_probas[remaining]).argmax(axis=2)
+            scores = (trial == y_index[None, :]).mean(axis=1)
+            best = remaining[int(np.argmax(scores))]
+            selected.append(best)
+            remaining.remove(best)
+            running_sum += tree_probas[best]
+
+        for size in sizes:
+            if size >= len(forest.estimators_):
+                continue
+            # Shallow copy: the pruned forest shares the selected tree objects
+            pruned = copy.copy(forest)
+            pruned.estimators_ = [forest.estimators_[i] for i in selected[:size]]
+            pruned.n_estimators = size
+            self.candidates[f"{name}_pruned_{size}"] = pruned
+
+        return selected
+
+    def augment_samples(self, n_samples, noise_scale=0.1, flip_prob=0.1):
+        """
+        Draw training rows with replacement and perturb them: Gaussian noise
+        on continuous columns, random flips on binary columns
+        """
+        rows = self.X_train.iloc[self.rng.randint(len(self.X_train), size=n_samples)].reset_index(drop=True)
+        augmented = rows.astype(float)
+        for col in self.X_train.columns:
+            values = self.X_train[col]
+            if values.nunique() <= 2:
+                low, high = values.min(), values.max()
+                flip = self.rng.rand(n_samples) < flip_prob
+                augmented.loc[flip, col] = low + high - augmented.loc[flip, col]
+            else:
+                noise = self.rng.normal(0, noise_scale * values.std(), size=n_samples)
+                augmented[col] = (augmented[col] + noise).clip(values.min(), values.max())
+        return pd.concat([self.X_train.astype(float), augmented], ignore_index=True)
+
+    def distill(self, teacher, depths=(3, 4, 5, 6, 8), n_augmented=20000, name='catboost'):
+        """Fit depth-limited trees to the teacher's labels on augmented data"""
+        print(f"Distilling {name} into shallow trees...")
+        X_aug = self.augment_samples(n_augmented)
+        y_aug = np.asarray(teacher.predict(X_aug)).ravel()
+
+        for depth in depths:
+            student = DecisionTreeClassifier(max_depth=depth, random_state=self.random_state)
+            student.fit(X_aug, y_aug)
+            key = f"{name}_distilled_depth{depth}"
+            self.candidates[key] = student
+            self.rules[key] = export_text(student, feature_names=list(self.X_train.columns))
+
+    def tradeoff_curve(self, X_val, y_val, X_test=None, y_test=None, baselines=None):
+        """
+        Validation accuracy, single-row latency and size for every
+        candidate, sorted from fastest to slowest. Test accuracy is only
+        reported, never used to choose.
+        """
+        evaluator = ModelEvaluator()
+        models = {**(baselines or {}), **self.candidates}
+        curve = []
+        for name, model in models.items():
+            y_pred = np.asarray(model.predict(X_val)).ravel()
+            runtime = evaluator.benchmark_inference(model, X_val, n_single=100, batch_sizes=(256,))
+            curve.append({
+                'model': name,
+                'val_accuracy': float(accuracy_score(y_val, y_pred)),
+                'latency_p50_ms': runtime['latency_p50_ms'],
+                'latency_p99_ms': runtime['latency_p99_ms'],
+                'throughput_rows_per_sec': runtime['throughput_rows_per_sec']['256'],
+                'serialized_size_bytes': serialized_size(model),
+                'baseline': name in (baselines or {})
+            })
+            if X_test is not None:
+                curve[-1]['test_accuracy'] = float(accuracy_score(y_test, np.asarray(model.predict(X_test)).ravel()))
+        curve.sort(key=lambda point: point['latency_p50_ms'])
+        return curve
+
+    def select_smallest(self, curve, tolerance=0.01):
+        """
+        Smallest model whose validation accuracy is within `tolerance` of
+        the best model on the curve
+        """
+        best_accuracy = max(point['val_accuracy'] for point in curve)
+        eligible = [p for p in curve if p['val_accuracy'] >= best_accuracy - tolerance]
+        chosen = min(eligible, key=lambda p: (p['serialized_size_bytes'], p['latency_p50_ms']))
+        print(f"Selected {chosen['model']}: validation accuracy {chosen['val_accuracy']:.3f} "
+              f"(best {best_accuracy:.3f}, tolerance {tolerance}), "
+              f"{chosen['serialized_size_bytes'] / 1024:.0f}KB, p50 {chosen['latency_p50_ms']:.2f}ms")
+        return chosen['model']
+
+    def get_model(self, name, baselines=None):
+        return {**(baselines or {}), **self.candidates}[name]
+
+    def save_report(self, curve, selected, tolerance, file_path=COMPRESSION_REPORT_FILE):
+        """Save the tradeoff curve and the selected model"""
+        try:
+            report = {
+                'tolerance': tolerance,
+                'selected_model': selected,
+                'tradeoff_curve': curve,
+                'rules': {selected: self.rules[selected]} if selected in self.rules else {}
+            }
+            with open(file_path, 'w') as f:
+                json.dump(report, f, indent=2)
+            print(f"Compression report saved to {file_path}")
+        except Exception as e:
+            print(f"Error saving compression report: {e}")
+
+
+def run_compression(models, X_train, y_train, X_test, y_test, tolerance=0.01,
+                    output_path="compressed_model.pkl", val_size=0.2, random_state=42):
+    """
+    Compression stage: prune the random forest, distill the ensembles,
+    and keep the smallest model within the accuracy tolerance.
+
+    A holdout of the training data is split in two: pruning picks trees
+    on one half, selection ranks every candidate on the other. The
+    baselines are refitted without the holdout, and the test set only
+    provides the final numbers.
+    """
+    print("\n=== Model Compression ===")
+    X_fit, X_holdout, y_fit, y_holdout = train_test_split(
+        X_train, y_train, test_size=val_size, random_state=random_state, stratify=y_train)
+    # Greedy pruning overfits the rows it picks trees on, so selection
+    # must not reuse them
+    X_prune, X_val, y_prune, y_val = train_test_split(
+        X_holdout, y_holdout, test_size=0.5, random_state=random_state, stratify=y_holdout)
+    print(f"Refitting {len(models)} baselines on {len(X_fit)} rows; "
+          f"{len(X_prune)} held out for pruning, {len(X_val)} for selection")
+    baselines = {name: clone(model).fit(X_fit, y_fit) for name, model in models.items()}
+
+    compressor = ModelCompressor(X_fit, random_state)
+    if 'random_forest' in baselines:
+        compressor.prune_forest(baselines['random_forest'], X_prune, y_prune)
+    for name in ('catboost', 'random_forest', 'xgboost'):
+        if name in baselines:
+            compressor.distill(baselines[name], name=name)
+
+    curve = compressor.tradeoff_curve(X_val, y_val, X_test, y_test, baselines=baselines)
+    print("\nAccuracy vs latency:")
+    for point in curve:
+        print(f"  {point['model']:<32} val {point['val_accuracy']:.3f}  test {point['test_accuracy']:.3f}  "
+              f"p50 {point['latency_p50_ms']:.3f}ms  size {point['serialized_size_bytes'] / 1024:.0f}KB")
+
+    selected = compressor.select_smallest(curve, tolerance)
+    joblib.dump(compressor.get_model(selected, baselines=baselines), output_path)
+    print(f"Compressed model saved to {output_path}")
+    compressor.save_report(curve, selected, tolerance)
+
+    return selected, curve
+
+
+def main(tolerance=0.01):
+    """
+    Main function to compress the saved models
+    """
+    try:
+        X_train = pd.read_csv("X_train.csv")
+        y_train = pd.read_csv("y_train.csv").squeeze()
+        X_test = pd.read_csv("X_test.csv")
+        y_test = pd.read_csv("y_test.csv").squeeze()
+    except FileNotFoundError:
+        print("Error: Train/test splits not found. Please run data_transformation.py first.")
+        return None, None
+
+    models = {}
+    for name in ('decision_tree', 'random_forest', 'catboost', 'xgboost'):
+        try:
+            models[name] = joblib.load(f"{name}_model.pkl")
+        except Exception as e:
+            print(f"Skipping {name}: {e}")
+
+    return run_compression(models, X_train, y_train, X_test, y_test, tolerance)
+
+
+if __name__ == "__main__":
+    tolerance = float(sys.argv[1]) if len(sys.argv) > 1 else 0.01
+    selected, curve = main(tolerance)
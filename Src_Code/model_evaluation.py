@@ -2,31 +2,198 @@ import pandas as pd
 import numpy as np
 import json
 import os
+import time
+import argparse
+import multiprocessing
 from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
 from sklearn.metrics import confusion_matrix, classification_report, accuracy_score, precision_score, recall_score, f1_score
 import joblib
+from model_artifacts import load_any_model
+
+try:
+    import psutil
+except ImportError:  # fall back to /proc on Linux
+    psutil = None
+
+# Batch sizes used for throughput measurements
+BENCHMARK_BATCH_SIZES = (1, 32, 256, 1024)
+
+
+def current_rss_bytes():
+    """Resident set size of the current process"""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def _load_in_fresh_process(model_path, loader=joblib.load):
+    """Load a model in a clean worker and report load time and RSS growth"""
+    rss_before = current_rss_bytes()
+    start = time.perf_counter()
+    model = loader(model_path)
+    load_seconds = time.perf_counter() - start
+    rss_after = current_rss_bytes()
+    del model
+    rss_delta = None if rss_before is None or rss_after is None else rss_after - rss_before
+    return load_seconds, rss_after, rss_delta
+
+
+def measure_load_footprint(model_path, loader=joblib.load):
+    """
+    Measure artifact load time and resident memory in a separate process,
+    so models already loaded here do not skew the numbers. The worker is
+    spawned rather than forked, so it does not inherit this process's heap.
+    """
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+        return executor.submit(_load_in_fresh_process, model_path, loader).result()
+
+
+def artifact_size_bytes(path):
+    """Serialized size of a model file or artifact directory"""
+    if os.path.isdir(path):
+        return sum(
+            os.path.getsize(os.path.join(root, name))
+            for root, _, files in os.walk(path) for name in files
+        )
+    return os.path.getsize(path)
+
+
+def iter_test_chunks(X_path, y_path, chunk_size):
+    """Yield aligned (X, y) chunks of the test CSVs without loading them whole"""
+    y_chunks = pd.read_csv(y_path, chunksize=chunk_size)
+    for X_chunk in pd.read_csv(X_path, chunksize=chunk_size):
+        y_chunk = next(y_chunks, None)
+        if y_chunk is None or len(y_chunk) != len(X_chunk):
+            raise ValueError(f"{X_path} and {y_path} have different numbers of rows")
+        yield X_chunk, y_chunk.iloc[:, 0]
+    if next(y_chunks, None) is not None:
+        raise ValueError(f"{X_path} and {y_path} have different numbers of rows")
+
+
+def _label(value):
+    return value.item() if hasattr(value, 'item') else value
+
+
+class StreamingConfusionMatrix:
+    """
+    Confusion matrix accumulated chunk by chunk. Precision, recall and F1
+    are derived from it, so predictions never have to be kept around.
+    Labels are added as they appear, in truth or in predictions.
+    """
+
+    def __init__(self):
+        self.index = {}
+        self.matrix = np.zeros((0, 0), dtype=np.int64)
+
+    def _codes(self, labels):
+        values, inverse = np.unique(np.asarray(labels), return_inverse=True)
+        for value in values:
+            self.index.setdefault(_label(value), len(self.index))
+        lookup = np.array([self.index[_label(value)] for value in values], dtype=np.int64)
+        return lookup[inverse.ravel()]
+
+    def update(self, y_true, y_pred):
+        true_codes = self._codes(y_true)
+        pred_codes = self._codes(y_pred)
+        k = len(self.index)
+        if k > len(self.matrix):
+            grown = np.zeros((k, k), dtype=np.int64)
+            grown[:len(self.matrix), :len(self.matrix)] = self.matrix
+            self.matrix = grown
+        self.matrix += np.bincount(true_codes * k + pred_codes, minlength=k * k).reshape(k, k)
+        return self
+
+    def summary(self):
+        """Accuracy, per-class and averaged metrics as sklearn computes them (zero_division=0)"""
+        classes = sorted(self.index)
+        order = [self.index[c] for c in classes]
+        cm = self.matrix[np.ix_(order, order)]
+
+        tp = np.diag(cm).astype(float)
+        support = cm.sum(axis=1)
+        predicted = cm.sum(axis=0)
+        zeros = np.zeros(len(classes))
+        precision = np.divide(tp, predicted, out=zeros.copy(), where=predicted > 0)
+        recall = np.divide(tp, support, out=zeros.copy(), where=support > 0)
+        f1 = np.divide(2 * precision * recall, precision + recall, out=zeros.copy(),
+                       where=(precision + recall) > 0)
+        total = int(support.sum())
+        weights = support / total if total else zeros
+
+        report = {
+            str(label): {'precision': float(p), 'recall': float(r), 'f1-score': float(f), 'support': int(s)}
+            for label, p, r, f, s in zip(classes, precision, recall, f1, support)
+        }
+        report['accuracy'] = float(tp.sum() / total) if total else 0.0
+        report['macro avg'] = {'precision': float(precision.mean()), 'recall': float(recall.mean()),
+                               'f1-score': float(f1.mean()), 'support': total}
+        report['weighted avg'] = {'precision': float(weights @ precision), 'recall': float(weights @ recall),
+                                  'f1-score': float(weights @ f1), 'support': total}
+        return {
+            'classes': classes,
+            'matrix': cm,
+            'accuracy': report['accuracy'],
+            'precision': precision,
+            'recall': recall,
+            'f1_score': f1,
+            'report': report
+        }
+
 
 class ModelEvaluator:
     def __init__(self):
         self.results = {}
         self.metrics_file = "evaluation_metrics.json"
         self.timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.tuning_results = None
+        self.cv_results = None
     
     def load_model(self, model_path):
-        """Load trained model from file"""
+        """Load trained model from a pickle file or artifact directory"""
         try:
-            model = joblib.load(model_path)
+            model = load_any_model(model_path)
             print(f"Model loaded from {model_path}")
             return model
         except Exception as e:
             print(f"Error loading model: {e}")
             return None
     
-    def load_test_data(self):
+    def load_tuning_results(self, file_path="tuning_results.json"):
+        """Load hyperparameter search results to include in the metrics file"""
+        if not os.path.exists(file_path):
+            return None
+        try:
+            with open(file_path) as f:
+                self.tuning_results = json.load(f)
+            print(f"Tuning results loaded from {file_path}")
+            return self.tuning_results
+        except Exception as e:
+            print(f"Error loading tuning results: {e}")
+            return None
+    
+    def load_cross_validation_results(self, file_path="cv_results.json"):
+        """Load k-fold results from cross_validation.py to include in the metrics file"""
+        if not os.path.exists(file_path):
+            return None
+        try:
+            with open(file_path) as f:
+                self.cv_results = json.load(f)
+            print(f"Cross-validation results loaded from {file_path}")
+            return self.cv_results
+        except Exception as e:
+            print(f"Error loading cross-validation results: {e}")
+            return None
+    
+    def load_test_data(self, X_path="X_test.csv", y_path="y_test.csv"):
         """Load test data from CSV files"""
         try:
-            X_test = pd.read_csv("X_test.csv")
-            y_test = pd.read_csv("y_test.csv").squeeze()  # Convert to Series
+            X_test = pd.read_csv(X_path)
+            y_test = pd.read_csv(y_path).squeeze()  # Convert to Series
             feature_names = X_test.columns.tolist()
             
             print(f"Test data loaded: {X_test.shape}")
@@ -87,7 +254,129 @@ class ModelEvaluator:
         
         return accuracy, report, cm
     
-    def save_metrics_to_json(self):
+    def streaming_evaluation(self, models, X_path="X_test.csv", y_path="y_test.csv", chunk_size=100000):
+        """
+        Evaluate several models in one pass over test CSVs of any size.
+        Every chunk is predicted by each model and only a confusion matrix
+        per model is kept, so memory is bounded by the chunk size.
+        """
+        matrices = {model_name: StreamingConfusionMatrix() for model_name in models}
+        n_rows = 0
+        for X_chunk, y_chunk in iter_test_chunks(X_path, y_path, chunk_size):
+            y_true = y_chunk.to_numpy()
+            for model_name, model in models.items():
+                matrices[model_name].update(y_true, np.asarray(model.predict(X_chunk)).ravel())
+            n_rows += len(X_chunk)
+            print(f"  {n_rows:,} rows evaluated")
+
+        accuracies = {}
+        for model_name, matrix in matrices.items():
+            summary = matrix.summary()
+            weighted = summary['report']['weighted avg']
+            classes = [_label(c) for c in summary['classes']]
+            self.results[model_name] = {
+                'model_info': {
+                    'name': model_name,
+                    'evaluation_timestamp': self.timestamp,
+                    'test_set_size': n_rows,
+                    'evaluation_mode': 'streaming',
+                    'chunk_size': chunk_size
+                },
+                'overall_metrics': {
+                    'accuracy': summary['accuracy'],
+                    'precision': weighted['precision'],
+                    'recall': weighted['recall'],
+                    'f1_score': weighted['f1-score']
+                },
+                'per_class_metrics': {
+                    'classes': classes,
+                    'precision': [float(x) for x in summary['precision']],
+                    'recall': [float(x) for x in summary['recall']],
+                    'f1_score': [float(x) for x in summary['f1_score']]
+                },
+                'detailed_report': summary['report'],
+                'confusion_matrix': {
+                    'matrix': summary['matrix'].tolist(),
+                    'classes': classes
+                }
+            }
+            accuracies[model_name] = summary['accuracy']
+        return accuracies
+    
+    def benchmark_inference(self, model, X_test, n_single=200, batch_sizes=BENCHMARK_BATCH_SIZES, repeats=5):
+        """
+        Measure single-row latency percentiles and batched throughput.
+        Batches larger than the test set are built by repeating its rows.
+        """
+        # Warm up caches and lazy initialisation before timing
+        model.predict(X_test.iloc[:1])
+
+        latencies = []
+        for i in range(n_single):
+            row = X_test.iloc[[i % len(X_test)]]
+            start = time.perf_counter()
+            model.predict(row)
+            latencies.append(time.perf_counter() - start)
+        latencies_ms = np.array(latencies) * 1000
+
+        throughput = {}
+        for batch_size in batch_sizes:
+            reps = int(np.ceil(batch_size / len(X_test)))
+            batch = pd.concat([X_test] * reps, ignore_index=True).iloc[:batch_size]
+            start = time.perf_counter()
+            for _ in range(repeats):
+                model.predict(batch)
+            elapsed = time.perf_counter() - start
+            throughput[str(batch_size)] = float(batch_size * repeats / elapsed)
+
+        return {
+            'latency_p50_ms': float(np.percentile(latencies_ms, 50)),
+            'latency_p99_ms': float(np.percentile(latencies_ms, 99)),
+            'latency_mean_ms': float(latencies_ms.mean()),
+            'throughput_rows_per_sec': throughput
+        }
+    
+    def benchmark_model(self, model, model_path, X_test, model_name, loader=load_any_model):
+        """Record runtime cost of a model alongside its accuracy metrics"""
+        print(f"Benchmarking {model_name}...")
+        runtime = self.benchmark_inference(model, X_test)
+
+        load_seconds, rss_after, rss_delta = measure_load_footprint(model_path, loader)
+        runtime['load_time_ms'] = load_seconds * 1000
+        runtime['serialized_size_bytes'] = artifact_size_bytes(model_path)
+        runtime['rss_after_load_bytes'] = rss_after
+        runtime['rss_load_delta_bytes'] = rss_delta
+
+        self.results.setdefault(model_name, {})['runtime_metrics'] = runtime
+        print(f"  p50 {runtime['latency_p50_ms']:.2f}ms, p99 {runtime['latency_p99_ms']:.2f}ms, "
+              f"load {runtime['load_time_ms']:.1f}ms, size {runtime['serialized_size_bytes'] / 1024:.0f}KB")
+        return runtime
+    
+    def select_best_model(self, max_p99_latency_ms=None, metric='accuracy'):
+        """
+        Pick the most accurate model, optionally only among those whose
+        single-row p99 latency is within the given limit
+        """
+        candidates = []
+        for model_name, result in self.results.items():
+            if 'overall_metrics' not in result:
+                continue
+            runtime = result.get('runtime_metrics', {})
+            if max_p99_latency_ms is not None:
+                if runtime.get('latency_p99_ms', float('inf')) > max_p99_latency_ms:
+                    continue
+            candidates.append((
+                result['overall_metrics'][metric],
+                -runtime.get('latency_p99_ms', 0.0),
+                model_name
+            ))
+
+        if not candidates:
+            print(f"No model meets the latency limit of {max_p99_latency_ms}ms")
+            return None
+        return max(candidates)[2]
+    
+    def save_metrics_to_json(self, max_p99_latency_ms=None):
         """Save all evaluation metrics to JSON file"""
         try:
             # Prepare comprehensive JSON structure
@@ -95,11 +384,18 @@ class ModelEvaluator:
                 'evaluation_metadata': {
                     'timestamp': self.timestamp,
                     'total_models_evaluated': len(self.results),
-                    'models': list(self.results.keys())
+                    'models': list(self.results.keys()),
+                    'best_model': self.select_best_model(),
+                    'latency_constraint_p99_ms': max_p99_latency_ms,
+                    'best_model_within_latency': self.select_best_model(max_p99_latency_ms)
                 },
                 'model_comparison': self._create_comparison_data(),
                 'detailed_results': self.results
             }
+            if self.tuning_results is not None:
+                json_output['hyperparameter_tuning'] = self.tuning_results
+            if self.cv_results is not None:
+                json_output['cross_validation'] = self.cv_results
             
             # Save to JSON file
             with open(self.metrics_file, 'w') as f:
@@ -121,6 +417,19 @@ class ModelEvaluator:
                 'f1_score': result['overall_metrics']['f1_score'],
                 'rank': None
             }
+            # Attach the k-fold estimate, which is far less noisy than one test split
+            cv_model = (self.cv_results or {}).get('models', {}).get(model_name)
+            if cv_model is not None:
+                cv_accuracy = cv_model['metrics']['accuracy']
+                comparison[model_name]['cv_accuracy_mean'] = cv_accuracy['mean']
+                comparison[model_name]['cv_accuracy_ci'] = [cv_accuracy['ci_low'], cv_accuracy['ci_high']]
+                comparison[model_name]['cv_rank'] = cv_model['rank']
+            runtime = result.get('runtime_metrics')
+            if runtime is not None:
+                comparison[model_name]['latency_p50_ms'] = runtime['latency_p50_ms']
+                comparison[model_name]['latency_p99_ms'] = runtime['latency_p99_ms']
+                comparison[model_name]['load_time_ms'] = runtime['load_time_ms']
+                comparison[model_name]['serialized_size_bytes'] = runtime['serialized_size_bytes']
         
         # Add ranking based on accuracy
         ranked_models = sorted(comparison.items(), 
@@ -130,6 +439,12 @@ class ModelEvaluator:
         for rank, (model_name, _) in enumerate(ranked_models, 1):
             comparison[model_name]['rank'] = rank
         
+        # Add ranking based on single-row p99 latency
+        timed_models = sorted((item for item in comparison.items() if 'latency_p99_ms' in item[1]),
+                              key=lambda x: x[1]['latency_p99_ms'])
+        for rank, (model_name, _) in enumerate(timed_models, 1):
+            comparison[model_name]['latency_rank'] = rank
+        
         return comparison
     
     def print_model_comparison(self):
@@ -141,13 +456,17 @@ class ModelEvaluator:
         print("\n=== Model Comparison ===")
         comparison_data = []
         for model_name, result in self.results.items():
-            comparison_data.append({
+            row = {
                 'Model': model_name,
                 'Accuracy': f"{result['overall_metrics']['accuracy']:.3f}",
                 'Precision': f"{result['overall_metrics']['precision']:.3f}",
                 'Recall': f"{result['overall_metrics']['recall']:.3f}",
                 'F1-Score': f"{result['overall_metrics']['f1_score']:.3f}"
-            })
+            }
+            if 'runtime_metrics' in result:
+                row['p99 (ms)'] = f"{result['runtime_metrics']['latency_p99_ms']:.2f}"
+                row['Load (ms)'] = f"{result['runtime_metrics']['load_time_ms']:.1f}"
+            comparison_data.append(row)
         
         comparison_df = pd.DataFrame(comparison_data)
         comparison_df = comparison_df.sort_values('Accuracy', ascending=False)
@@ -155,21 +474,30 @@ class ModelEvaluator:
         
         return comparison_df
 
-def main():
+def main(max_p99_latency_ms=None, chunk_size=None, X_path="X_test.csv", y_path="y_test.csv"):
     """
-    Main function to run model evaluation pipeline
+    Main function to run model evaluation pipeline. With chunk_size the
+    test set is streamed and all models are evaluated in one pass, so test
+    sets larger than memory can be used.
     """
     print("=== Model Evaluation Pipeline ===\n")
     
     # Initialize evaluator
     evaluator = ModelEvaluator()
     
-    # Load test data from CSV files
-    X_test, y_test, feature_names = evaluator.load_test_data()
-    
-    if X_test is None or y_test is None:
-        print("Error: Could not load test data. Please run data_transformation.py and model_training.py first.")
-        return None, None
+    # Load test data from CSV files (only a benchmark sample when streaming)
+    if chunk_size:
+        if not (os.path.exists(X_path) and os.path.exists(y_path)):
+            print("Error: Could not find test data. Please run data_transformation.py and model_training.py first.")
+            return None, None
+        X_test = next(iter_test_chunks(X_path, y_path, min(chunk_size, 10000)))[0]
+        y_test = None
+    else:
+        X_test, y_test, feature_names = evaluator.load_test_data(X_path, y_path)
+        
+        if X_test is None or y_test is None:
+            print("Error: Could not load test data. Please run data_transformation.py and model_training.py first.")
+            return None, None
     
     # Load trained models
     models_to_evaluate = {
@@ -178,26 +506,55 @@ def main():
         'catboost': 'catboost_model.pkl'
     }
     
-    # Evaluate each model
-    for model_name, model_path in models_to_evaluate.items():
-        print(f"Evaluating {model_name}...")
-        model = evaluator.load_model(model_path)
-        
-        if model is not None:
-            accuracy, report, cm = evaluator.comprehensive_evaluation(
-                model, X_test, y_test, model_name
-            )
-            print(f"  Accuracy: {accuracy:.3f}")
+    if chunk_size:
+        models = {}
+        for model_name, model_path in models_to_evaluate.items():
+            model = evaluator.load_model(model_path)
+            if model is not None:
+                models[model_name] = model
+        print(f"Streaming {X_path} in chunks of {chunk_size:,} rows through {len(models)} models...")
+        accuracies = evaluator.streaming_evaluation(models, X_path, y_path, chunk_size)
+        for model_name, model in models.items():
+            print(f"{model_name}  Accuracy: {accuracies[model_name]:.3f}")
+            evaluator.benchmark_model(model, models_to_evaluate[model_name], X_test, model_name)
+    else:
+        # Evaluate each model
+        for model_name, model_path in models_to_evaluate.items():
+            print(f"Evaluating {model_name}...")
+            model = evaluator.load_model(model_path)
+            
+            if model is not None:
+                accuracy, report, cm = evaluator.comprehensive_evaluation(
+                    model, X_test, y_test, model_name
+                )
+                print(f"  Accuracy: {accuracy:.3f}")
+                evaluator.benchmark_model(model, model_path, X_test, model_name)
+    
+    # Include hyperparameter search and cross-validation results if available
+    evaluator.load_tuning_results()
+    evaluator.load_cross_validation_results()
     
     # Save metrics to JSON file
-    evaluator.save_metrics_to_json()
+    evaluator.save_metrics_to_json(max_p99_latency_ms)
     
     # Print model comparison
     comparison_df = evaluator.print_model_comparison()
     
+    if max_p99_latency_ms is not None:
+        print(f"\nBest model within {max_p99_latency_ms}ms p99: "
+              f"{evaluator.select_best_model(max_p99_latency_ms)}")
+    
     print(f"\nEvaluation completed. Results saved to {evaluator.metrics_file}")
     
     return evaluator, comparison_df
 
 if __name__ == "__main__":
-    evaluator, comparison_df = main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Evaluate the trained models on the test set")
+    parser.add_argument("max_p99_latency_ms", nargs="?", type=float, default=None,
+                        help="Only consider models within this single-row p99 latency as best")
+    parser.add_argument("--chunk-size", type=int, default=None,
+                        help="Stream the test CSVs in chunks of this many rows")
+    parser.add_argument("--X", dest="X_path", default="X_test.csv")
+    parser.add_argument("--y", dest="y_path", default="y_test.csv")
+    args = parser.parse_args()
+    evaluator, comparison_df = main(args.max_p99_latency_ms, args.chunk_size, args.X_path, args.y_path)
@@ -1,17 +1,101 @@
+import os
+import sys
+import json
+import time
+import tempfile
 import pandas as pd
 import numpy as np
 import joblib
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from sklearn.tree import DecisionTreeClassifier
 from sklearn.ensemble import RandomForestClassifier
 from catboost import CatBoostClassifier
-from xgboost import XGBClassifier
+from label_encoding import LabelEncodedXGBClassifier
 from sklearn.metrics import accuracy_score, classification_report
 
+# Trainer method and threading parameter for each model family
+TRAINER_METHODS = {
+    'decision_tree': 'train_decision_tree',
+    'random_forest': 'train_random_forest',
+    'catboost': 'train_catboost',
+    'xgboost': 'train_xgboost'
+}
+
+THREAD_PARAMS = {
+    'decision_tree': None,  # single-threaded
+    'random_forest': 'n_jobs',
+    'catboost': 'thread_count',
+    'xgboost': 'nthread'
+}
+
+# Families trained by main()
+DEFAULT_MODELS = ['decision_tree', 'random_forest', 'catboost', 'xgboost']
+
+TUNING_RESULTS_FILE = "tuning_results.json"
+
+
+def load_tuned_params(file_path=TUNING_RESULTS_FILE):
+    """
+    Load the best parameters found by hyperparameter_tuning.py, keyed by
+    model family. Returns an empty dict when no search has been run.
+    """
+    if not os.path.exists(file_path):
+        return {}
+    try:
+        with open(file_path) as f:
+            results = json.load(f)
+        return {name: best['params'] for name, best in results.get('best_per_family', {}).items()}
+    except Exception as e:
+        print(f"Error loading tuned parameters: {e}")
+        return {}
+
+
+def share_training_data(X, y, file_path):
+    """
+    Dump the training matrix once so worker processes can memory-map it
+    instead of receiving a pickled copy each
+    """
+    X_values = np.ascontiguousarray(X.to_numpy(dtype=np.float64))
+    columns = list(X.columns)
+    joblib.dump((X_values, np.asarray(y), columns), file_path)
+    return file_path
+
+
+def load_shared_data(file_path):
+    """Memory-map a matrix written by share_training_data"""
+    X_values, y_values, columns = joblib.load(file_path, mmap_mode='r')
+    X = pd.DataFrame(X_values, columns=columns, copy=False)
+    y = pd.Series(y_values, name='Health')
+    return X, y
+
+
+def allocate_core_budget(model_names, n_cores=None):
+    """
+    Split the available cores between models trained at the same time.
+    Single-threaded models get one core, the rest share what is left.
+    """
+    n_cores = n_cores or os.cpu_count() or 1
+    threaded = [name for name in model_names if THREAD_PARAMS.get(name)]
+    reserved = len(model_names) - len(threaded)
+    per_model = max(1, (n_cores - reserved) // max(1, len(threaded)))
+    return {name: (per_model if THREAD_PARAMS.get(name) else 1) for name in model_names}
+
+
+def _fit_in_worker(model_name, data_path, random_state, params):
+    """Train one model family inside a pool worker"""
+    X_train, y_train = load_shared_data(data_path)
+    trainer = ModelTrainer(random_state=random_state)
+    start = time.perf_counter()
+    model = getattr(trainer, TRAINER_METHODS[model_name])(X_train, y_train, **params)
+    return model_name, model, time.perf_counter() - start
+
+
 class ModelTrainer:
     def __init__(self, random_state=42):
         self.random_state = random_state
         self.models = {}
         self.predictions = {}
+        self.training_times = {}
     
     def train_decision_tree(self, X_train, y_train, **kwargs):
         """Train Decision Tree classifier"""
@@ -39,8 +123,8 @@ class ModelTrainer:
         self.models['random_forest'] = rf_model
         return rf_model
     
-    def train_catboost(self, X_train, y_train, **kwargs):
-        """Train CatBoost classifier"""
+    def train_catboost(self, X_train, y_train, eval_set=None, **kwargs):
+        """Train CatBoost classifier (eval_set enables early stopping)"""
         print("Training CatBoost...")
         cb_params = {
             'iterations': 300,
@@ -51,12 +135,12 @@ class ModelTrainer:
             **kwargs
         }
         cat_model = CatBoostClassifier(**cb_params)
-        cat_model.fit(X_train, y_train)
+        cat_model.fit(X_train, y_train, eval_set=eval_set)
         self.models['catboost'] = cat_model
         return cat_model
     
-    def train_xgboost(self, X_train, y_train, **kwargs):
-        """Train XGBoost classifier"""
+    def train_xgboost(self, X_train, y_train, eval_set=None, **kwargs):
+        """Train XGBoost classifier on label-encoded targets (eval_set enables early stopping)"""
         print("Training XGBoost...")
         xgb_params = {
             'n_estimators': 300,
@@ -66,8 +150,135 @@ class ModelTrainer:
             'eval_metric': 'mlogloss',
             **kwargs
         }
-        xgb_model = XGBClassifier(**xgb_params)
-        xgb_model.fit(X_train, y_train)
+        xgb_model = LabelEncodedXGBClassifier(**xgb_params)
+        if eval_set is not None:
+            xgb_model.fit(X_train, y_train, eval_set=[eval_set], verbose=False)
+        else:
+            xgb_model.fit(X_train, y_train)
+        self.models['xgboost'] = xgb_model
+        return xgb_model
+    
+    def train_parallel(self, X_train, y_train, model_names=None, n_cores=None, model_params=None,
+                       measure_serial=False):
+        """
+        Train several model families at once across a process pool.
+        Each model gets an explicit thread budget so the pool does not
+        oversubscribe the machine, and the training matrix is shared
+        through a memory-mapped file rather than copied to every worker.
+
+        The fits run on a reduced thread budget, so their sum overstates
+        the serial time and only bounds the speedup from above. With
+        measure_serial=True the models are also trained one after another
+        with all cores, and the measured speedup is reported.
+        """
+        model_names = model_names or DEFAULT_MODELS
+        model_params = model_params or {}
+        n_cores = n_cores or os.cpu_count() or 1
+        budget = allocate_core_budget(model_names, n_cores)
+        n_workers = min(len(model_names), n_cores)
+
+        print(f"Training {len(model_names)} models in parallel "
+              f"({n_workers} workers, {n_cores} cores)...")
+        for name in model_names:
+            print(f"  {name}: {budget[name]} thread(s)")
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            data_path = share_training_data(X_train, y_train, os.path.join(tmp_dir, "train.joblib"))
+
+            wall_start = time.perf_counter()
+            with ProcessPoolExecutor(max_workers=n_workers) as executor:
+                futures = []
+                for name in model_names:
+                    params = dict(model_params.get(name, {}))
+                    thread_param = THREAD_PARAMS.get(name)
+                    if thread_param:
+                        params.setdefault(thread_param, budget[name])
+                    futures.append(executor.submit(
+                        _fit_in_worker, name, data_path, self.random_state, params
+                    ))
+
+                for future in as_completed(futures):
+                    name, model, elapsed = future.result()
+                    self.models[name] = model
+                    self.training_times[name] = elapsed
+                    print(f"✓ {name} trained in {elapsed:.2f}s")
+            wall_time = time.perf_counter() - wall_start
+
+        per_model = {name: self.training_times[name] for name in model_names}
+        fit_sum = sum(per_model.values())
+        print(f"\nParallel wall-clock time: {wall_time:.2f}s")
+        print(f"Sum of parallel fits (reduced thread budgets): {fit_sum:.2f}s "
+              f"-> speedup at most {fit_sum / wall_time:.2f}x")
+
+        serial_time = None
+        if measure_serial:
+            serial_time = self._time_serial(X_train, y_train, model_names, n_cores, model_params)
+            print(f"Measured serial time ({n_cores} threads per model): {serial_time:.2f}s")
+            print(f"Speedup: {serial_time / wall_time:.2f}x")
+
+        return {
+            'wall_clock_seconds': wall_time,
+            'fit_seconds_sum': fit_sum,
+            'speedup_upper_bound': fit_sum / wall_time,
+            'serial_seconds': serial_time,
+            'speedup': serial_time / wall_time if serial_time is not None else None,
+            'per_model_seconds': per_model,
+            'core_budget': budget
+        }
+
+    def _time_serial(self, X_train, y_train, model_names, n_cores, model_params):
+        """Wall-clock time to train the models one after another with every core"""
+        trainer = ModelTrainer(random_state=self.random_state)
+        start = time.perf_counter()
+        for name in model_names:
+            params = dict(model_params.get(name, {}))
+            if THREAD_PARAMS.get(name):
+                params.setdefault(THREAD_PARAMS[name], n_cores)
+            getattr(trainer, TRAINER_METHODS[name])(X_train, y_train, **params)
+        return time.perf_counter() - start
+
+    def update_decision_tree(self, X_train, y_train, **kwargs):
+        """Refit the decision tree (cheap) on new rows plus a replay sample"""
+        return self.train_decision_tree(X_train, y_train, **kwargs)
+    
+    def update_random_forest(self, X_train, y_train, n_new_estimators=20, max_estimators=200):
+        """
+        Grow the existing forest with trees fitted on the new data, dropping
+        the oldest trees beyond max_estimators so size and latency stay flat
+        """
+        print(f"Adding {n_new_estimators} trees to Random Forest...")
+        rf_model = self.models['random_forest']
+        rf_model.set_params(warm_start=True, n_estimators=len(rf_model.estimators_) + n_new_estimators)
+        rf_model.fit(X_train, y_train)
+        if len(rf_model.estimators_) > max_estimators:
+            # Trees are appended in fit order, so the oldest come first
+            rf_model.estimators_ = rf_model.estimators_[-max_estimators:]
+            rf_model.set_params(n_estimators=max_estimators)
+            print(f"✓ Kept the newest {max_estimators} trees")
+        return rf_model
+    
+    def update_catboost(self, X_train, y_train, iterations=50):
+        """Continue boosting from the existing CatBoost model"""
+        print(f"Warm-starting CatBoost with {iterations} iterations...")
+        base_model = self.models['catboost']
+        cb_params = {
+            **base_model.get_params(),
+            'iterations': iterations,
+            'class_names': list(base_model.classes_)
+        }
+        cat_model = CatBoostClassifier(**cb_params)
+        cat_model.fit(X_train, y_train, init_model=base_model)
+        self.models['catboost'] = cat_model
+        return cat_model
+    
+    def update_xgboost(self, X_train, y_train, n_estimators=50):
+        """Continue boosting from the existing XGBoost booster"""
+        print(f"Warm-starting XGBoost with {n_estimators} rounds...")
+        base_model = self.models['xgboost']
+        xgb_params = {**base_model.get_params(), 'n_estimators': n_estimators}
+        xgb_model = LabelEncodedXGBClassifier(**xgb_params)
+        xgb_model.label_encoder_ = base_model.label_encoder_
+        xgb_model.fit(X_train, y_train, xgb_model=base_model.get_booster())
         self.models['xgboost'] = xgb_model
         return xgb_model
     
@@ -129,9 +340,11 @@ def create_validation_samples():
     
     return validation_df
 
-def main():
+def main(parallel=False, compress=False, measure_serial=False, models_dir=""):
     """
-    Main function to run model training pipeline
+    Main function to run model training pipeline. The models and the drift
+    reference profile are written to models_dir (default: the working
+    directory); the API reads both from the directory of MODEL_PATH.
     """
     print("=== Model Training Pipeline ===\n")
     
@@ -144,10 +357,20 @@ def main():
     # Initialize model trainer
     trainer = ModelTrainer()
     
+    # Use tuned hyperparameters when a search has been run
+    tuned_params = load_tuned_params()
+    if tuned_params:
+        print(f"Using tuned parameters for: {list(tuned_params.keys())}")
+    
     # Train models
-    dt_model = trainer.train_decision_tree(X_train, y_train)
-    rf_model = trainer.train_random_forest(X_train, y_train)
-    cb_model = trainer.train_catboost(X_train, y_train)
+    if parallel:
+        trainer.train_parallel(X_train, y_train, model_params=tuned_params, measure_serial=measure_serial)
+        dt_model = trainer.models['decision_tree']
+    else:
+        dt_model = trainer.train_decision_tree(X_train, y_train, **tuned_params.get('decision_tree', {}))
+        rf_model = trainer.train_random_forest(X_train, y_train, **tuned_params.get('random_forest', {}))
+        cb_model = trainer.train_catboost(X_train, y_train, **tuned_params.get('catboost', {}))
+        xgb_model = trainer.train_xgboost(X_train, y_train, **tuned_params.get('xgboost', {}))
     
     # Generate predictions
     predictions = trainer.predict_all(X_test)
@@ -159,7 +382,17 @@ def main():
         results[name] = accuracy
     
     # Save models
-    trainer.save_all_models()
+    trainer.save_all_models(os.path.join(models_dir, "") if models_dir else "")
+    
+    # Reference distribution for drift monitoring of the served model
+    from drift_monitoring import build_reference_profile, REFERENCE_PROFILE_FILE
+    build_reference_profile(X_train, dt_model.predict(X_train),
+                            file_path=os.path.join(models_dir, REFERENCE_PROFILE_FILE))
+    
+    # Optionally replace the large ensembles with a smaller equivalent
+    if compress:
+        from model_compression import run_compression
+        run_compression(trainer.models, X_train, y_train, X_test, y_test)
     
     # Create validation samples
     validation_df = create_validation_samples()
@@ -173,4 +406,6 @@ def main():
     return trainer, results
 
 if __name__ == "__main__":
-    trainer, results = main()
\ No newline at end of file
+    models_dir = next((arg.split("=", 1)[1] for arg in sys.argv if arg.startswith("--models-dir=")), "")
+    trainer, results = main(parallel="--parallel" in sys.argv, compress="--compress" in sys.argv,
+                            measure_serial="--measure-serial" in sys.argv, models_dir=models_dir)
\ No newline at end of file
@@ -0,0 +1,360 @@
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import matplotlib
+matplotlib.use("Agg")  # stages run headless; never open plot windows
+import pandas as pd
+from collections import namedtuple
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_RAW_DATA = os.path.join(SRC_DIR, "..", "Data", "enhanced_health_data.csv")
+DEFAULT_CACHE_DIR = os.path.join(SRC_DIR, "..", ".pipeline_cache")
+
+# An input or output of a stage. kind is 'csv', 'json' or 'directory'.
+Artifact = namedtuple('Artifact', ['name', 'kind'])
+
+ARTIFACT_SUFFIXES = {'csv': '.csv', 'json': '.json', 'directory': ''}
+
+
+# ================== Stage functions ==================
+# Each stage reads its inputs from paths and writes its outputs to the paths
+# it is given, so no stage depends on the working directory.
+
+def run_ingestion(inputs, params, outputs):
+    from data_ingestion import load_and_explore_data, check_data_quality
+    df = load_and_explore_data(inputs['raw_data'])
+    report = check_data_quality(df)
+    serializable = {
+        'missing_values': {k: int(v) for k, v in report['missing_values'].items()},
+        'duplicate_rows': int(report['duplicate_rows']),
+        'data_types': {k: str(v) for k, v in report['data_types'].items()},
+        'unique_values': {k: int(v) for k, v in report['unique_values'].items()},
+        'rows': len(df)
+    }
+    with open(outputs['quality_report'], 'w') as f:
+        json.dump(serializable, f, indent=2)
+
+
+def run_cleaning(inputs, params, outputs):
+    from data_ingestion import load_and_explore_data
+    from data_cleaning import DataCleaner, CleaningStatistics
+    df = load_and_explore_data(inputs['raw_data'])
+    cleaner = DataCleaner(df, show_plots=False)
+    cleaner.remove_unnecessary_columns()
+    cleaner.standardize_categorical_data()
+    # Statistics for incremental retraining and batch scoring, fitted on
+    # normalized categories (as those consumers apply them) before imputation
+    CleaningStatistics().update(cleaner.get_cleaned_data()).save(outputs['cleaning_stats'])
+    cleaner.handle_missing_values()
+    cleaner.detect_and_handle_outliers()
+    cleaner.validate_data_cleaning().to_csv(outputs['cleaned_data'], index=False)
+
+
+def run_transformation(inputs, params, outputs):
+    from data_transformation import load_and_preprocess_data, prepare_features_target, split_data
+    df = load_and_preprocess_data(inputs['cleaned_data'])
+    X, y = prepare_features_target(df, save_processed_data=False)
+    X_train, X_test, y_train, y_test = split_data(
+        X, y, test_size=params['test_size'], random_state=params['random_state'], save_splits=False
+    )
+    X_train.to_csv(outputs['X_train'], index=False)
+    X_test.to_csv(outputs['X_test'], index=False)
+    y_train.to_csv(outputs['y_train'], index=False)
+    y_test.to_csv(outputs['y_test'], index=False)
+
+
+def run_training(inputs, params, outputs):
+    from model_training import ModelTrainer
+    X_train = pd.read_csv(inputs['X_train'])
+    y_train = pd.read_csv(inputs['y_train']).squeeze()
+    trainer = ModelTrainer(random_state=params['random_state'])
+    if params['parallel']:
+        trainer.train_parallel(X_train, y_train, model_names=params['model_names'])
+    else:
+        for name in params['model_names']:
+            getattr(trainer, f"train_{name}")(X_train, y_train)
+    os.makedirs(outputs['models'], exist_ok=True)
+    trainer.save_all_models(outputs['models'] + os.sep)
+    # The API reads the drift reference from the directory of its model
+    if 'decision_tree' in trainer.models:
+        from drift_monitoring import build_reference_profile, REFERENCE_PROFILE_FILE
+        build_reference_profile(X_train, trainer.models['decision_tree'].predict(X_train),
+                                file_path=os.path.join(outputs['models'], REFERENCE_PROFILE_FILE))
+
+
+def run_evaluation(inputs, params, outputs):
+    from model_evaluation import ModelEvaluator
+    evaluator = ModelEvaluator()
+    evaluator.metrics_file = outputs['metrics']
+    X_test, y_test, _ = evaluator.load_test_data(inputs['X_test'], inputs['y_test'])
+    for file_name in sorted(os.listdir(inputs['models'])):
+        if not file_name.endswith("_model.pkl"):
+            continue
+        model_name = file_name[:-len("_model.pkl")]
+        model_path = os.path.join(inputs['models'], file_name)
+        model = evaluator.load_model(model_path)
+        if model is not None:
+            evaluator.comprehensive_evaluation(model, X_test, y_test, model_name)
+            if params['benchmark']:
+                evaluator.benchmark_model(model, model_path, X_test, model_name)
+    evaluator.save_metrics_to_json()
+
+
+class Stage:
+    """
+    A pipeline step with typed inputs and outputs. code_files are the
+    modules whose source is part of the stage's cache key.
+    """
+
+    def __init__(self, name, func, inputs, outputs, code_files, params=None):
+        self.name = name
+        self.func = func
+        self.inputs = inputs
+        self.outputs = outputs
+        self.code_files = code_files
+        self.params = params or {}
+
+
+def default_stages(model_names=('decision_tree', 'random_forest', 'catboost', 'xgboost'), parallel_training=False,
+                   benchmark=True, random_state=42):
+    """The five Src_Code stages, ingestion through evaluation"""
+    raw = Artifact('raw_data', 'csv')
+    return [
+        Stage('ingestion', run_ingestion, [raw], [Artifact('quality_report', 'json')],
+              ['data_ingestion.py']),
+        Stage('cleaning', run_cleaning, [raw],
+              [Artifact('cleaned_data', 'csv'), Artifact('cleaning_stats', 'json')],
+              ['data_ingestion.py', 'data_cleaning.py']),
+        Stage('transformation', run_transformation, [Artifact('cleaned_data', 'csv')],
+              [Artifact('X_train', 'csv'), Artifact('X_test', 'csv'),
+               Artifact('y_train', 'csv'), Artifact('y_test', 'csv')],
+              ['data_transformation.py'],
+              {'test_size': 0.2, 'random_state': random_state}),
+        Stage('training', run_training, [Artifact('X_train', 'csv'), Artifact('y_train', 'csv')],
+              [Artifact('models', 'directory')],
+              ['model_training.py', 'label_encoding.py', 'drift_monitoring.py'],
+              {'model_names': list(model_names), 'parallel': parallel_training, 'random_state': random_state}),
+        Stage('evaluation', run_evaluation,
+              [Artifact('models', 'directory'), Artifact('X_test', 'csv'), Artifact('y_test', 'csv')],
+              [Artifact('metrics', 'json')],
+              ['model_evaluation.py', 'model_artifacts.py'],
+              {'benchmark': benchmark}),
+    ]
+
+
+def _execute_stage(func, input_paths, params, output_paths, work_dir):
+    """Run a stage in a worker with its scratch directory as cwd"""
+    if SRC_DIR not in sys.path:
+        sys.path.insert(0, SRC_DIR)
+    os.chdir(work_dir)
+    start = time.perf_counter()
+    func(input_paths, params, output_paths)
+    return time.perf_counter() - start
+
+
+class PipelineRunner:
+    """
+    Run stages as a DAG. Each stage's outputs are cached under a hash of
+    its input contents, source code and parameters; unchanged stages are
+    skipped and stages whose inputs are ready run in parallel.
+    """
+
+    def __init__(self, stages, sources, cache_dir=DEFAULT_CACHE_DIR, max_workers=None):
+        self.stages = {stage.name: stage for stage in stages}
+        self.sources = {name: os.path.abspath(path) for name, path in sources.items()}
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._file_hashes = {}
+        self.producers = self._validate_graph()
+        self.report = {}
+
+    def _validate_graph(self):
+        """Check every input is produced upstream with the same kind, and there are no cycles"""
+        producers = {}
+        for stage in self.stages.values():
+            for artifact in stage.outputs:
+                if artifact.name in producers or artifact.name in self.sources:
+                    raise ValueError(f"Artifact '{artifact.name}' is produced more than once")
+                producers[artifact.name] = (stage.name, artifact.kind)
+
+        for stage in self.stages.values():
+            for artifact in stage.inputs:
+                if artifact.name in self.sources:
+                    continue
+                if artifact.name not in producers:
+                    raise ValueError(f"Stage '{stage.name}' needs '{artifact.name}', which nothing produces")
+                if producers[artifact.name][1] != artifact.kind:
+                    raise TypeError(f"Stage '{stage.name}' expects '{artifact.name}' as {artifact.kind}, "
+                                    f"but it is produced as {producers[artifact.name][1]}")
+
+        visiting, done = set(), set()
+
+        def visit(name):
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"Cycle detected at stage '{name}'")
+            visiting.add(name)
+            for dep in self.dependencies(name, producers):
+                visit(dep)
+            visiting.discard(name)
+            done.add(name)
+
+        for name in self.stages:
+            visit(name)
+        return producers
+
+    def dependencies(self, stage_name, producers=None):
+        if producers is None:
+            producers = self.producers
+        return {producers[a.name][0] for a in self.stages[stage_name].inputs if a.name in producers}
+
+    def _hash_path(self, path):
+        """Content hash of a file or directory, memoised by size and mtime"""
+        if os.path.isdir(path):
+            digest = hashlib.sha256()
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for file_name in sorted(files):
+                    file_path = os.path.join(root, file_name)
+                    digest.update(os.path.relpath(file_path, path).encode())
+                    digest.update(self._hash_path(file_path).encode())
+            return digest.hexdigest()
+
+        stat = os.stat(path)
+        memo_key = (path, stat.st_size, stat.st_mtime_ns)
+        if memo_key not in self._file_hashes:
+            digest = hashlib.sha256()
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(block)
+            self._file_hashes[memo_key] = digest.hexdigest()
+        return self._file_hashes[memo_key]
+
+    def cache_key(self, stage, input_paths):
+        digest = hashlib.sha256(stage.name.encode())
+        for artifact in stage.inputs:
+            digest.update(f"{artifact.name}:{self._hash_path(input_paths[artifact.name])}".encode())
+        for code_file in stage.code_files:
+            digest.update(f"{code_file}:{self._hash_path(os.path.join(SRC_DIR, code_file))}".encode())
+        digest.update(json.dumps(stage.params, sort_keys=True).encode())
+        return digest.hexdigest()[:20]
+
+    def _output_paths(self, stage, stage_dir):
+        return {
+            artifact.name: os.path.join(stage_dir, artifact.name + ARTIFACT_SUFFIXES[artifact.kind])
+            for artifact in stage.outputs
+        }
+
+    def _check_outputs(self, stage, output_paths):
+        for artifact in stage.outputs:
+            path = output_paths[artifact.name]
+            if artifact.kind == 'directory' and not os.path.isdir(path):
+                raise TypeError(f"Stage '{stage.name}' did not produce directory '{artifact.name}'")
+            if artifact.kind != 'directory' and not os.path.isfile(path):
+                raise TypeError(f"Stage '{stage.name}' did not produce file '{artifact.name}'")
+
+    def run(self):
+        """Run the DAG, returning the path of every artifact"""
+        print("=== Pipeline Runner ===\n")
+        artifact_paths = dict(self.sources)
+        pending = set(self.stages)
+        running = {}
+        pipeline_start = time.perf_counter()
+
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending or running:
+                # Keep scheduling until no more stages are ready; cache hits
+                # complete immediately and can unblock their dependents
+                while True:
+                    completed = set(self.report) - set(running.values())
+                    ready = [name for name in sorted(pending) if self.dependencies(name) <= completed]
+                    if not ready:
+                        break
+                    for name in ready:
+                        pending.discard(name)
+                        stage = self.stages[name]
+                        input_paths = {a.name: artifact_paths[a.name] for a in stage.inputs}
+                        key = self.cache_key(stage, input_paths)
+                        stage_dir = os.path.join(self.cache_dir, name, key)
+                        output_paths = self._output_paths(stage, stage_dir)
+
+                        if os.path.exists(os.path.join(stage_dir, "_complete.json")):
+                            print(f"[{name}] cache hit ({key})")
+                            artifact_paths.update(output_paths)
+                            self.report[name] = {'cache_hit': True, 'seconds': 0.0, 'key': key}
+                            continue
+
+                        print(f"[{name}] running ({key})...")
+                        shutil.rmtree(stage_dir, ignore_errors=True)
+                        os.makedirs(stage_dir)
+                        future = executor.submit(_execute_stage, stage.func, input_paths,
+                                                 stage.params, output_paths, stage_dir)
+                        running[future] = name
+                        self.report[name] = {'cache_hit': False, 'key': key, 'output_paths': output_paths}
+
+                if not running:
+                    break
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    stage = self.stages[name]
+                    entry = self.report[name]
+                    output_paths = entry.pop('output_paths')
+                    entry['seconds'] = future.result()
+                    self._check_outputs(stage, output_paths)
+                    stage_dir = os.path.join(self.cache_dir, name, entry['key'])
+                    with open(os.path.join(stage_dir, "_complete.json"), 'w') as f:
+                        json.dump({'stage': name, 'params': stage.params, 'seconds': entry['seconds'],
+                                   'completed_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S")}, f, indent=2)
+                    artifact_paths.update(output_paths)
+                    print(f"[{name}] done in {entry['seconds']:.2f}s")
+
+        total = time.perf_counter() - pipeline_start
+        self._save_report(total, artifact_paths)
+        return artifact_paths
+
+    def _save_report(self, total_seconds, artifact_paths):
+        print("\n=== Pipeline Report ===")
+        for name in self.stages:
+            entry = self.report[name]
+            status = "cached" if entry['cache_hit'] else f"{entry['seconds']:.2f}s"
+            print(f"  {name:<15} {status}")
+        hits = sum(entry['cache_hit'] for entry in self.report.values())
+        print(f"Total: {total_seconds:.2f}s, {hits}/{len(self.stages)} stages from cache")
+
+        report = {
+            'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'total_seconds': total_seconds,
+            'cache_hits': hits,
+            'stages': self.report,
+            'artifacts': artifact_paths
+        }
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(os.path.join(self.cache_dir, "pipeline_report.json"), 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+def main(raw_data=DEFAULT_RAW_DATA, parallel_training=False, stats_path="cleaning_stats.json"):
+    """
+    Main function to run the cached pipeline end to end. The cleaning
+    statistics are copied to stats_path, where incremental_training and
+    batch_scoring read them by default.
+    """
+    runner = PipelineRunner(default_stages(parallel_training=parallel_training),
+                            sources={'raw_data': raw_data})
+    artifacts = runner.run()
+    shutil.copyfile(artifacts['cleaning_stats'], stats_path)
+    print(f"Cleaning statistics published to {stats_path}")
+    return artifacts
+
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    artifacts = main(args[0] if args else DEFAULT_RAW_DATA, parallel_training="--parallel" in sys.argv)
@@ -1,6 +1,7 @@
 # src_codes/rag_integration.py
 
 import os
+from contextlib import nullcontext
 from dotenv import load_dotenv
 # from langchain.document_loaders import WebBaseLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
@@ -12,19 +13,36 @@ from langchain_groq import ChatGroq
 from langchain.chains import RetrievalQA
 import re
 
+try:
+    from Src_Code.structured_logging import get_logger
+    from Src_Code.embedding_service import SocketEmbeddings
+except ImportError:
+    from structured_logging import get_logger
+    from embedding_service import SocketEmbeddings
+
 load_dotenv()
+log = get_logger(__name__)
 
 # ================== Initialize RAG once ==================
+def make_embeddings():
+    """Shared embedding service if EMBEDDING_SOCKET is set, else an in-process model"""
+    socket_path = os.getenv("EMBEDDING_SOCKET")
+    if socket_path:
+        log.info("Using shared embedding service", socket=socket_path)
+        return SocketEmbeddings(socket_path)
+    return HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+
+
 def init_rag():
     """Build or load vector DB from WHO/CDC health pages"""
     persist_dir = "rag_db"
     if os.path.exists(persist_dir):
-        print("✅ Loading existing Chroma DB...")
-        embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+        log.info("Loading existing Chroma DB", persist_dir=persist_dir)
+        embeddings = make_embeddings()
         vectordb = Chroma(persist_directory=persist_dir, embedding_function=embeddings)
         return vectordb.as_retriever(search_kwargs={"k": 5})
 
-    print("🌐 Building RAG knowledge base...")
+    log.info("Building RAG knowledge base")
     web_pages = [
         "https://www.who.int/news-room/fact-sheets/detail/hypertension",
         "https://www.who.int/news-room/fact-sheets/detail/diabetes",
@@ -47,10 +65,10 @@ def init_rag():
     text_splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
     chunks = text_splitter.split_documents(web_docs)
 
-    embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+    embeddings = make_embeddings()
     vectordb = Chroma.from_documents(chunks, embedding=embeddings, persist_directory=persist_dir)
     vectordb.persist()
-    print("✅ Vector DB created successfully")
+    log.info("Vector DB created", chunks=len(chunks))
 
     return vectordb.as_retriever(search_kwargs={"k": 5})
 
@@ -60,7 +78,10 @@ retriever = init_rag()
 groq = ChatGroq(
     groq_api_key=os.getenv("GROQ_API_KEY"),
     model="llama-3.1-8b-instant",
-    temperature=0.3
+    temperature=0.3,
+    # Fail within a bounded time so callers can fall back instead of waiting
+    request_timeout=float(os.getenv("GROQ_TIMEOUT", "30")),
+    max_retries=int(os.getenv("GROQ_MAX_RETRIES", "1"))
 )
 
 qa_chain = RetrievalQA.from_chain_type(
@@ -71,11 +92,86 @@ qa_chain = RetrievalQA.from_chain_type(
 )
 
 
+def reopen_vector_store():
+    """
+    Open the Chroma index again in this process. Chroma's client runs
+    background threads that do not survive fork, so a gunicorn worker that
+    queries the client created in the master hangs; each worker calls this
+    from post_fork. The embedding model is kept, so it stays shared
+    copy-on-write.
+    """
+    global retriever
+    from chromadb.api.client import SharedSystemClient
+    SharedSystemClient.clear_system_cache()  # drop the master's client
+    vectordb = retriever.vectorstore
+    reopened = Chroma(persist_directory=vectordb._persist_directory,
+                      embedding_function=vectordb.embeddings)
+    retriever = reopened.as_retriever(search_kwargs=retriever.search_kwargs)
+    qa_chain.retriever = retriever
+
+
+RAG_FAILED_EXPLANATION = "RAG analysis failed."
+
+
+def _no_timer(stage, dependency=None):
+    return nullcontext()
+
+
+def _parse_answer(answer, risk_level):
+    """Split the LLM answer into explanation, diagnosis and next steps"""
+    # --- Pattern-based extraction ---
+    sections = {
+        "explanation": "",
+        "diagnosis": "",
+        "nextSteps": "",
+    }
+
+    patterns = {
+        "explanation": r"Explanation of Your Results.*?(?=\n\s*\*\*?What|2\. What|What This Could|$)",
+        "diagnosis": r"What This Could Mean.*?(?=\n\s*\*\*?Your Suggested|3\. Your|Your Suggested|$)",
+        "nextSteps": r"Your Suggested Next Steps.*?(?=\n\s*\*\*?Additional|4\. Additional|Additional Concerns|$)",
+    }
+
+    for key, pattern in patterns.items():
+        match = re.search(pattern, answer, re.DOTALL | re.IGNORECASE)
+        if match:
+            text = match.group(0)
+            # remove the heading itself
+            text = re.sub(r"^.*?:?\s*", "", text.split("\n", 1)[-1]).strip()
+            sections[key] = text
+
+    # --- Convert next steps and concerns into list form ---
+    # --- Convert next steps and concerns into list form ---
+    def extract_bullets(text):
+        items = re.findall(r"(?:\*|\+|-)\s*(.+)", text)
+        # Filter out the "being." item and other unwanted short items
+        filtered_items = []
+        for item in items:
+            clean_item = item.strip()
+            # Skip items that are just "being." or other very short non-meaningful text
+            if clean_item and clean_item not in ["being.", "being"] and len(clean_item) > 3:
+                filtered_items.append(clean_item)
+        return filtered_items if filtered_items else [text] if text else []
+    next_steps = extract_bullets(sections["nextSteps"])
+    # --- Detect risk level from explanation ---
+    risk_match = re.search(r"(High|Moderate|Low)\s*Risk", sections["explanation"], re.IGNORECASE)
+    risk_label = risk_match.group(0).title() if risk_match else risk_level
+
+    structured_response = {
+        "risk": risk_label,
+        "explanation": sections["explanation"] or "No explanation found.",
+        "diagnosis": sections["diagnosis"] or "No diagnosis found.",
+        "nextSteps": next_steps or ["No steps provided."],
+    }
+    return structured_response
+
 # ================== Main RAG Query Function ==================
-def query_rag(patient_data: dict, risk_level: str):
+def query_rag(patient_data: dict, risk_level: str, stage_timer=_no_timer):
     """
     Takes structured patient data + predicted risk
     Returns causes and suggestions using the RAG knowledge base.
+    stage_timer(stage, dependency) is entered around retrieval, the LLM
+    call and parsing so callers can time them.
     """
     try:
         query = f"""
@@ -121,61 +217,23 @@ def query_rag(patient_data: dict, risk_level: str):
         We are here to support you. Please don't hesitate to reach out if you have any questions or need help scheduling your next appointment. Taking proactive steps now is a powerful way to invest in your future well-being.
         """
 
-        result = qa_chain(query)
-        answer = result.get("result", "").strip()
-        print(f"✅ RAG response obtained. {answer}" )
-         # --- Pattern-based extraction ---
-        sections = {
-            "explanation": "",
-            "diagnosis": "",
-            "nextSteps": "",
-        }
-
-        patterns = {
-            "explanation": r"Explanation of Your Results.*?(?=\n\s*\*\*?What|2\. What|What This Could|$)",
-            "diagnosis": r"What This Could Mean.*?(?=\n\s*\*\*?Your Suggested|3\. Your|Your Suggested|$)",
-            "nextSteps": r"Your Suggested Next Steps.*?(?=\n\s*\*\*?Additional|4\. Additional|Additional Concerns|$)",
-        }
-
-        for key, pattern in patterns.items():
-            match = re.search(pattern, answer, re.DOTALL | re.IGNORECASE)
-            if match:
-                text = match.group(0)
-                # remove the heading itself
-                text = re.sub(r"^.*?:?\s*", "", text.split("\n", 1)[-1]).strip()
-                sections[key] = text
-
-        # --- Convert next steps and concerns into list form ---
-        # --- Convert next steps and concerns into list form ---
-        def extract_bullets(text):
-            items = re.findall(r"(?:\*|\+|-)\s*(.+)", text)
-            # Filter out the "being." item and other unwanted short items
-            filtered_items = []
-            for item in items:
-                clean_item = item.strip()
-                # Skip items that are just "being." or other very short non-meaningful text
-                if clean_item and clean_item not in ["being.", "being"] and len(clean_item) > 3:
-                    filtered_items.append(clean_item)
-            return filtered_items if filtered_items else [text] if text else []
-        next_steps = extract_bullets(sections["nextSteps"])
-        # --- Detect risk level from explanation ---
-        risk_match = re.search(r"(High|Moderate|Low)\s*Risk", sections["explanation"], re.IGNORECASE)
-        risk_label = risk_match.group(0).title() if risk_match else risk_level
-    
-        structured_response = {
-            "risk": risk_label,
-            "explanation": sections["explanation"] or "No explanation found.",
-            "diagnosis": sections["diagnosis"] or "No diagnosis found.",
-            "nextSteps": next_steps or ["No steps provided."],
-        }
-
-        print("✅ Parsed structured response:", structured_response)
+        # Same steps as qa_chain(query), split so each can be timed
+        with stage_timer("retriever"):
+            docs = retriever.invoke(query)
+        with stage_timer("llm", "groq"):
+            answer = qa_chain.combine_documents_chain.run(input_documents=docs, question=query)
+        answer = answer.strip()
+        log.debug("RAG response obtained", answer=answer)
+        with stage_timer("parse"):
+            structured_response = _parse_answer(answer, risk_level)
+
+        log.debug("Parsed structured response", response=structured_response)
         return structured_response  
     except Exception as e:
-        print("⚠️ RAG query failed:", e)
+        log.warning("RAG query failed", error=str(e))
         return {
             "risk": risk_level,
-            "explanation": "RAG analysis failed.",
+            "explanation": RAG_FAILED_EXPLANATION,
             "diagnosis": "Unable to retrieve diagnosis.",
             "nextSteps": ["Consult a doctor for further advice."],
         }
@@ -0,0 +1,208 @@
+"""
+Non-blocking structured logging for the API.
+
+Log calls only put the record on an in-memory queue; a background listener
+thread formats it as one JSON line and writes it to stdout, so a slow log
+pipe never stalls a request. Records carry the current request id, known
+PII (patient name and email) is redacted, and large string fields are
+truncated except for a small sample of requests.
+
+    log = get_logger(__name__)
+    log.info("RAG response obtained", answer=answer)
+
+Settings come from the environment: LOG_LEVEL (default INFO),
+LOG_MAX_FIELD_CHARS (default 512) and LOG_PAYLOAD_SAMPLE_RATE (share of
+large payloads logged in full, default 0.01).
+"""
+import os
+import re
+import sys
+import json
+import queue
+import atexit
+import random
+import logging
+import threading
+from functools import lru_cache
+from datetime import datetime, timezone
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+MAX_FIELD_CHARS = int(os.getenv("LOG_MAX_FIELD_CHARS", "512"))
+PAYLOAD_SAMPLE_RATE = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", "0.01"))
+QUEUE_SIZE = 10000
+
+# Field names whose values are never written
+PII_FIELDS = {'name', 'user_name', 'email', 'to_email', 'Name', 'Email'}
+EMAIL_PATTERN = re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+")
+REDACTED = "[REDACTED]"
+
+_request_id = ContextVar("request_id", default=None)
+_request_pii = ContextVar("request_pii", default=())
+
+_lock = threading.Lock()
+_handler = None
+_listener = None
+
+
+def set_request_context(request_id, *pii_values):
+    """
+    Bind a request id and the request's PII values (patient name, email)
+    to the current context; the values are scrubbed from every message
+    and field logged while handling the request.
+    """
+    _request_id.set(request_id)
+    _request_pii.set(tuple(str(v) for v in pii_values if v))
+
+
+def add_request_pii(*pii_values):
+    _request_pii.set(_request_pii.get() + tuple(str(v) for v in pii_values if v))
+
+
+def get_request_id():
+    return _request_id.get()
+
+
+def _pii_terms(value):
+    """
+    The value and, for names, each of its words: "Jane Doe" is also
+    redacted where the text says only "Jane". Emails are kept whole.
+    """
+    value = value.strip()
+    if not value:
+        return []
+    return [value] if "@" in value else [value, *re.findall(r"\w+", value)]
+
+
+@lru_cache(maxsize=1024)
+def _pii_pattern(pii_values):
+    """
+    One case-insensitive regex matching any of the values or their words,
+    longest first. Matches are anchored on word boundaries, so even a
+    short name like "Al" is not found inside "also" or "vital".
+    """
+    terms = sorted({term for v in pii_values for term in _pii_terms(v)}, key=len, reverse=True)
+    if not terms:
+        return None
+    return re.compile(r"(?<!\w)(?:" + "|".join(re.escape(t) for t in terms) + r")(?!\w)", re.IGNORECASE)
+
+
+def redact(value, pii_values=()):
+    """Replace known PII values and their words (whole words, any case) and anything that looks like an email"""
+    text = str(value)
+    pattern = _pii_pattern(tuple(pii_values))
+    if pattern is not None:
+        text = pattern.sub(REDACTED, text)
+    return EMAIL_PATTERN.sub(REDACTED, text)
+
+
+def contains_pii(value, pii_values=()):
+    """True if redact() would change the text"""
+    text = str(value)
+    pattern = _pii_pattern(tuple(pii_values))
+    return bool((pattern is not None and pattern.search(text)) or EMAIL_PATTERN.search(text))
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line, with PII redacted and large fields sampled"""
+
+    def format(self, record):
+        pii_values = getattr(record, 'pii', ())
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': redact(record.getMessage(), pii_values),
+        }
+        if getattr(record, 'request_id', None):
+            entry['request_id'] = record.request_id
+
+        sample_payload = random.random() < PAYLOAD_SAMPLE_RATE
+        for key, value in getattr(record, 'fields', {}).items():
+            if key in PII_FIELDS:
+                entry[key] = REDACTED
+                continue
+            if not isinstance(value, (int, float, bool)) and value is not None:
+                value = redact(value if isinstance(value, str) else json.dumps(value, default=str),
+                               pii_values)
+                if len(value) > MAX_FIELD_CHARS and not sample_payload:
+                    value = f"{value[:MAX_FIELD_CHARS]}... [{len(value)} chars]"
+            entry[key] = value
+
+        if record.exc_info:
+            entry['exc'] = redact(self.formatException(record.exc_info), pii_values)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Captures the request context on the calling thread and leaves all
+    formatting to the listener. If the queue is full the record is
+    dropped and counted rather than blocking the request.
+    """
+
+    dropped = 0
+
+    def prepare(self, record):
+        record.request_id = _request_id.get()
+        record.pii = _request_pii.get()
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            NonBlockingQueueHandler.dropped += 1
+
+
+class StructuredLogger(logging.LoggerAdapter):
+    """Keyword arguments other than exc_info/stack_info become JSON fields"""
+
+    def process(self, msg, kwargs):
+        fields = {k: kwargs.pop(k) for k in list(kwargs)
+                  if k not in ('exc_info', 'stack_info', 'stacklevel', 'extra')}
+        kwargs.setdefault('extra', {})['fields'] = fields
+        return msg, kwargs
+
+
+def _start_listener():
+    global _listener
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JSONFormatter())
+    _handler.queue = queue.Queue(QUEUE_SIZE)
+    _listener = QueueListener(_handler.queue, stream_handler, respect_handler_level=False)
+    _listener.start()
+
+
+def _restart_after_fork():
+    # The listener thread does not survive fork(); each worker needs its own
+    if _handler is not None:
+        _start_listener()
+
+
+def configure_logging(level=LOG_LEVEL):
+    """Install the queue handler on the root logger (idempotent)"""
+    global _handler
+    with _lock:
+        if _handler is not None:
+            return
+        _handler = NonBlockingQueueHandler(None)  # queue is set by _start_listener
+        _start_listener()
+        root = logging.getLogger()
+        root.addHandler(_handler)
+        root.setLevel(level)
+        atexit.register(shutdown_logging)
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=_restart_after_fork)
+
+
+def shutdown_logging():
+    """Flush queued records; call before the process exits"""
+    if _listener is not None:
+        _listener.stop()
+
+
+def get_logger(name):
+    configure_logging()
+    return StructuredLogger(logging.getLogger(name), {})
@@ -0,0 +1,188 @@
+import os
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+COLUMNS = [
+    'Name', 'Gender', 'Age', 'Systolic BP', 'Diastolic BP', 'Cholesterol',
+    'Height (cm)', 'Weight (kg)', 'BMI', 'Smoker', 'Diabetes', 'Health'
+]
+
+FIRST_NAMES = np.array([
+    'James', 'Mary', 'Robert', 'Patricia', 'John', 'Jennifer', 'Michael', 'Linda',
+    'David', 'Elizabeth', 'William', 'Barbara', 'Richard', 'Susan', 'Joseph', 'Jessica',
+    'Thomas', 'Sarah', 'Charles', 'Karen', 'Daniel', 'Nancy', 'Matthew', 'Lisa',
+    'Anthony', 'Betty', 'Mark', 'Sandra', 'Steven', 'Ashley', 'Eric', 'Kelly',
+    'Ann', 'Heidi', 'Timothy', 'Amy', 'Nicole', 'Kevin', 'Laura', 'Brian'
+])
+LAST_NAMES = np.array([
+    'Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis',
+    'Rodriguez', 'Martinez', 'Hernandez', 'Lopez', 'Gonzalez', 'Wilson', 'Anderson', 'Thomas',
+    'Taylor', 'Moore', 'Jackson', 'Martin', 'Lee', 'Thompson', 'White', 'Harris',
+    'Clark', 'Lewis', 'Walker', 'Hall', 'Young', 'King', 'Odom', 'Lara',
+    'Dixon', 'Webb', 'Williamson', 'Khan', 'Ahmed', 'Rehman', 'Ali', 'Hussain'
+])
+
+# Columns that receive missing values and outliers
+NOISY_COLUMNS = ['Systolic BP', 'Diastolic BP', 'Cholesterol', 'BMI']
+
+# Share of each class in enhanced_health_data.csv
+CLASS_SHARES = {'Good': 0.11, 'Fair': 0.66, 'Bad': 0.23}
+
+
+def _risk_score(age, systolic, cholesterol, bmi, smoker, diabetes, rng):
+    """Latent risk that drives the Health label"""
+    return (
+        1.5 * smoker + 1.5 * diabetes
+        + 0.03 * (age - 49) + 0.05 * (systolic - 130)
+        + 0.02 * (cholesterol - 188) + 0.05 * (bmi - 25)
+        + rng.normal(0, 0.5, size=len(age))
+    )
+
+
+class SyntheticPatientGenerator:
+    """
+    Seeded, vectorized generator for records with the schema of
+    enhanced_health_data.csv. Vitals are correlated the way the real data
+    is (blood pressure and cholesterol rise with age, diastolic with
+    systolic, BMI follows from height and weight), and the Health label
+    comes from a latent risk score cut at the class shares of the
+    original dataset.
+
+    Every chunk is seeded from (seed, chunk index), so a run is
+    reproducible and chunks can be generated independently.
+    """
+
+    def __init__(self, seed=42, missing_rate=0.01, outlier_rate=0.005):
+        self.seed = seed
+        self.missing_rate = missing_rate
+        self.outlier_rate = outlier_rate
+        self.thresholds = self._calibrate_thresholds()
+
+    def _vitals(self, n, rng):
+        gender_male = rng.random(n) < 0.5
+        age = rng.integers(18, 81, size=n)
+
+        height = np.where(gender_male, rng.normal(176, 7, n), rng.normal(163, 6.5, n)).clip(145, 205)
+        bmi = rng.lognormal(np.log(24.2), 0.25, n).clip(13, 50)
+        weight = bmi * (height / 100) ** 2
+
+        # Linear fits on enhanced_health_data.csv, centred on its means
+        systolic = (129.5 + 0.35 * (age - 49) + rng.normal(0, 7.2, n)).clip(90, 190)
+        diastolic = (82.9 + 0.14 * (age - 49) + 0.21 * (systolic - 129.5) + rng.normal(0, 4.4, n)).clip(55, 120)
+        cholesterol = (187.7 + 0.3 * (age - 49) + 0.91 * (diastolic - 82.9) + rng.normal(0, 18.6, n)).clip(120, 320)
+
+        smoker = rng.random(n) < 0.46
+        diabetes_logit = -0.1 + 0.02 * (age - 49) + 0.08 * (bmi - 25)
+        diabetes = rng.random(n) < 1 / (1 + np.exp(-diabetes_logit))
+
+        return {
+            'Gender': np.where(gender_male, 'Male', 'Female'),
+            'Age': age,
+            'Systolic BP': np.round(systolic).astype(np.int64),
+            'Diastolic BP': np.round(diastolic).astype(np.int64),
+            'Cholesterol': np.round(cholesterol).astype(np.int64),
+            'Height (cm)': height,
+            'Weight (kg)': weight,
+            'BMI': bmi,
+            'Smoker': smoker,
+            'Diabetes': diabetes
+        }
+
+    def _calibrate_thresholds(self, n=200000):
+        """Risk-score cut points that reproduce CLASS_SHARES"""
+        rng = np.random.default_rng([self.seed, 0xC0FFEE])
+        v = self._vitals(n, rng)
+        score = _risk_score(v['Age'], v['Systolic BP'], v['Cholesterol'], v['BMI'],
+                            v['Smoker'], v['Diabetes'], rng)
+        return np.quantile(score, [CLASS_SHARES['Good'], 1 - CLASS_SHARES['Bad']])
+
+    def generate_chunk(self, n, chunk_index=0):
+        """Generate n records for the given chunk index"""
+        rng = np.random.default_rng([self.seed, chunk_index])
+        v = self._vitals(n, rng)
+
+        score = _risk_score(v['Age'], v['Systolic BP'], v['Cholesterol'], v['BMI'],
+                            v['Smoker'], v['Diabetes'], rng)
+        health = np.where(score < self.thresholds[0], 'Good',
+                          np.where(score > self.thresholds[1], 'Bad', 'Fair'))
+
+        names = np.char.add(np.char.add(rng.choice(FIRST_NAMES, n), ' '), rng.choice(LAST_NAMES, n))
+        df = pd.DataFrame({'Name': names, **v, 'Health': health}, columns=COLUMNS)
+        # Float so every chunk has the same schema whether or not it has gaps
+        df[NOISY_COLUMNS] = df[NOISY_COLUMNS].astype(float)
+
+        # Outliers: implausible readings of the kind cleaning has to clip
+        for col in NOISY_COLUMNS:
+            mask = rng.random(n) < self.outlier_rate
+            if mask.any():
+                factor = rng.choice([0.5, 1.6], size=int(mask.sum()))
+                df.loc[mask, col] = df.loc[mask, col] * factor
+
+        # Missing values
+        for col in NOISY_COLUMNS:
+            mask = rng.random(n) < self.missing_rate
+            df.loc[mask, col] = np.nan
+
+        return df
+
+    def iter_chunks(self, n_rows, chunk_size=1_000_000):
+        """Yield DataFrames of at most chunk_size rows until n_rows are produced"""
+        for chunk_index, start in enumerate(range(0, n_rows, chunk_size)):
+            yield self.generate_chunk(min(chunk_size, n_rows - start), chunk_index)
+
+    def write(self, output_path, n_rows, chunk_size=1_000_000):
+        """
+        Stream n_rows records to CSV or Parquet (chosen by file extension)
+        without holding more than one chunk in memory
+        """
+        parquet = output_path.endswith(".parquet")
+        if os.path.exists(output_path):
+            os.remove(output_path)
+
+        writer = None
+        start = time.perf_counter()
+        written = 0
+        try:
+            for chunk in self.iter_chunks(n_rows, chunk_size):
+                if parquet:
+                    import pyarrow as pa
+                    import pyarrow.parquet as pq
+                    table = pa.Table.from_pandas(chunk, preserve_index=False)
+                    if writer is None:
+                        writer = pq.ParquetWriter(output_path, table.schema)
+                    writer.write_table(table.cast(writer.schema))
+                else:
+                    chunk.to_csv(output_path, mode='a', header=written == 0, index=False)
+                written += len(chunk)
+                elapsed = time.perf_counter() - start
+                print(f"  {written:,}/{n_rows:,} rows ({written / elapsed:,.0f} rows/sec)")
+        finally:
+            if writer is not None:
+                writer.close()
+
+        size_mb = os.path.getsize(output_path) / 1024 ** 2
+        print(f"✓ Wrote {written:,} rows to {output_path} ({size_mb:,.1f} MB)")
+        return output_path
+
+
+def main():
+    """
+    Command-line entry point for generating a synthetic dataset
+    """
+    parser = argparse.ArgumentParser(description="Generate synthetic patient records")
+    parser.add_argument("output", help="Output .csv or .parquet path")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--chunk-size", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--missing-rate", type=float, default=0.01)
+    parser.add_argument("--outlier-rate", type=float, default=0.005)
+    args = parser.parse_args()
+
+    generator = SyntheticPatientGenerator(args.seed, args.missing_rate, args.outlier_rate)
+    return generator.write(args.output, args.rows, args.chunk_size)
+
+
+if __name__ == "__main__":
+    main()